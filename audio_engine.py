@@ -0,0 +1,144 @@
+import os
+import subprocess
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import render_pipeline
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+# Frames per processing block; memory use is a few blocks plus the longest fade, whatever the mix length
+BLOCK_FRAMES = int(os.environ.get("AUDIO_ENGINE_BLOCK_FRAMES", 65536))
+
+FADE_CURVES = ["tri", "qsin", "hsin", "par", "cub"]
+
+
+def is_available():
+    return np is not None
+
+
+def pcm_input_args(sample_rate=SAMPLE_RATE, channels=CHANNELS):
+    return ['-f', 'f32le', '-ar', str(sample_rate), '-ac', str(channels), '-i', 'pipe:0']
+
+
+def fade_curve(curve, length):
+    # Rising gain ramp in (0, 1]; the falling ramp is the same curve reversed
+    t = (np.arange(length, dtype=np.float32) + 1) / max(length, 1)
+    if curve == "qsin":
+        ramp = np.sin(t * np.pi / 2)
+    elif curve == "hsin":
+        ramp = (1 - np.cos(t * np.pi)) / 2
+    elif curve == "par":
+        ramp = 1 - (1 - t) ** 2
+    elif curve == "cub":
+        ramp = t ** 3
+    else:
+        ramp = t
+    return ramp.astype(np.float32)[:, None]
+
+
+def read_blocks(ffmpeg_path, track, sample_rate, channels, block_frames, should_stop=None):
+    cmd = [ffmpeg_path, '-v', 'error', '-nostdin'] + render_pipeline.audio_input_args(track)
+    cmd.extend(['-vn', '-f', 'f32le', '-ac', str(channels), '-ar', str(sample_rate), 'pipe:1'])
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    frame_bytes = channels * 4
+    try:
+        while not (should_stop and should_stop()):
+            data = process.stdout.read(block_frames * frame_bytes)
+            if not data:
+                # A track that fails to open or to decode must fail the mix, not end it early without that audio
+                if process.wait() != 0:
+                    raise subprocess.CalledProcessError(process.returncode, cmd)
+                break
+            usable = len(data) - len(data) % frame_bytes
+            yield np.frombuffer(data[:usable], dtype='<f4').reshape(-1, channels)
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+def render_blocks(ffmpeg_path, tracks, sample_rate=SAMPLE_RATE, channels=CHANNELS, block_frames=BLOCK_FRAMES,
+                  crossfade=0.0, curve="tri", should_stop=None):
+    if not is_available():
+        raise RuntimeError("NumPy is required for the audio engine.")
+
+    crossfade_frames = int(crossfade * sample_rate)
+    previous_tail = None
+
+    for index, track in enumerate(tracks):
+        gain = np.float32(10 ** ((track.get("gain_db") or 0) / 20))
+        fade_in_frames = int((track.get("fade_in") or 0) * sample_rate)
+        fade_out_frames = int((track.get("fade_out") or 0) * sample_rate)
+        is_last = index == len(tracks) - 1
+        gap_frames = 0 if is_last else int((track.get("gap_after") or 0) * sample_rate)
+        tail_frames = crossfade_frames if not is_last and not gap_frames else 0
+        # The end of a track is only known at EOF, so the last frames are held back for fade-out/crossfade
+        hold_frames = max(fade_out_frames, tail_frames)
+
+        fade_in_ramp = fade_curve(curve, fade_in_frames) if fade_in_frames else None
+        overlap_in_frames = len(previous_tail) if previous_tail is not None else 0
+        if previous_tail is not None:
+            overlap_in = fade_curve(curve, len(previous_tail))
+            overlap_out = overlap_in[::-1]
+        position = 0
+        pending = np.zeros((0, channels), dtype=np.float32)
+
+        for block in read_blocks(ffmpeg_path, track, sample_rate, channels, block_frames, should_stop):
+            block = block * gain
+            if position < fade_in_frames:
+                n = min(len(block), fade_in_frames - position)
+                block[:n] *= fade_in_ramp[position:position + n]
+            if previous_tail is not None and position < len(previous_tail):
+                n = min(len(block), len(previous_tail) - position)
+                block[:n] = block[:n] * overlap_in[position:position + n] + previous_tail[position:position + n] * overlap_out[position:position + n]
+            position += len(block)
+
+            pending = np.concatenate((pending, block)) if len(pending) else block
+            if len(pending) > hold_frames:
+                cut = len(pending) - hold_frames
+                yield pending[:cut]
+                pending = pending[cut:].copy()
+
+        if should_stop and should_stop():
+            return
+
+        if previous_tail is not None and position < len(previous_tail):
+            # Current track is shorter than the overlap: the rest of the previous tail fades out on its own
+            pending = np.concatenate((pending, previous_tail[position:] * overlap_out[position:]))
+
+        if fade_out_frames:
+            n = min(len(pending), fade_out_frames)
+            pending[len(pending) - n:] *= fade_curve(curve, fade_out_frames)[::-1][fade_out_frames - n:]
+
+        if tail_frames:
+            n = min(len(pending), tail_frames, max(0, position - overlap_in_frames))
+            previous_tail = pending[len(pending) - n:].copy()
+            pending = pending[:len(pending) - n]
+        else:
+            previous_tail = None
+
+        if len(pending):
+            yield pending
+
+        while gap_frames > 0:
+            n = min(gap_frames, block_frames)
+            yield np.zeros((n, channels), dtype=np.float32)
+            gap_frames -= n
+
+    if previous_tail is not None and len(previous_tail):
+        yield previous_tail
+
+
+def pcm_chunks(blocks, sample_rate=SAMPLE_RATE, progress_callback=None):
+    # Raw little-endian float32 bytes for an ffmpeg reading pcm_input_args() on stdin
+    written_frames = 0
+    for block in blocks:
+        yield np.ascontiguousarray(block, dtype='<f4').tobytes()
+        written_frames += len(block)
+        if progress_callback:
+            progress_callback(written_frames / sample_rate)
@@ -8,10 +8,28 @@ import platform
 import threading
 import locale
 import os
-import re
 import time
 import sys
-import random
+from concurrent.futures import ThreadPoolExecutor
+
+import audio_engine
+import cpu_budget
+import duplicates
+import folder_scanner
+import media_cache
+import media_formats
+import playlist
+import preflight
+import process_supervisor
+import render_pipeline
+import silence
+import timestamps
+import track_list
+import track_view
+import waveform
+
+WAVEFORM_WIDTH = 140
+WAVEFORM_COLOR = "#1F6AA5"
 
 class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
     def __init__(self, *args, **kwargs):
@@ -21,9 +39,25 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.title("Audio Mixer Pro")
         self.geometry("600x800")
 
-        self.audio_paths = []
-        self.audio_durations = {}
-        self.render_process = None
+        # Paths in mix order; the list object is owned and kept in sync by the track model
+        self.tracks = track_list.TrackList(self.track_timing)
+        self.audio_paths = self.tracks.paths
+        self.track_settings = {}
+        self.peaks = {}
+        self.peak_jobs = {}
+        self.auto_trims = {}
+        self.trim_jobs = {}
+        self.duration_jobs = {}
+        self.relink_job = None
+        self.duplicates = duplicates.DuplicateIndex()
+        self.similar = {}
+        self.similar_jobs = {}
+        self.waveform_redraw_pending = False
+        self.worker_pool = ThreadPoolExecutor(max_workers=2)
+        # Content hashes and lengths of added files: hashes come back in list order, so the first copy of a
+        # file is the one kept, and neither waits behind the waveform decodes
+        self.hash_pool = ThreadPoolExecutor(max_workers=1)
+        self.render_handle = None
         self.stop_requested = False
         self.last_render_errors = ""
         self.ffmpeg_path = "ffmpeg"
@@ -35,6 +69,13 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.load_locales()
         self.setup_ui()
         self.update_ui_texts()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        self.cancel_peaks()
+        self.worker_pool.shutdown(wait=False, cancel_futures=True)
+        self.hash_pool.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
 
     def load_locales(self):
         try:
@@ -132,6 +173,12 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.drop_target.drop_target_register(DND_FILES)
         self.drop_target.dnd_bind('<<Drop>>', self.handle_drop)
 
+        self.similar_var = ctk.BooleanVar(value=False)
+        self.similar_checkbox = ctk.CTkCheckBox(self.input_frame, variable=self.similar_var, font=self.button_font, command=self.on_similar_toggled)
+        self.similar_checkbox.grid(row=2, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+        if not duplicates.is_available():
+            self.similar_checkbox.configure(state="disabled")
+
         # --- Track List Frame ---
         self.track_list_frame = ctk.CTkFrame(self.mixer_tab)
         self.track_list_frame.grid(row=1, column=0, columnspan=2, padx=10, pady=0, sticky="nsew")
@@ -146,12 +193,21 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.listbox_container.grid_columnconfigure(0, weight=1)
         self.listbox_container.grid_rowconfigure(0, weight=1)
 
-        self.track_listbox = tk.Listbox(
-            self.listbox_container, height=10, bg="#2B2B2B", fg="#DCE4EE",
-            selectbackground="#1F6AA5", selectforeground="#DCE4EE", borderwidth=0, highlightthickness=0,
-            font=("Arial", 12)
+        self.track_listbox = track_view.VirtualListbox(
+            self.listbox_container, lambda i: self.track_display_text(self.audio_paths[i]), height=240,
+            bg="#2B2B2B", fg="#DCE4EE", selectbackground="#1F6AA5", selectforeground="#DCE4EE",
+            font=("Arial", 12), yscrollcommand=self.on_track_list_scroll
         )
         self.track_listbox.grid(row=0, column=0, padx=1, pady=1, sticky="nsew")
+        self.track_scrollbar = ctk.CTkScrollbar(self.listbox_container, command=self.track_listbox.yview)
+        self.track_scrollbar.grid(row=0, column=2, padx=1, pady=1, sticky="ns")
+
+        # Waveforms are drawn next to the visible listbox rows and for the whole mix below the list
+        self.waveform_canvas = tk.Canvas(self.listbox_container, width=WAVEFORM_WIDTH, bg="#2B2B2B", highlightthickness=0)
+        self.waveform_canvas.grid(row=0, column=1, padx=1, pady=1, sticky="ns")
+        self.mix_waveform_canvas = tk.Canvas(self.listbox_container, height=40, bg="#232323", highlightthickness=0)
+        self.mix_waveform_canvas.grid(row=1, column=0, columnspan=3, padx=1, pady=(0, 1), sticky="ew")
+        self.mix_waveform_canvas.bind("<Configure>", lambda e: self.schedule_waveform_redraw())
 
         self.track_buttons_frame = ctk.CTkFrame(self.track_list_frame)
         self.track_buttons_frame.grid(row=2, column=0, padx=5, pady=5, sticky="ew")
@@ -162,6 +218,8 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.move_down_button.pack(side="left", padx=5)
         self.remove_button = ctk.CTkButton(self.track_buttons_frame, command=self.remove_track, font=self.button_font)
         self.remove_button.pack(side="left", padx=5)
+        self.track_settings_button = ctk.CTkButton(self.track_buttons_frame, command=self.open_track_settings, font=self.button_font)
+        self.track_settings_button.pack(side="left", padx=5)
         self.clear_button = ctk.CTkButton(self.track_buttons_frame, command=self.clear_list, font=self.button_font)
         self.clear_button.pack(side="right", padx=5)
 
@@ -191,6 +249,39 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.bitrate_var = ctk.StringVar(value="192")
         self.bitrate_menu = ctk.CTkOptionMenu(self.export_frame, variable=self.bitrate_var, values=["128", "192", "256", "320"])
 
+        self.normalize_var = ctk.BooleanVar(value=False)
+        self.normalize_checkbox = ctk.CTkCheckBox(self.export_frame, variable=self.normalize_var, font=self.button_font)
+        self.normalize_checkbox.grid(row=2, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+
+        self.engine_var = ctk.BooleanVar(value=False)
+        self.engine_checkbox = ctk.CTkCheckBox(self.export_frame, variable=self.engine_var, font=self.button_font)
+        self.engine_checkbox.grid(row=3, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+        if not audio_engine.is_available():
+            self.engine_checkbox.configure(state="disabled")
+
+        self.crossfade_label = ctk.CTkLabel(self.export_frame, text="Crossfade (s):")
+        self.crossfade_label.grid(row=4, column=0, padx=10, pady=5, sticky="w")
+        self.crossfade_var = ctk.StringVar(value="0")
+        self.crossfade_entry = ctk.CTkEntry(self.export_frame, textvariable=self.crossfade_var)
+        self.crossfade_entry.grid(row=4, column=1, padx=10, pady=5, sticky="ew")
+        self.crossfade_entry.bind("<FocusOut>", lambda e: self.update_total_duration())
+
+        self.curve_label = ctk.CTkLabel(self.export_frame, text="Fade curve:")
+        self.curve_label.grid(row=5, column=0, padx=10, pady=5, sticky="w")
+        self.curve_var = ctk.StringVar(value="tri")
+        self.curve_menu = ctk.CTkOptionMenu(self.export_frame, variable=self.curve_var, values=audio_engine.FADE_CURVES)
+        self.curve_menu.grid(row=5, column=1, padx=10, pady=5, sticky="ew")
+
+        self.auto_trim_var = ctk.BooleanVar(value=False)
+        self.auto_trim_checkbox = ctk.CTkCheckBox(self.export_frame, variable=self.auto_trim_var, font=self.button_font, command=self.on_auto_trim_toggled)
+        self.auto_trim_checkbox.grid(row=6, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+        if not silence.is_available():
+            self.auto_trim_checkbox.configure(state="disabled")
+
+        self.background_var = ctk.BooleanVar(value=False)
+        self.background_checkbox = ctk.CTkCheckBox(self.export_frame, variable=self.background_var, font=self.button_font)
+        self.background_checkbox.grid(row=7, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+
         # --- Bottom Frame ---
         self.bottom_frame = ctk.CTkFrame(self.mixer_tab)
         self.bottom_frame.grid(row=5, column=0, padx=10, pady=10, sticky="ew")
@@ -284,11 +375,19 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.move_up_button.configure(text="⬆️ " + texts.get("move_up", "Up"))
         self.move_down_button.configure(text="⬇️ " + texts.get("move_down", "Down"))
         self.remove_button.configure(text="❌ " + texts.get("remove", "Remove"))
+        self.track_settings_button.configure(text="⚙️ " + texts.get("track_settings", "Settings"))
         self.clear_button.configure(text="🗑️ " + texts.get("clear_list", "Clear"))
         self.shuffle_button.configure(text="🔀 " + texts.get("shuffle", "Shuffle"))
         self.sort_button.configure(text="🔡 " + texts.get("sort_alpha", "Sort A-Z"))
         self.format_label.configure(text=texts.get("format_label", "Format:"))
         self.bitrate_label.configure(text=texts.get("bitrate_label", "Bitrate (kbps):"))
+        self.normalize_checkbox.configure(text=texts.get("normalize_loudness", "Normalize loudness"))
+        self.engine_checkbox.configure(text=texts.get("numpy_engine", "NumPy audio engine"))
+        self.auto_trim_checkbox.configure(text=texts.get("auto_trim_silence", "Auto-trim leading/trailing silence"))
+        self.background_checkbox.configure(text=texts.get("background_priority", "Render in background (keep the computer responsive)"))
+        self.similar_checkbox.configure(text=texts.get("detect_similar_tracks", "Flag re-encoded copies of the same track"))
+        self.crossfade_label.configure(text=texts.get("crossfade_label", "Crossfade (s):"))
+        self.curve_label.configure(text=texts.get("fade_curve_label", "Fade curve:"))
         self.save_mix_button.configure(text="▶️ " + texts.get("save_mix", "Start Exporting Mix"))
         self.stop_button.configure(text="🛑 " + texts.get("stop_render", "Stop"))
         self.save_playlist_button.configure(text="💾 " + texts.get("save_playlist", "Save Playlist"))
@@ -303,110 +402,406 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.copy_button.configure(text="📋 " + texts.get("copy_clipboard", "Copy to Clipboard"))
 
     def select_files(self):
-        paths = filedialog.askopenfilenames(filetypes=[("Audio files", "*.mp3 *.wav *.flac *.aac")])
+        paths = filedialog.askopenfilenames(filetypes=[("Audio files", media_formats.dialog_pattern(media_formats.AUDIO_EXTENSIONS))])
         self.add_audio_paths(paths)
 
     def select_folder(self):
         folder_path = filedialog.askdirectory()
         if folder_path:
-            paths = []
-            for filename in os.listdir(folder_path):
-                if filename.lower().endswith(('.mp3', '.wav', '.flac', '.aac')):
-                    paths.append(os.path.join(folder_path, filename))
-            self.add_audio_paths(paths)
+            scan_thread = threading.Thread(target=self.scan_folder, args=(folder_path,))
+            scan_thread.daemon = True
+            scan_thread.start()
+
+    def scan_folder(self, folder_path):
+        # Subfolders are included; each directory's tracks reach the list as soon as it has been read
+        def on_found(paths):
+            durations = {path: self.get_audio_duration(path) for path in paths}
+            self.after(0, self.add_audio_paths, paths, durations)
+
+        try:
+            folder_scanner.shared_scanner().scan(folder_path, on_found=on_found)
+        except Exception as e:
+            print(f"Could not scan folder {folder_path}: {e}")
+        media_cache.shared_cache().save()
 
     def handle_drop(self, event):
         files = self.tk.splitlist(event.data)
         self.add_audio_paths(files)
 
-    def add_audio_paths(self, paths):
+    def add_audio_paths(self, paths, known_durations=None):
+        added = []
         for path in paths:
-            if path.lower().endswith(('.mp3', '.wav', '.flac', '.aac')):
-                if path not in self.audio_paths:
-                    duration = self.get_audio_duration(path)
-                    self.audio_paths.append(path)
-                    self.audio_durations[path] = duration
-                    
-                    display_text = f"{os.path.basename(path)} ({self.format_duration(duration)})"
-                    self.track_listbox.insert(tk.END, display_text)
+            if media_formats.is_audio(path):
+                if path not in self.tracks:
+                    # Unknown lengths are probed off the UI thread; the row shows 0 until then
+                    duration = known_durations.get(path) if known_durations else None
+                    self.tracks.append(path, duration or 0)
+                    self.duplicates.add(path, duration)
+                    self.request_peaks(path)
+                    self.request_auto_trim(path)
+                    self.request_similar_check(path)
+                    added.append(path)
+        self.track_listbox.set_count(len(self.tracks))
         self.update_total_duration()
+        self.request_duplicate_check(added)
+        for path in added:
+            if not (known_durations and known_durations.get(path) is not None):
+                self.request_duration(path)
+
+    def request_duration(self, path):
+        if path in self.duration_jobs:
+            return
+        future = self.hash_pool.submit(self.get_audio_duration, path)
+        self.duration_jobs[path] = future
+        future.add_done_callback(lambda f: self.after(0, self.on_duration_ready, path, f))
+
+    def on_duration_ready(self, path, future):
+        if self.duration_jobs.get(path) is not future:
+            return
+        del self.duration_jobs[path]
+        try:
+            duration = future.result()
+        except Exception as e:
+            print(f"Could not probe {path}: {e}")
+            return
+        self.tracks.set_duration(path, duration)
+        self.duplicates.set_duration(path, duration)
+        self.request_similar_check(path)
+        if not self.duration_jobs:
+            media_cache.shared_cache().save()
+        self.track_listbox.refresh()
+        self.update_total_duration()
+
+    def request_duplicate_check(self, paths):
+        if not paths:
+            return
+        future = self.hash_pool.submit(self.duplicates.content_hashes, paths)
+        future.add_done_callback(lambda f: self.after(0, self.on_duplicate_check_ready, paths, f))
+
+    def on_duplicate_check_ready(self, paths, future):
+        if future.cancelled():
+            return
+        try:
+            digests = future.result()
+        except Exception as e:
+            print(f"Could not hash added files: {e}")
+            return
+        media_cache.shared_cache().save()
+        # The same file under another path or behind a symlink is dropped like a repeated path;
+        # claim ignores tracks removed while the batch was hashed
+        skipped = []
+        for path, digest in zip(paths, digests):
+            original = self.duplicates.claim(path, digest)
+            if original:
+                skipped.append((path, original))
+        if skipped:
+            copies = {path for path, _ in skipped}
+            self.remove_indices([i for i, path in enumerate(self.audio_paths) if path in copies])
+            print("Skipped files already in the list:\n" + duplicates.describe(skipped))
+            self.status_label.configure(text=self.locales[self.current_lang].get("duplicates_skipped", "Skipped {count} file(s) already in the list").format(count=len(skipped)))
 
     def remove_track(self):
         selected_indices = self.track_listbox.curselection()
         if not selected_indices:
             return
-        for i in reversed(selected_indices):
-            path_to_remove = self.audio_paths[i]
-            self.track_listbox.delete(i)
-            del self.audio_paths[i]
-            if path_to_remove in self.audio_durations:
-                del self.audio_durations[path_to_remove]
+        self.remove_indices(selected_indices)
+
+    def remove_indices(self, indices):
+        removed_paths = [self.audio_paths[i] for i in indices]
+        self.tracks.remove_at(indices)
+        self.track_listbox.selection_clear()
+        self.track_listbox.set_count(len(self.tracks))
+        for path_to_remove in removed_paths:
+            self.track_settings.pop(path_to_remove, None)
+            self.forget_track_analysis(path_to_remove)
         self.update_total_duration()
 
+    def forget_track_analysis(self, path):
+        self.peaks.pop(path, None)
+        self.cancel_peaks(path)
+        self.auto_trims.pop(path, None)
+        self.trim_jobs.pop(path, None)
+        self.duration_jobs.pop(path, None)
+        self.duplicates.remove(path)
+        self.similar.pop(path, None)
+        self.similar_jobs.pop(path, None)
+        for copy in [p for p, original in self.similar.items() if original == path]:
+            del self.similar[copy]
+
     def clear_list(self):
-        self.track_listbox.delete(0, tk.END)
-        self.audio_paths.clear()
-        self.audio_durations.clear()
+        self.tracks.clear()
+        self.track_listbox.selection_clear()
+        self.track_listbox.set_count(0)
+        self.track_settings.clear()
+        self.cancel_peaks()
+        self.peaks.clear()
+        self.auto_trims.clear()
+        self.trim_jobs.clear()
+        self.duration_jobs.clear()
+        self.relink_job = None
+        self.duplicates.clear()
+        self.similar.clear()
+        self.similar_jobs.clear()
         self.update_total_duration()
 
+    def track_display_text(self, path):
+        marker = " ⚙️" if self.track_settings.get(path) else ""
+        if path in self.similar:
+            marker += " ≈"
+        return f"{os.path.basename(path)} ({self.format_duration(self.tracks.duration(path))}){marker}"
+
+    def open_track_settings(self):
+        selected_indices = self.track_listbox.curselection()
+        if not selected_indices:
+            return
+        index = selected_indices[0]
+        path = self.audio_paths[index]
+        settings = self.track_settings.get(path, {})
+        texts = self.locales[self.current_lang]
+
+        dialog = ctk.CTkToplevel(self)
+        dialog.title(os.path.basename(path))
+        dialog.grid_columnconfigure(1, weight=1)
+
+        fields = [
+            ("gain_db", texts.get("track_gain", "Gain (dB):")),
+            ("trim_start", texts.get("track_trim_start", "Trim start (s):")),
+            ("trim_end", texts.get("track_trim_end", "End at (s):")),
+            ("gap_after", texts.get("track_gap_after", "Silence after (s):")),
+        ]
+        entries = {}
+        for row, (key, label) in enumerate(fields):
+            ctk.CTkLabel(dialog, text=label).grid(row=row, column=0, padx=10, pady=5, sticky="w")
+            entry = ctk.CTkEntry(dialog)
+            if settings.get(key) is not None:
+                entry.insert(0, str(settings[key]))
+            entry.grid(row=row, column=1, padx=10, pady=5, sticky="ew")
+            entries[key] = entry
+
+        def save_settings():
+            new_settings = {}
+            try:
+                for key, entry in entries.items():
+                    value = entry.get().strip()
+                    if value:
+                        new_settings[key] = float(value)
+            except ValueError:
+                messagebox.showerror("Error", texts.get("invalid_number", "Please enter a valid number."), parent=dialog)
+                return
+            if new_settings:
+                self.track_settings[path] = new_settings
+            else:
+                self.track_settings.pop(path, None)
+            self.tracks.refresh(path)
+            self.track_listbox.refresh()
+            self.update_total_duration()
+            dialog.destroy()
+
+        ctk.CTkButton(dialog, text=texts.get("save", "Save"), command=save_settings, font=self.button_font).grid(
+            row=len(fields), column=0, columnspan=2, padx=10, pady=10, sticky="ew")
+        dialog.grab_set()
+
     def move_up(self):
         selected_indices = self.track_listbox.curselection()
         if not selected_indices:
             return
-        for i in selected_indices:
-            if i > 0:
-                self.audio_paths[i], self.audio_paths[i-1] = self.audio_paths[i-1], self.audio_paths[i]
-                item = self.track_listbox.get(i)
-                self.track_listbox.delete(i)
-                self.track_listbox.insert(i-1, item)
-                self.track_listbox.selection_set(i-1)
+        i = selected_indices[0]
+        if i > 0:
+            self.tracks.swap(i, i-1)
+            self.track_listbox.selection_set(i-1)
+        self.update_total_duration()
 
     def move_down(self):
         selected_indices = self.track_listbox.curselection()
         if not selected_indices:
             return
-        for i in reversed(selected_indices):
-            if i < self.track_listbox.size() - 1:
-                self.audio_paths[i], self.audio_paths[i+1] = self.audio_paths[i+1], self.audio_paths[i]
-                item = self.track_listbox.get(i)
-                self.track_listbox.delete(i)
-                self.track_listbox.insert(i+1, item)
-                self.track_listbox.selection_set(i+1)
+        i = selected_indices[0]
+        if i < len(self.tracks) - 1:
+            self.tracks.swap(i, i+1)
+            self.track_listbox.selection_set(i+1)
+        self.update_total_duration()
 
     def shuffle_list(self):
         if not self.audio_paths: return
-        
-        display_items = self.track_listbox.get(0, tk.END)
-        combined = list(zip(self.audio_paths, display_items))
-        random.shuffle(combined)
-        
-        self.audio_paths, display_names = zip(*combined)
-        self.audio_paths = list(self.audio_paths)
-        
-        self.track_listbox.delete(0, tk.END)
-        for name in display_names:
-            self.track_listbox.insert(tk.END, name)
+        self.tracks.shuffle()
+        self.track_listbox.selection_clear()
+        self.update_total_duration()
 
     def sort_list(self):
         if not self.audio_paths: return
+        self.tracks.sort(key=lambda path: os.path.basename(path).lower())
+        self.track_listbox.selection_clear()
+        self.update_total_duration()
 
-        display_items = self.track_listbox.get(0, tk.END)
-        combined = sorted(zip(self.audio_paths, display_items), key=lambda x: os.path.basename(x[0]).lower())
-        
-        self.audio_paths, display_names = zip(*combined)
-        self.audio_paths = list(self.audio_paths)
+    def track_timing(self, path, duration):
+        # Length and trailing gap of a track in the mix, as the track model sees it
+        track = render_pipeline.make_audio_tracks([path], self.track_settings, auto_trims=self.current_auto_trims())[0]
+        return render_pipeline.track_duration(track, duration or 0), track.get("gap_after") or 0.0
 
-        self.track_listbox.delete(0, tk.END)
-        for name in display_names:
-            self.track_listbox.insert(tk.END, name)
+    def on_track_list_scroll(self, first, last):
+        self.track_scrollbar.set(first, last)
+        self.schedule_waveform_redraw()
 
-    def get_audio_duration(self, file_path):
+
+    def request_peaks(self, path):
+        if not waveform.is_available() or path in self.peaks or path in self.peak_jobs:
+            return
+        cancel_event = threading.Event()
+        future = self.worker_pool.submit(waveform.load_or_compute, self.ffmpeg_path, path, cancel_event)
+        self.peak_jobs[path] = (future, cancel_event)
+        future.add_done_callback(lambda f: self.after(0, self.on_peaks_ready, path, f))
+
+    def cancel_peaks(self, path=None):
+        for job_path in ([path] if path else list(self.peak_jobs)):
+            job = self.peak_jobs.pop(job_path, None)
+            if job:
+                job[0].cancel()
+                job[1].set()
+
+    def on_peaks_ready(self, path, future):
+        job = self.peak_jobs.get(path)
+        if not job or job[0] is not future:
+            return
+        del self.peak_jobs[path]
+        if future.cancelled():
+            return
+        try:
+            levels = future.result()
+        except Exception as e:
+            print(f"Could not compute waveform for {path}: {e}")
+            return
+        if levels is not None and path in self.tracks:
+            self.peaks[path] = levels
+            self.schedule_waveform_redraw()
+
+    def on_auto_trim_toggled(self):
+        for path in self.audio_paths:
+            self.request_auto_trim(path)
+        self.tracks.refresh()
+        self.update_total_duration()
+
+    def request_auto_trim(self, path):
+        if not self.auto_trim_var.get() or path in self.auto_trims or path in self.trim_jobs:
+            return
+        future = self.worker_pool.submit(silence.get_bounds, self.ffmpeg_path, path)
+        self.trim_jobs[path] = future
+        future.add_done_callback(lambda f: self.after(0, self.on_auto_trim_ready, path, f))
+
+    def on_auto_trim_ready(self, path, future):
+        if self.trim_jobs.get(path) is not future:
+            return
+        del self.trim_jobs[path]
+        try:
+            bounds = future.result()
+        except Exception as e:
+            print(f"Could not detect silence in {path}: {e}")
+            return
+        self.auto_trims[path] = silence.trims_from_bounds(bounds) or {}
+        media_cache.shared_cache().save()
+        self.tracks.refresh(path)
+        self.update_total_duration()
+
+    def on_similar_toggled(self):
+        if not self.similar_var.get():
+            self.similar.clear()
+            self.similar_jobs.clear()
+            self.track_listbox.refresh()
+            return
+        for path in self.audio_paths:
+            self.request_similar_check(path)
+
+    def request_similar_check(self, path):
+        if not self.similar_var.get() or path in self.similar or path in self.similar_jobs:
+            return
+        duration = self.tracks.duration(path)
+        # Only tracks of almost the same length are decoded and compared, so most additions cost nothing
+        candidates = self.duplicates.candidates(path, duration)
+        if not candidates:
+            return
+        future = self.worker_pool.submit(duplicates.find_similar, self.ffmpeg_path, path, duration, candidates)
+        self.similar_jobs[path] = future
+        future.add_done_callback(lambda f: self.after(0, self.on_similar_ready, path, f))
+
+    def on_similar_ready(self, path, future):
+        if self.similar_jobs.get(path) is not future:
+            return
+        del self.similar_jobs[path]
         try:
-            cmd = [self.ffprobe_path, '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', file_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            return float(result.stdout.strip())
-        except (subprocess.CalledProcessError, FileNotFoundError, ValueError):
-            return 0
+            original = future.result()
+        except Exception as e:
+            print(f"Could not fingerprint {path}: {e}")
+            return
+        media_cache.shared_cache().save()
+        # A pair is flagged once, on whichever of the two was found first
+        if not original or path not in self.tracks or original not in self.tracks or self.similar.get(original) == path:
+            return
+        self.similar[path] = original
+        self.track_listbox.refresh()
+        texts = self.locales[self.current_lang]
+        self.status_label.configure(text=texts.get("duplicate_similar", "{name} sounds like {original}").format(name=os.path.basename(path), original=os.path.basename(original)))
+
+    def store_auto_trims(self, paths, trims):
+        for path in paths:
+            self.auto_trims[path] = trims.get(path, {})
+        self.tracks.refresh()
+        self.update_total_duration()
+
+    def current_auto_trims(self):
+        return self.auto_trims if self.auto_trim_var.get() else None
+
+    def schedule_waveform_redraw(self):
+        if not self.waveform_redraw_pending:
+            self.waveform_redraw_pending = True
+            self.after_idle(self.draw_waveforms)
+
+    def draw_waveform_columns(self, canvas, cols, x, y, width, height):
+        mid = y + height / 2
+        if cols is None:
+            canvas.create_line(x, mid, x + width, mid, fill="#555555")
+            return
+        half = height / 2 - 1
+        for column, (low, high) in enumerate(zip(*cols)):
+            canvas.create_line(x + column, mid - high * half, x + column, mid - low * half + 1, fill=WAVEFORM_COLOR)
+
+    def draw_waveforms(self):
+        self.waveform_redraw_pending = False
+        if not self.winfo_exists():
+            return
+
+        canvas = self.waveform_canvas
+        canvas.delete("all")
+        width = max(canvas.winfo_width(), WAVEFORM_WIDTH) - 4
+        row_height = self.track_listbox.row_height
+        for index, y in self.track_listbox.visible_rows():
+            levels = self.peaks.get(self.audio_paths[index])
+            self.draw_waveform_columns(canvas, waveform.columns(levels, width) if levels else None, 2, y + 2, width, row_height - 4)
+
+        mix_canvas = self.mix_waveform_canvas
+        mix_canvas.delete("all")
+        mix_width = mix_canvas.winfo_width()
+        offsets, total_seconds = self.track_offsets()
+        if not self.audio_paths or total_seconds <= 0 or mix_width <= 1:
+            return
+        tracks = render_pipeline.make_audio_tracks(self.audio_paths, self.track_settings, auto_trims=self.current_auto_trims())
+        mix_height = mix_canvas.winfo_height()
+        for i, (track, offset) in enumerate(zip(tracks, offsets)):
+            length = self.tracks[i].length
+            x_start = int(offset / total_seconds * mix_width)
+            columns_count = int((offset + length) / total_seconds * mix_width) - x_start
+            if columns_count < 1:
+                # Tracks narrower than a pixel at this zoom are not drawn individually
+                continue
+            levels = self.peaks.get(track["path"])
+            cols = None
+            if levels:
+                cols = waveform.columns(levels, columns_count, track.get("trim_start") or 0, (track.get("trim_start") or 0) + length)
+            self.draw_waveform_columns(mix_canvas, cols, x_start, 0, columns_count, mix_height)
+            if offset > 0:
+                mix_canvas.create_line(x_start, 0, x_start, mix_height, fill="#DCE4EE")
+
+    def get_audio_duration(self, file_path):
+        duration = media_cache.get_duration(self.ffprobe_path, file_path)
+        return duration if duration is not None else 0
 
     def save_playlist(self):
         if not self.audio_paths:
@@ -414,8 +809,14 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
             return
         filepath = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
         if filepath:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(self.audio_paths, f, indent=4)
+            entries = []
+            for path in self.audio_paths:
+                try:
+                    entries.append(playlist.track_entry(self.ffprobe_path, path, self.track_settings.get(path)))
+                except OSError:
+                    entries.append({"path": path, "settings": self.track_settings.get(path)})
+            media_cache.shared_cache().save()
+            playlist.save(filepath, entries)
             messagebox.showinfo("Success", self.locales[self.current_lang].get("playlist_saved", "Playlist saved successfully!"))
 
     def load_playlist(self):
@@ -423,34 +824,68 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
         if not filepath:
             return
         
-        with open(filepath, 'r', encoding='utf-8') as f:
-            loaded_paths = json.load(f)
+        try:
+            entries = playlist.load(filepath)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not load playlist:\n{e}")
+            return
 
         self.clear_list()
-        
-        missing_files = []
-        for path in loaded_paths:
-            if os.path.exists(path):
-                self.add_audio_paths([path])
-            else:
-                missing_files.append(path)
-        
-        if missing_files:
-            self.handle_missing_files(missing_files)
-
-    def handle_missing_files(self, missing_files):
-        for path in missing_files:
-            response = messagebox.askyesnocancel(
-                "File Not Found",
-                f"File not found:\n{path}\n\nDo you want to locate it manually?\n(No to remove, Cancel to stop)"
-            )
-            if response is True: # Yes
-                new_path = filedialog.askopenfilename(title=f"Locate {os.path.basename(path)}")
-                if new_path:
-                    self.add_audio_paths([new_path])
-            elif response is None: # Cancel
-                break
-        self.update_total_duration()
+        valid, changed, missing = playlist.check_entries(entries)
+        root = self.ask_relink_root(missing) if missing else None
+        if not root:
+            self.finish_playlist_load(entries, valid, missing, {})
+            return
+        # The walk hashes every file of a matching size under the folder, so it runs off the UI thread
+        self.status_label.configure(text=self.locales[self.current_lang].get("status_relinking", "Searching for moved files..."))
+        future = self.worker_pool.submit(playlist.relink, missing, root)
+        self.relink_job = future
+        future.add_done_callback(lambda f: self.after(0, self.on_relink_ready, entries, valid, missing, f))
+
+    def ask_relink_root(self, missing_entries):
+        # One prompt for the whole playlist: moved files are found again by fingerprint under a chosen folder
+        texts = self.locales[self.current_lang]
+        response = messagebox.askyesno(
+            "File Not Found",
+            texts.get("files_missing_relink", "{count} files were not found.\nSearch a folder for moved files?").format(count=len(missing_entries))
+        )
+        if not response:
+            return None
+        return filedialog.askdirectory() or None
+
+    def on_relink_ready(self, entries, valid, missing, future):
+        if self.relink_job is not future:
+            return
+        self.relink_job = None
+        try:
+            relinked = future.result()
+        except Exception as e:
+            print(f"Could not search for moved files: {e}")
+            relinked = {}
+        texts = self.locales[self.current_lang]
+        self.status_label.configure(text=texts.get("status_ready", "Ready"))
+        messagebox.showinfo("Info", texts.get("files_relinked", "Relinked {found} of {count} files.").format(found=len(relinked), count=len(missing)))
+        self.finish_playlist_load(entries, valid, missing, relinked)
+
+    def finish_playlist_load(self, entries, valid, missing, relinked):
+        # Unchanged files reuse the stored duration; only changed ones are probed again
+        known_durations = {entry["path"]: entry["duration"] for entry in valid}
+        missing_paths = {entry["path"] for entry in missing}
+        for entry in missing:
+            if entry["path"] in relinked:
+                known_durations[relinked[entry["path"]]] = entry.get("duration")
+
+        paths = []
+        for entry in entries:
+            path = entry["path"]
+            if path in missing_paths:
+                path = relinked.get(path)
+                if not path:
+                    continue
+            if entry.get("settings"):
+                self.track_settings[path] = entry["settings"]
+            paths.append(path)
+        self.add_audio_paths(paths, known_durations)
 
     def start_render_thread(self):
         if not self.audio_paths:
@@ -468,17 +903,26 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.progress_bar.grid()
         self.status_label.configure(text=self.locales[self.current_lang].get("status_rendering", "Rendering..."))
         
-        render_thread = threading.Thread(target=self.render_mix, args=(output_path,))
+        normalize_enabled = self.normalize_var.get()
+        auto_trim_enabled = self.auto_trim_var.get() and silence.is_available()
+        crossfade_options = {"crossfade": self.get_crossfade(), "curve": self.curve_var.get()}
+        engine_options = None
+        if self.engine_var.get() and audio_engine.is_available():
+            engine_options = crossfade_options
+        # One mix at a time; the analysis pools before it split the cores further while they run
+        cpu_budget.shared_budget().configure("background" if self.background_var.get() else "managed", 1)
+        self.render_args = (output_path, normalize_enabled, engine_options, auto_trim_enabled, crossfade_options)
+        self.launch_render()
+
+    def launch_render(self):
+        render_thread = threading.Thread(target=self.render_mix, args=self.render_args)
         render_thread.daemon = True
         render_thread.start()
 
     def stop_render(self):
-        if self.render_process and self.render_process.poll() is None:
-            self.stop_requested = True
-            try:
-                self.render_process.terminate()
-            except Exception as e:
-                print(f"Error terminating process: {e}")
+        self.stop_requested = True
+        if self.render_handle and not self.render_handle.done():
+            self.render_handle.stop()
 
     def reset_ui_after_render(self):
         self.stop_button.grid_remove()
@@ -486,33 +930,70 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.save_mix_button.configure(state="normal")
         self.progress_bar.grid_remove()
         self.status_label.configure(text=self.locales[self.current_lang].get("status_ready", "Ready"))
-        self.render_process = None
+        self.render_handle = None
 
-    def render_mix(self, output_path):
+    def render_mix(self, output_path, normalize_enabled=False, engine_options=None, auto_trim_enabled=False, crossfade_options=None):
         start_time = time.time()
+        chapters_path = None
         try:
-            command = [self.ffmpeg_path, '-y']
-            for path in self.audio_paths:
-                command.extend(['-i', path])
-            
-            filter_inputs = "".join([f"[{i}:a]" for i in range(len(self.audio_paths))])
-            filter_complex = f"{filter_inputs}concat=n={len(self.audio_paths)}:v=0:a=1[outa]"
-            
-            command.extend(['-filter_complex', filter_complex, '-map', '[outa]'])
+            # Every track is opened and decoded at both ends first, so a broken file fails the render now and not hours in
+            if self.winfo_exists():
+                self.after(0, lambda: self.status_label.configure(text=self.locales[self.current_lang].get("status_checking_files", "Checking files...")))
+            problems = preflight.check_files(self.ffmpeg_path, self.ffprobe_path, [(path, "audio") for path in self.audio_paths])
+            if self.stop_requested:
+                if self.winfo_exists(): self.after(0, self.on_render_cancel)
+                return
+            if problems:
+                if self.winfo_exists(): self.after(0, self.on_preflight_problems, problems)
+                return
+
+            auto_trims = None
+            if auto_trim_enabled:
+                if self.winfo_exists():
+                    self.after(0, lambda: self.status_label.configure(text=self.locales[self.current_lang].get("status_detecting_silence", "Detecting silence...")))
+                auto_trims = silence.analyze_trims(self.ffmpeg_path, self.audio_paths)
+                # Keeps the timestamps tab in line with what was actually trimmed
+                self.after(0, self.store_auto_trims, list(self.audio_paths), auto_trims)
+
+            track_gains = None
+            if normalize_enabled:
+                if self.winfo_exists():
+                    self.after(0, lambda: self.status_label.configure(text=self.locales[self.current_lang].get("status_analyzing_loudness", "Analyzing loudness...")))
+                track_gains = media_cache.track_gains(self.ffmpeg_path, self.audio_paths)
+
+            tracks = render_pipeline.make_audio_tracks(self.audio_paths, self.track_settings, track_gains, auto_trims)
+            crossfade_options = crossfade_options or {"crossfade": 0.0, "curve": "tri"}
+            # Lengths still being probed in the background are probed here, off the UI thread
+            durations = [self.tracks.duration(path) or self.get_audio_duration(path) for path in self.audio_paths]
+
+            # Chapters and the timestamps file come from the same durations and offsets as the mix itself
+            offsets, total_seconds = render_pipeline.track_offsets(tracks, durations, crossfade_options["crossfade"])
+            timestamp_text = "\n".join(timestamps.timestamp_lines(self.audio_paths, offsets))
+            if media_formats.supports_chapters(output_path):
+                chapters_path = timestamps.write_chapters_file(self.audio_paths, offsets, total_seconds)
 
             file_format = self.format_var.get()
-            if file_format == 'mp3':
-                bitrate = self.bitrate_var.get() + "k"
-                command.extend(['-c:a', 'libmp3lame', '-b:a', bitrate])
-            else: # wav
-                command.extend(['-c:a', 'pcm_s16le'])
-            command.append(output_path)
-
-            self.log_render_start(output_path)
-            self.run_ffmpeg(command)
-            
-            stdout, stderr = self.render_process.communicate()
-            return_code = self.render_process.returncode
+            if engine_options:
+                command = [self.ffmpeg_path, '-y', '-v', 'error'] + audio_engine.pcm_input_args()
+                if chapters_path:
+                    command.extend(render_pipeline.chapter_input_args(chapters_path))
+                    command.extend(['-map', '0:a'] + render_pipeline.chapter_map_args(1))
+                command.extend(render_pipeline.mix_codec_args(file_format, self.bitrate_var.get()))
+                command.append(output_path)
+            else:
+                lengths = render_pipeline.track_lengths(tracks, durations)
+                command = render_pipeline.build_mix_command(
+                    self.ffmpeg_path, tracks, output_path, file_format, self.bitrate_var.get(),
+                    lengths, crossfade_options["crossfade"], crossfade_options["curve"], chapters_path
+                )
+
+            self.log_render_start(output_path, tracks)
+            if engine_options:
+                result = self.run_engine_render(command, tracks, engine_options, total_seconds)
+            else:
+                result = self.run_ffmpeg(command, total_seconds)
+            return_code = result["returncode"]
+            stderr = process_supervisor.error_text(result)
             duration = time.time() - start_time
 
             if self.stop_requested:
@@ -521,30 +1002,43 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
             
             if self.winfo_exists():
                 if return_code == 0:
-                    self.after(0, self.on_render_success, output_path, duration)
+                    self.after(0, self.on_render_success, output_path, duration, timestamp_text)
                 else:
                     self.after(0, self.on_render_error, stderr)
 
         except Exception as e:
             if self.winfo_exists():
                 self.after(0, self.on_render_error, str(e))
+        finally:
+            timestamps.remove_file(chapters_path)
+
+    def run_ffmpeg(self, command, total_seconds=None, feed=None):
+        # Blocks the render thread until ffmpeg ends; pipes, progress and the engine's PCM feed are handled by the supervisor
+        self.render_handle = process_supervisor.start(command, total_duration=total_seconds, on_progress=self.update_progress, feed=feed)
+        if self.stop_requested:
+            self.render_handle.stop()
+        return self.render_handle.wait()
+
+    def update_progress(self, info):
+        if info["fraction"] is not None and self.winfo_exists():
+            self.after(0, self.progress_bar.set, info["fraction"])
+
+    def run_engine_render(self, command, tracks, engine_options, total_seconds):
+        blocks = audio_engine.render_blocks(
+            self.ffmpeg_path, tracks, crossfade=engine_options["crossfade"], curve=engine_options["curve"],
+            should_stop=lambda: self.stop_requested
+        )
+        return self.run_ffmpeg(command, total_seconds, feed=audio_engine.pcm_chunks(blocks))
 
-    def run_ffmpeg(self, command):
-        startupinfo = None
-        if platform.system() == "Windows":
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        
-        self.render_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, startupinfo=startupinfo, encoding='utf-8', errors='replace')
-
-    def on_render_success(self, output_path, duration):
+    def on_render_success(self, output_path, duration, timestamp_text):
         if not self.winfo_exists(): return
         
-        self.generate_timestamps(silent=True)
+        self.timestamp_textbox.delete("1.0", tk.END)
+        self.timestamp_textbox.insert("1.0", timestamp_text)
         txt_path = os.path.splitext(output_path)[0] + "_timestamps.txt"
         try:
             with open(txt_path, "w", encoding="utf-8") as f:
-                f.write(self.timestamp_textbox.get("1.0", tk.END))
+                f.write(timestamp_text + "\n")
             timestamps_message = f"\n\nTimestamps saved to:\n{txt_path}"
         except Exception as e:
             timestamps_message = f"\n\nCould not save timestamps: {e}"
@@ -570,12 +1064,51 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
         messagebox.showerror("Error", f"Render Error:\n{error_message}")
         self.reset_ui_after_render()
 
+    def on_preflight_problems(self, problems):
+        if not self.winfo_exists(): return
+        texts = self.locales[self.current_lang]
+        report = preflight.report_text(problems)
+        if len(problems) == len(self.audio_paths):
+            replace = messagebox.askyesno("Warning", texts.get("preflight_replace", "{count} file(s) failed the pre-flight check:\n\n{report}\n\nChoose replacement files?").format(count=len(problems), report=report))
+            answer = False if replace else None
+        else:
+            answer = messagebox.askyesnocancel("Warning", texts.get("preflight_problems", "{count} file(s) failed the pre-flight check:\n\n{report}\n\nYes: skip these tracks and render\nNo: choose replacement files\nCancel: stop").format(count=len(problems), report=report))
+        if answer is None:
+            self.reset_ui_after_render()
+            return
+        if answer:
+            bad_paths = {p["path"] for p in problems}
+            self.remove_indices([i for i, path in enumerate(self.audio_paths) if path in bad_paths])
+        else:
+            for problem in problems:
+                self.replace_track(problem["path"])
+        # Files that passed are cached, so the second check only looks at the replacements
+        self.launch_render()
+
+    def replace_track(self, old_path):
+        title = self.locales[self.current_lang].get("preflight_replace_title", "Replacement for {name}").format(name=os.path.basename(old_path))
+        path = filedialog.askopenfilename(title=title, filetypes=[("Audio files", media_formats.dialog_pattern(media_formats.AUDIO_EXTENSIONS))])
+        if not path or path in self.tracks:
+            return
+        settings = self.track_settings.pop(old_path, None)
+        if settings:
+            self.track_settings[path] = settings
+        self.forget_track_analysis(old_path)
+        if self.tracks.replace(old_path, path, 0):
+            self.duplicates.add(path, None)
+            self.request_peaks(path)
+            self.request_auto_trim(path)
+            self.request_duplicate_check([path])
+            self.request_duration(path)
+        self.track_listbox.refresh()
+        self.update_total_duration()
+
     def on_render_cancel(self):
         if not self.winfo_exists(): return
         self.reset_ui_after_render()
         self.status_label.configure(text=self.locales[self.current_lang].get("status_cancelled", "Cancelled"))
 
-    def log_render_start(self, output_path):
+    def log_render_start(self, output_path, tracks):
         with open("mix_log.txt", "a", encoding="utf-8") as f:
             f.write(f"--- New Mix --- {time.strftime('%Y-%m-%d %H:%M:%S')} ---\n")
             f.write(f"Output File: {output_path}\n")
@@ -583,8 +1116,9 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
             if self.format_var.get() == 'mp3':
                 f.write(f"Bitrate: {self.bitrate_var.get()} kbps\n")
             f.write("Track Order:\n")
-            for i, path in enumerate(self.audio_paths):
-                f.write(f"  {i+1}. {os.path.basename(path)}\n")
+            for i, track in enumerate(tracks):
+                gain_text = f" ({track['gain_db']:+.2f} dB)" if track["gain_db"] else ""
+                f.write(f"  {i+1}. {os.path.basename(track['path'])}{gain_text}\n")
             f.write("--------------------------------------------------\n\n")
 
     def format_duration(self, seconds):
@@ -593,11 +1127,23 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
         minutes, seconds = divmod(int(seconds), 60)
         return f"{minutes:02d}:{seconds:02d}"
 
+    def get_crossfade(self):
+        try:
+            return max(0.0, float(self.crossfade_var.get()))
+        except ValueError:
+            return 0.0
+
+    def track_offsets(self):
+        self.tracks.set_crossfade(self.get_crossfade())
+        return self.tracks.offsets(), self.tracks.total()
+
     def update_total_duration(self):
-        total_seconds = sum(self.audio_durations.values())
+        self.tracks.set_crossfade(self.get_crossfade())
+        total_seconds = self.tracks.total()
         formatted_duration = self.format_duration(total_seconds)
         text = self.locales[self.current_lang].get("total_duration_label", "Total Duration: {duration}").format(duration=formatted_duration)
         self.total_duration_label.configure(text=text)
+        self.schedule_waveform_redraw()
 
     def toggle_bitrate_menu(self, *args):
         if self.format_var.get() == "mp3":
@@ -615,29 +1161,8 @@ class AudioMixerApp(ctk.CTk, TkinterDnD.DnDWrapper):
 
         self.timestamp_textbox.delete("1.0", tk.END)
         
-        total_duration_seconds = 0
-        timestamp_list = []
-
-        for path in self.audio_paths:
-            filename = os.path.basename(path)
-            track_name = os.path.splitext(filename)[0]
-            track_name = re.sub(r'[^a-zA-Zа-яА-Я0-9\s-]', '', track_name).strip()
-
-            hours, remainder = divmod(int(total_duration_seconds), 3600)
-            minutes, seconds = divmod(remainder, 60)
-            
-            if hours > 0:
-                timestamp = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            else:
-                timestamp = f"{minutes:02d}:{seconds:02d}"
-
-            timestamp_list.append(f"{timestamp} {track_name}")
-            
-            duration = self.audio_durations.get(path)
-            if duration:
-                total_duration_seconds += duration
-
-        self.timestamp_textbox.insert("1.0", "\n".join(timestamp_list))
+        offsets, _ = self.track_offsets()
+        self.timestamp_textbox.insert("1.0", "\n".join(timestamps.timestamp_lines(self.audio_paths, offsets)))
         if not silent:
             timestamps_display_name = next((display for display, internal in self.tab_display_map.items() if internal == "timestamps_tab"), "timestamps_tab")
             self.tab_view.set(timestamps_display_name)
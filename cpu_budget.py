@@ -0,0 +1,168 @@
+import math
+import os
+import platform
+import shutil
+import subprocess
+import threading
+from contextlib import contextmanager
+
+# "managed" splits the cores between concurrent ffmpeg processes; "background" also leaves some cores
+# free and lowers CPU and I/O priority so the GUI and the rest of the machine stay responsive
+CPU_MODES = ["off", "managed", "background"]
+BACKGROUND_NICE = 10
+BACKGROUND_RESERVE = 0.25
+
+
+def allowed_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _read_int(path):
+    try:
+        with open(path, "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def core_groups(cpus):
+    # Hyperthread siblings share one core's caches, so they are always handed out together
+    groups = {}
+    for cpu in cpus:
+        base = f"/sys/devices/system/cpu/cpu{cpu}/topology/"
+        key = (_read_int(base + "physical_package_id"), _read_int(base + "core_id"))
+        if None in key:
+            key = ("cpu", cpu)
+        groups.setdefault(key, []).append(cpu)
+    return sorted(groups.values(), key=lambda group: group[0])
+
+
+def partition(groups, parts):
+    # Neighbouring cores stay together, since on most CPUs they also share the last-level cache
+    parts = max(1, min(parts, len(groups)))
+    size, extra = divmod(len(groups), parts)
+    chunks, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append([cpu for group in groups[start:end] for cpu in group])
+        start = end
+    return chunks
+
+
+class CpuBudget:
+    # Hands each ffmpeg process a slot: a disjoint set of cores sized by how many processes run together.
+    # More processes than slots share the least busy slot rather than wait.
+    def __init__(self, mode="managed", slots=1):
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.pools = []
+        self.configure(mode, slots)
+
+    def configure(self, mode="managed", slots=1):
+        cpus = allowed_cpus()
+        groups = core_groups(cpus)
+        if mode == "background" and len(groups) > 1:
+            groups = groups[max(1, round(len(groups) * BACKGROUND_RESERVE)):]
+        with self.lock:
+            self.mode = mode if mode in CPU_MODES else "managed"
+            self.total_cpus = len(cpus)
+            self.groups = groups
+            self.slots = int(slots or 1)
+            self.repartition()
+
+    def repartition(self):
+        # Called with the lock held. Processes already running keep the cores they were given.
+        self.chunks = partition(self.groups, max([self.slots] + self.pools))
+        self.users = [0] * len(self.chunks)
+        self.generation += 1
+
+    @contextmanager
+    def workers(self, count):
+        # An analysis pool (pre-flight, silence, loudness) runs `count` ffmpeg processes at once; for as long
+        # as it runs there are at least that many slots, so they do not all spread over every core
+        with self.lock:
+            self.pools.append(int(count))
+            self.repartition()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.pools.remove(int(count))
+                self.repartition()
+
+    def acquire(self):
+        with self.lock:
+            if self.mode == "off":
+                return None
+            index = min(range(len(self.chunks)), key=lambda i: self.users[i])
+            self.users[index] += 1
+            cpus = self.chunks[index]
+            return {"index": index, "cpus": cpus, "threads": len(cpus), "generation": self.generation,
+                    # A slot spanning every core is left to ffmpeg's own thread defaults
+                    "pin": len(cpus) < self.total_cpus, "background": self.mode == "background"}
+
+    def release(self, slot):
+        if not slot:
+            return
+        with self.lock:
+            if slot["generation"] == self.generation:
+                self.users[slot["index"]] -= 1
+
+    @contextmanager
+    def slot(self):
+        slot = self.acquire()
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+
+def apply_threads(command, slot):
+    # Decoder, filter graph and encoder sized to the slot instead of each starting a thread per core.
+    # The encoder gets x264's own default of 1.5 threads per core.
+    if not slot or not slot["pin"]:
+        return command
+    threads = str(slot["threads"])
+    command = list(command)
+    first_input = command.index('-i') if '-i' in command else len(command) - 1
+    command[first_input:first_input] = ['-threads', threads]
+    command[1:1] = ['-filter_threads', threads, '-filter_complex_threads', threads]
+    command[-1:-1] = ['-threads', str(math.ceil(slot["threads"] * 1.5))]
+    return command
+
+
+def launch_prefix(slot):
+    # Linux pins with taskset and lowers priority with ionice/nice; macOS only has nice
+    if not slot or platform.system() == "Windows":
+        return []
+    prefix = []
+    if slot["pin"] and platform.system() == "Linux" and shutil.which("taskset"):
+        prefix += ["taskset", "-c", ",".join(str(cpu) for cpu in slot["cpus"])]
+    if slot["background"]:
+        if platform.system() == "Linux" and shutil.which("ionice"):
+            prefix += ["ionice", "-c", "2", "-n", "7"]
+        if shutil.which("nice"):
+            prefix += ["nice", "-n", str(BACKGROUND_NICE)]
+    return prefix
+
+
+def popen_kwargs(slot):
+    if slot and slot["background"] and platform.system() == "Windows":
+        return {"creationflags": subprocess.BELOW_NORMAL_PRIORITY_CLASS}
+    return {}
+
+
+def managed_command(command, slot):
+    return launch_prefix(slot) + apply_threads(command, slot)
+
+
+_shared_budget = None
+
+
+def shared_budget():
+    global _shared_budget
+    if _shared_budget is None:
+        _shared_budget = CpuBudget()
+    return _shared_budget
@@ -0,0 +1,174 @@
+import json
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+import filter_graph
+import media_cache
+import process_supervisor
+
+# Encoder presets from fastest to slowest (best compression), with rough speeds relative to the
+# middle of the ladder. The priors only fill in presets that have not been measured on this machine.
+LADDERS = {
+    "libx264": ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower"],
+    "libx265": ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower"],
+    "h264_nvenc": ["p1", "p2", "p3", "p4", "p5", "p6", "p7"],
+    "hevc_nvenc": ["p1", "p2", "p3", "p4", "p5", "p6", "p7"],
+}
+PRIOR_SPEED = {
+    "ultrafast": 8.0, "superfast": 5.5, "veryfast": 3.5, "faster": 2.2, "fast": 1.6, "medium": 1.0, "slow": 0.6, "slower": 0.3,
+    "p1": 2.2, "p2": 1.9, "p3": 1.5, "p4": 1.2, "p5": 1.0, "p6": 0.7, "p7": 0.5,
+}
+# Plans aim this far inside the budget, for decode, muxing and the load of whatever else runs overnight
+SAFETY = 0.85
+# Weight of the newest render in the running throughput average
+SMOOTHING = 0.3
+BENCHMARK_SIZE = "1920x1080"
+BENCHMARK_FRAMES = 120
+DEFAULT_PIXELS = 1920 * 1080
+
+
+def ladder(codec):
+    return LADDERS.get(codec)
+
+
+def effective_preset(codec, preset, default):
+    # A planned preset only applies where the encoder has that preset; otherwise the quality's own is kept
+    presets = ladder(codec)
+    return preset if presets and preset in presets else default
+
+
+class ThroughputLog:
+    # Measured encode speed per codec and preset, in megapixels of output frames per wall-clock second.
+    # Every headless render adds a sample, so plans follow the machine as it is, not as it was benchmarked.
+    def __init__(self, cache_dir=media_cache.CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, "throughput.json")
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.rates = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.rates = json.load(f)
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def save(self):
+        # record() runs on the --parallel worker threads; the newest snapshot is always the one written last
+        with self.save_lock:
+            with self.lock:
+                data = json.dumps(self.rates, indent=4)
+            media_cache.write_atomic(self.path, data)
+
+    def record(self, codec, preset, work, seconds):
+        if work <= 0 or seconds <= 0:
+            return
+        rate = work / seconds
+        with self.lock:
+            entry = self.rates.setdefault(codec, {}).get(preset)
+            if entry:
+                entry["rate"] = round(entry["rate"] * (1 - SMOOTHING) + rate * SMOOTHING, 4)
+                entry["samples"] += 1
+            else:
+                self.rates[codec][preset] = {"rate": round(rate, 4), "samples": 1}
+        self.save()
+
+    def measured(self, codec):
+        with self.lock:
+            return {preset: entry["rate"] for preset, entry in self.rates.get(codec, {}).items()}
+
+    def rate(self, codec, preset):
+        # An unmeasured preset is scaled from the closest measured one on the ladder by the prior speeds
+        measured = self.measured(codec)
+        if preset in measured:
+            return measured[preset]
+        presets = ladder(codec) or []
+        known = [p for p in presets if p in measured]
+        if preset not in presets or not known:
+            return None
+        nearest = min(known, key=lambda p: abs(presets.index(p) - presets.index(preset)))
+        return measured[nearest] * PRIOR_SPEED[preset] / PRIOR_SPEED[nearest]
+
+
+_shared_log = None
+
+
+def shared_log():
+    global _shared_log
+    if _shared_log is None:
+        _shared_log = ThroughputLog()
+    return _shared_log
+
+
+def benchmark(ffmpeg_path, codec, preset, log=None):
+    # A few seconds of synthetic 1080p through the encoder, used only until real renders have been measured
+    log = log or shared_log()
+    command = [ffmpeg_path, '-hide_banner', '-v', 'error', '-f', 'lavfi', '-i', f'testsrc2=size={BENCHMARK_SIZE}:rate=30',
+               '-frames:v', str(BENCHMARK_FRAMES), '-c:v', codec, '-preset', preset, '-pix_fmt', 'yuv420p', '-f', 'null', '-']
+    result = process_supervisor.run(command)
+    if result["returncode"] != 0:
+        return None
+    width, height = filter_graph.parse_size(BENCHMARK_SIZE)
+    log.record(codec, preset, width * height * BENCHMARK_FRAMES / 1e6, result["elapsed"])
+    return log.rate(codec, preset)
+
+
+def profile_pixels(profile, source_info=None):
+    size = filter_graph.parse_size(profile.get("resolution"))
+    if size:
+        return size[0] * size[1]
+    if source_info and source_info.width and source_info.height:
+        return source_info.width * source_info.height
+    return DEFAULT_PIXELS
+
+
+def render_work(profiles, duration, fps, source_info=None):
+    # Megapixels of output frames across every profile of the render
+    rate = filter_graph.parse_rate(fps) or 30
+    frames = float(duration) * float(rate)
+    return sum(profile_pixels(profile, source_info) for profile in profiles) * frames / 1e6
+
+
+def render_codec(profiles):
+    # Only renders whose outputs all use one plannable encoder are planned and measured
+    codecs = {profile.get("codec") for profile in profiles}
+    codec = codecs.pop() if len(codecs) == 1 else None
+    return codec if ladder(codec) else None
+
+
+def choose_preset(codec, work, budget_seconds, ffmpeg_path=None, log=None):
+    # The slowest preset whose estimated time still fits the budget; the fastest when none does
+    log = log or shared_log()
+    presets = ladder(codec)
+    if not presets:
+        return None, None
+    if not log.measured(codec) and ffmpeg_path:
+        benchmark(ffmpeg_path, codec, presets[len(presets) // 2], log)
+    for preset in reversed(presets):
+        rate = log.rate(codec, preset)
+        if rate and work / rate <= budget_seconds * SAFETY:
+            return preset, work / rate
+    rate = log.rate(codec, presets[0])
+    return presets[0], (work / rate if rate else None)
+
+
+def parse_deadline(text, now=None):
+    # "06:30" is the next time the clock shows 06:30; "90m", "6h" or plain seconds are a budget from now
+    now = now or datetime.now()
+    match = re.fullmatch(r'(\d{1,2}):(\d{2})', text.strip())
+    if match and (int(match.group(1)) > 23 or int(match.group(2)) > 59):
+        raise ValueError(f"Not a time of day: {text}")
+    if match:
+        target = now.replace(hour=int(match.group(1)), minute=int(match.group(2)), second=0, microsecond=0)
+        if target <= now:
+            target += timedelta(days=1)
+        return target.timestamp()
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([smh]?)', text.strip().lower())
+    if not match:
+        raise ValueError(f"Not a deadline: {text} (use HH:MM, or a budget such as 90m or 6h)")
+    seconds = float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+    return now.timestamp() + seconds
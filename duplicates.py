@@ -0,0 +1,170 @@
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import media_cache
+import process_supervisor
+
+# The decoded fingerprint covers a short window at a fixed position, decoded to low-rate mono
+FINGERPRINT_RATE = 5512
+WINDOW_SECONDS = 12
+WINDOW_START = 30
+FRAME_SIZE = 2048
+HOP_SIZE = 512
+# 17 log-spaced bands in the range most codecs keep intact give 16 bits per frame
+BANDS = 17
+MIN_HZ = 300
+MAX_HZ = 2000
+# Re-encoded copies differ in length only by encoder delay and padding
+DURATION_TOLERANCE = 0.5
+MAX_BIT_ERRORS = 0.25
+MAX_SHIFT_FRAMES = 6
+
+
+def is_available():
+    return np is not None
+
+
+def window_start(duration):
+    # Depends only on the length, so copies whose lengths differ slightly still start at almost the same point
+    return min(WINDOW_START, duration / 3)
+
+
+def decode_window(ffmpeg_path, file_path, duration):
+    command = [ffmpeg_path, '-hide_banner', '-v', 'error', '-ss', f'{window_start(duration):.3f}', '-t', str(WINDOW_SECONDS),
+               '-i', file_path, '-vn', '-ac', '1', '-ar', str(FINGERPRINT_RATE), '-f', 'f32le', '-']
+    result = process_supervisor.run(command, capture_stdout=True)
+    if result["returncode"] != 0:
+        return None
+    return np.frombuffer(result["stdout"], dtype='<f4')
+
+
+def fingerprint_bits(samples):
+    # Signs of how the energy difference between neighbouring bands changes from frame to frame;
+    # they survive re-encoding and volume changes, unlike the bytes of the file
+    if samples is None or len(samples) < FRAME_SIZE + 4 * HOP_SIZE:
+        return None
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+    power = np.abs(np.fft.rfft(frames * np.hanning(FRAME_SIZE), axis=1)) ** 2
+    bands = np.digitize(np.fft.rfftfreq(FRAME_SIZE, 1 / FINGERPRINT_RATE), np.geomspace(MIN_HZ, MAX_HZ, BANDS + 1)) - 1
+    energy = np.stack([power[:, bands == b].sum(axis=1) for b in range(BANDS)], axis=1)
+    slope = energy[:, :-1] - energy[:, 1:]
+    return slope[1:] - slope[:-1] > 0
+
+
+def audio_fingerprint(ffmpeg_path, file_path, duration, cache=None):
+    cache = cache or media_cache.shared_cache()
+    key = f"audio_fingerprint@{FINGERPRINT_RATE}@{WINDOW_START}@{WINDOW_SECONDS}"
+    try:
+        value = cache.get(file_path, key)
+    except OSError:
+        return None
+    if value is None:
+        bits = fingerprint_bits(decode_window(ffmpeg_path, file_path, duration))
+        # Too short or undecodable files are cached as empty, so they are not decoded again
+        value = np.packbits(bits, axis=1).tobytes().hex() if bits is not None else ""
+        cache.put(file_path, key, value)
+    if not value:
+        return None
+    return np.unpackbits(np.frombuffer(bytes.fromhex(value), dtype=np.uint8).reshape(-1, (BANDS - 1) // 8), axis=1).astype(bool)
+
+
+def bit_error_rate(a, b):
+    # Best match over small shifts, for copies that start a few frames apart
+    best = 1.0
+    for shift in range(-MAX_SHIFT_FRAMES, MAX_SHIFT_FRAMES + 1):
+        x, y = (a[shift:], b) if shift >= 0 else (a, b[-shift:])
+        n = min(len(x), len(y))
+        if n >= len(a) // 2:
+            best = min(best, float(np.count_nonzero(x[:n] != y[:n])) / x[:n].size)
+    return best
+
+
+def find_similar(ffmpeg_path, file_path, duration, candidates, cache=None):
+    # candidates are (path, duration) pairs of tracks already in the list; returns the first that sounds the same
+    if not is_available() or not duration:
+        return None
+    mine = audio_fingerprint(ffmpeg_path, file_path, duration, cache)
+    if mine is None:
+        return None
+    for path, other_duration in candidates:
+        theirs = audio_fingerprint(ffmpeg_path, path, other_duration, cache)
+        if theirs is not None and bit_error_rate(mine, theirs) <= MAX_BIT_ERRORS:
+            return path
+    return None
+
+
+class DuplicateIndex:
+    # Tracks of one list by content hash, for identical files under other paths or behind symlinks,
+    # and by whole seconds of length, to find the few tracks a re-encoded copy has to be compared with
+    def __init__(self, cache=None):
+        self.cache = cache or media_cache.shared_cache()
+        self.by_hash = {}
+        self.by_second = {}
+        self.entries = {}
+
+    def content_hash(self, file_path):
+        try:
+            return self.cache.content_hash(file_path)
+        except OSError:
+            return None
+
+    def candidates(self, file_path, duration):
+        if not duration:
+            return []
+        found = []
+        for second in range(int(duration - DURATION_TOLERANCE), int(duration + DURATION_TOLERANCE) + 1):
+            for path in self.by_second.get(second, ()):
+                other = self.entries[path][1]
+                if path != file_path and abs(other - duration) <= DURATION_TOLERANCE:
+                    found.append((path, other))
+        return found
+
+    def add(self, file_path, duration):
+        # Only the length is indexed here; the content hash reads the file, so it is computed off the
+        # UI thread and handed to claim
+        if duration:
+            self.by_second.setdefault(int(duration), set()).add(file_path)
+        self.entries[file_path] = (None, duration)
+
+    def set_duration(self, file_path, duration):
+        if file_path not in self.entries:
+            return
+        digest, old_duration = self.entries[file_path]
+        if old_duration:
+            self.by_second.get(int(old_duration), set()).discard(file_path)
+        if duration:
+            self.by_second.setdefault(int(duration), set()).add(file_path)
+        self.entries[file_path] = (digest, duration)
+
+    def claim(self, file_path, digest):
+        # Returns the track that already has this content, or None once file_path is indexed under it
+        if not digest or file_path not in self.entries:
+            return None
+        original = self.by_hash.setdefault(digest, file_path)
+        if original != file_path:
+            return original
+        self.entries[file_path] = (digest, self.entries[file_path][1])
+        return None
+
+    def content_hashes(self, file_paths):
+        return [self.content_hash(path) for path in file_paths]
+
+    def remove(self, file_path):
+        digest, duration = self.entries.pop(file_path, (None, None))
+        if digest and self.by_hash.get(digest) == file_path:
+            del self.by_hash[digest]
+        if duration:
+            self.by_second.get(int(duration), set()).discard(file_path)
+
+    def clear(self):
+        self.by_hash.clear()
+        self.by_second.clear()
+        self.entries.clear()
+
+
+def describe(pairs):
+    return "\n".join(f"{os.path.basename(path)} = {os.path.basename(original)}" for path, original in pairs)
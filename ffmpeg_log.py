@@ -0,0 +1,195 @@
+import collections
+import os
+import re
+import threading
+import time
+
+import media_cache
+
+LOG_PATH = os.path.join(media_cache.CACHE_DIR, "logs", "ffmpeg.log")
+# The full log of every ffmpeg run is kept on disk up to this size, plus this many rotated files
+MAX_LOG_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 3
+# Only this much of a run stays in memory, however long it renders
+RING_LINES = 200
+RING_LINE_CHARS = 2000
+TAIL_SHOWN = 20
+# Distinct errors kept for the summary; repeats of one error only raise its count
+MAX_ERRORS = 20
+SUMMARY_ERRORS = 8
+PROGRESS_LOG_SECONDS = 60
+
+ERROR_WORDS = re.compile(r'error|invalid|failed|no such|unknown|not found|cannot|could not|unable to|not supported|'
+                         r'unsupported|incorrect|does not|too many|mismatch|out of memory|permission denied', re.IGNORECASE)
+CONTEXT = re.compile(r'^\[([^\]]+?) @ (?:0x)?[0-9a-fA-F]+\]\s*(.*)$')
+FILTER_CONTEXT = re.compile(r'^Parsed_(.+)_\d+$')
+STREAM_REF = re.compile(r'(output )?stream #?(\d+):(\d+)', re.IGNORECASE)
+
+
+def input_paths(command):
+    return [command[i + 1] for i, arg in enumerate(command[:-1]) if arg == '-i']
+
+
+def parse_error(line, inputs=()):
+    # Splits one ffmpeg error line into what failed: which input, stream, filter or codec/format, and the message.
+    # Indented lines are stream and metadata listings, never errors.
+    if not line or line[0].isspace() or not ERROR_WORDS.search(line):
+        return None
+    entry = {"message": line, "component": None, "filter": None, "input": None, "output": None, "stream": None}
+    match = CONTEXT.match(line)
+    if match:
+        context, entry["message"] = match.group(1), match.group(2)
+        filter_match = FILTER_CONTEXT.match(context)
+        if filter_match:
+            entry["filter"] = filter_match.group(1)
+        elif context.startswith(("AVFilterGraph", "graph ")):
+            entry["filter"] = "graph"
+        else:
+            entry["component"] = context
+    stream = STREAM_REF.search(entry["message"])
+    if stream:
+        if stream.group(1) or "encod" in entry["message"].lower():
+            entry["output"] = int(stream.group(2))
+        else:
+            entry["input"] = int(stream.group(2))
+        entry["stream"] = f"{stream.group(2)}:{stream.group(3)}"
+    for index, path in enumerate(inputs):
+        if path and path in entry["message"]:
+            entry["input"] = index
+            entry["message"] = entry["message"].replace(path + ": ", "", 1).replace(path, os.path.basename(path))
+            break
+    return entry
+
+
+def entry_text(entry, inputs=()):
+    where = []
+    if entry["input"] is not None:
+        name = os.path.basename(inputs[entry["input"]]) if entry["input"] < len(inputs) else None
+        where.append(f"input #{entry['input']}" + (f" ({name})" if name else ""))
+    if entry["output"] is not None:
+        where.append(f"output #{entry['output']}")
+    if entry["stream"] and entry["input"] is None and entry["output"] is None:
+        where.append(f"stream {entry['stream']}")
+    if entry["filter"]:
+        where.append(f"filter {entry['filter']}")
+    if entry["component"]:
+        where.append(entry["component"])
+    text = (", ".join(where) + ": " if where else "") + entry["message"]
+    if entry.get("count", 1) > 1:
+        text += f" (x{entry['count']})"
+    return text
+
+
+class RotatingLog:
+    # One file shared by every ffmpeg the app runs; each line is tagged with the process it came from
+    def __init__(self, path=LOG_PATH, max_bytes=MAX_LOG_BYTES, backups=LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()
+        self.file = None
+        self.failed = False
+
+    def write(self, tag, text):
+        with self.lock:
+            if self.failed:
+                return
+            try:
+                if self.file is None:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    self.file = open(self.path, "a", encoding="utf-8", errors="replace")
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+                self.file.write(f"{stamp} [{tag}] {text}\n")
+                self.file.flush()
+                if self.file.tell() > self.max_bytes:
+                    self.rotate()
+            except OSError as e:
+                # Logging must never fail a render
+                print(f"FFmpeg log disabled, could not write {self.path}: {e}")
+                self.failed = True
+
+    def rotate(self):
+        self.file.close()
+        self.file = None
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+_shared_log = None
+_shared_lock = threading.Lock()
+
+
+def shared_log():
+    global _shared_log
+    with _shared_lock:
+        if _shared_log is None:
+            _shared_log = RotatingLog()
+    return _shared_log
+
+
+class LogCapture:
+    # The stderr of one ffmpeg run: every line goes to the rotating log, the last RING_LINES stay in memory,
+    # and error lines are collected, deduplicated, into a short summary
+    def __init__(self, command, log=None):
+        self.command = list(command)
+        self.inputs = input_paths(self.command)
+        self.log = log or shared_log()
+        self.tag = "ffmpeg"
+        self.ring = collections.deque(maxlen=RING_LINES)
+        self.errors = {}
+        self.more_errors = 0
+        self.last_progress_log = 0.0
+
+    def start(self, pid):
+        self.tag = f"ffmpeg {pid}"
+        self.log.write(self.tag, "$ " + " ".join(self.command))
+
+    def add(self, line):
+        self.ring.append(line[:RING_LINE_CHARS])
+        self.log.write(self.tag, line)
+        entry = parse_error(line, self.inputs)
+        if entry is None:
+            return
+        # Numbers are left out of the key so a decode error repeated on every frame is counted, not listed
+        key = (entry["component"], entry["filter"], entry["input"], re.sub(r'\d+', '#', entry["message"]))
+        if key in self.errors:
+            self.errors[key]["count"] += 1
+        elif len(self.errors) < MAX_ERRORS:
+            entry["count"] = 1
+            self.errors[key] = entry
+        else:
+            self.more_errors += 1
+
+    def progress(self, info):
+        now = time.monotonic()
+        if info["end"] or now - self.last_progress_log >= PROGRESS_LOG_SECONDS:
+            self.last_progress_log = now
+            self.log.write(self.tag, f"progress time={info['seconds']} frame={info['frame']} speed={info['speed']}")
+
+    def finish(self, returncode, ended=None):
+        self.log.write(self.tag, f"exit {returncode}" + (f" ({ended})" if ended else ""))
+
+    def tail(self):
+        return list(self.ring)
+
+    def summary(self):
+        # ffmpeg reports the cause first and its consequences after it; "Conversion failed!" adds nothing
+        entries = [entry for entry in self.errors.values() if entry["message"] != "Conversion failed!"]
+        lines = [entry_text(entry, self.inputs) for entry in entries[:SUMMARY_ERRORS]]
+        hidden = len(entries) - len(lines) + self.more_errors
+        if hidden > 0:
+            lines.append(f"... and {hidden} more")
+        return lines
+
+
+def error_text(errors, tail, log_path=None):
+    lines = errors or tail[-TAIL_SHOWN:]
+    text = "".join(line + "\n" for line in lines)
+    if log_path:
+        text += f"\nFull log: {log_path}\n"
+    return text
@@ -0,0 +1,115 @@
+from fractions import Fraction
+
+# Pixel formats hardware encoders take directly, so no conversion is needed in front of them
+GPU_PIX_FMTS = ["nv12", "yuv420p"]
+
+
+# A video chain is a list of stages: {"name": "scale", "value": "1920x1080"}. scale, fps and format
+# stages are understood by the optimizer; anything else (fade, ass, hwupload...) is passed through
+# untouched and assumed to keep the frame size, rate and pixel format. A stage with a different filter
+# name but the same effect (e.g. scale_videotoolbox) passes kind="scale".
+def stage(name, value=None, **extra):
+    return dict(extra, name=name, value=value)
+
+
+def parse_size(value):
+    try:
+        width, height = str(value).replace(":", "x").split("x")
+        return int(width), int(height)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_rate(value):
+    try:
+        rate = Fraction(str(value))
+    except (ValueError, ZeroDivisionError):
+        return None
+    return rate if rate > 0 else None
+
+
+def source_state(info, fps=None):
+    # What the decoder hands to the graph. `fps` is given for still images looped at -framerate,
+    # which arrive at exactly that constant rate.
+    state = {"width": None, "height": None, "fps": None, "pix_fmt": None}
+    if info:
+        state.update(width=info.width, height=info.height, pix_fmt=info.pix_fmt)
+        if info.constant_fps:
+            state["fps"] = info.fps
+    if fps is not None:
+        state["fps"] = parse_rate(fps)
+    return state
+
+
+def kind(item):
+    return item.get("kind", item["name"])
+
+
+def is_identity(state, item):
+    if kind(item) == "scale":
+        size = parse_size(item["value"])
+        return size is not None and size == (state["width"], state["height"])
+    if kind(item) == "fps":
+        rate = parse_rate(item["value"])
+        return rate is not None and rate == state["fps"]
+    if kind(item) == "format":
+        return state["pix_fmt"] is not None and state["pix_fmt"] in item.get("accept", [item["value"]])
+    return False
+
+
+def apply_stage(state, item):
+    state = dict(state)
+    if kind(item) == "scale":
+        state["width"], state["height"] = parse_size(item["value"]) or (None, None)
+    elif kind(item) == "fps":
+        state["fps"] = parse_rate(item["value"])
+    elif kind(item) == "format":
+        state["pix_fmt"] = item["value"]
+    return state
+
+
+def order_scale_and_fps(state, first, second):
+    # Decimating first means fewer frames to scale; when fps duplicates frames, scale the originals instead
+    fps_item, scale_item = (first, second) if kind(first) == "fps" else (second, first)
+    target = parse_rate(fps_item["value"])
+    if target is None or state["fps"] is None:
+        return [first, second]
+    return [fps_item, scale_item] if target < state["fps"] else [scale_item, fps_item]
+
+
+def optimize(stages, state):
+    # Returns the stages worth running and the frame state they produce
+    merged = []
+    for item in stages:
+        if merged and item["name"] == "scale" and merged[-1]["name"] == "scale":
+            # Two software scales in a row: one resample from the source straight to the last size
+            merged[-1] = item
+        else:
+            merged.append(item)
+
+    result = []
+    i = 0
+    while i < len(merged):
+        group = merged[i:i + 2]
+        if len(group) == 2 and {kind(group[0]), kind(group[1])} == {"scale", "fps"}:
+            group = order_scale_and_fps(state, group[0], group[1])
+        else:
+            group = group[:1]
+        for item in group:
+            if not is_identity(state, item):
+                result.append(item)
+                state = apply_stage(state, item)
+        i += len(group)
+    return result, state
+
+
+def chain_text(stages):
+    parts = [item["name"] if item["value"] is None else f"{item['name']}={item['value']}" for item in stages]
+    return ",".join(parts) or "null"
+
+
+def pix_fmt_args(state, accept=("yuv420p",), target="yuv420p", stream=""):
+    # The encoder's -pix_fmt conversion is skipped when the graph already delivers an accepted format
+    if state["pix_fmt"] in accept:
+        return []
+    return [f'-pix_fmt{stream}', target]
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import media_cache
+import media_formats
+
+SCAN_INDEX_VERSION = 1
+
+
+class FolderScanner:
+    # Walks directory trees with os.scandir on a few threads. Every directory's listing is kept with
+    # its mtime, so a rescan only lists directories whose entries changed and just stats the rest.
+    def __init__(self, cache_dir=media_cache.CACHE_DIR, max_workers=None):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, "scan_index.json")
+        self.max_workers = max_workers or min(8, (os.cpu_count() or 1) * 2)
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.dirs = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == SCAN_INDEX_VERSION:
+                self.dirs = data.get("dirs", {})
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def save(self):
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                data = json.dumps({"version": SCAN_INDEX_VERSION, "dirs": self.dirs})
+                self.dirty = False
+            media_cache.write_atomic(self.path, data)
+
+    def list_dir(self, dir_path):
+        try:
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            with self.lock:
+                if self.dirs.pop(dir_path, None) is not None:
+                    self.dirty = True
+            raise
+        with self.lock:
+            entry = self.dirs.get(dir_path)
+        if entry and entry["mtime_ns"] == mtime_ns:
+            return dir_path, entry["files"], entry["dirs"]
+
+        files, dirs = [], []
+        with os.scandir(dir_path) as scanner:
+            for item in scanner:
+                try:
+                    if item.is_dir(follow_symlinks=False):
+                        dirs.append(item.name)
+                    elif item.is_file():
+                        files.append(item.name)
+                except OSError:
+                    continue
+        files.sort()
+        dirs.sort()
+        with self.lock:
+            self.dirs[dir_path] = {"mtime_ns": mtime_ns, "files": files, "dirs": dirs}
+            self.dirty = True
+        return dir_path, files, dirs
+
+    def scan(self, root, accept=media_formats.is_audio, on_found=None, should_stop=None):
+        # on_found receives each directory's matching files as soon as that directory is listed
+        results = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = {pool.submit(self.list_dir, os.path.abspath(root))}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        dir_path, files, dirs = future.result()
+                    except OSError:
+                        continue
+                    found = [os.path.join(dir_path, name) for name in files if accept(name)]
+                    if found:
+                        results.extend(found)
+                        if on_found:
+                            on_found(found)
+                    if should_stop and should_stop():
+                        continue
+                    for name in dirs:
+                        pending.add(pool.submit(self.list_dir, os.path.join(dir_path, name)))
+        self.save()
+        return results
+
+
+_shared_scanner = None
+
+
+def shared_scanner():
+    global _shared_scanner
+    if _shared_scanner is None:
+        _shared_scanner = FolderScanner()
+    return _shared_scanner
@@ -0,0 +1,264 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import filter_graph
+import media_cache
+import media_formats
+import process_supervisor
+
+LOOP_MODES = ["off", "crossfade", "pingpong"]
+LOOP_DIR = os.path.join(media_cache.CACHE_DIR, "loops")
+DEFAULT_CROSSFADE = 1.0
+# Seamless units and conformed intermediates together are kept under this size, least recently used out first
+CACHE_LIMIT_BYTES = int(float(os.environ.get("LOOP_CACHE_MAX_GB", "20")) * 1024 ** 3)
+# Near-lossless mezzanine: the unit is re-encoded once more by the final render
+UNIT_CODEC_ARGS = ['-c:v', 'libx264', '-preset', 'fast', '-crf', '12', '-pix_fmt', 'yuv420p']
+# Conformed intermediates are decoded again for every render, so they trade size for cheap decoding
+MEZZANINE_CODEC_ARGS = ['-c:v', 'libx264', '-preset', 'fast', '-crf', '12', '-g', '15', '-bf', '0', '-tune', 'fastdecode']
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def unit_key(cache, video_path, mode, fps, crossfade=DEFAULT_CROSSFADE):
+    # Same clip content, mode and target format -> same unit, wherever the clip lives on disk
+    parts = [cache.content_hash(video_path), mode, str(fps), "yuv420p"]
+    if mode == "crossfade":
+        parts.append(f"{float(crossfade):g}")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def conform_key(cache, video_path, resolution, fps, pix_fmt="yuv420p"):
+    parts = [cache.content_hash(video_path), "conform", str(resolution), str(fps), pix_fmt]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def crossfade_filter(duration, crossfade):
+    # The unit is the clip minus its first `crossfade` seconds: the body runs on to the tail, which is
+    # blended into the head, so the unit ends on exactly the frame its next pass starts from
+    body_end = duration - crossfade
+    return (f"[0:v]split=3[body][tail][head];"
+            f"[body]trim=start={crossfade}:end={body_end},setpts=PTS-STARTPTS[b];"
+            f"[tail]trim=start={body_end}:end={duration},setpts=PTS-STARTPTS[t];"
+            f"[head]trim=end={crossfade},setpts=PTS-STARTPTS[h];"
+            f"[t][h]xfade=transition=fade:duration={crossfade}:offset=0[x];"
+            f"[b][x]concat=n=2:v=1:a=0[out]")
+
+
+def pingpong_filter(frame_count=None):
+    # Forward then reversed; the turning frames are dropped from the reversed half so neither end stalls
+    reverse_trim = f",trim=start_frame=1:end_frame={frame_count - 1}" if frame_count and frame_count > 2 else ""
+    return f"[0:v]split[f][r];[r]reverse{reverse_trim},setpts=PTS-STARTPTS[rv];[f][rv]concat=n=2:v=1:a=0[out]"
+
+
+def build_command(ffmpeg_path, video_path, info, mode, fps, output_path, crossfade=DEFAULT_CROSSFADE):
+    if mode == "crossfade":
+        if not info or not info.duration or info.duration <= 2 * crossfade:
+            raise ValueError(f"Clip is too short for a {crossfade:g}s loop crossfade.")
+        graph = crossfade_filter(info.duration, crossfade)
+    elif mode == "pingpong":
+        graph = pingpong_filter(info.frame_count if info else None)
+    else:
+        raise ValueError(f"Unknown loop mode: {mode}")
+    return [ffmpeg_path, '-y', '-v', 'error', '-i', video_path, '-filter_complex', f"{graph};[out]fps={fps}[v]",
+            '-map', '[v]', '-an'] + UNIT_CODEC_ARGS + ['-f', 'mp4', output_path]
+
+
+def conform_command(ffmpeg_path, video_path, info, resolution, fps, pix_fmt, output_path):
+    stages = [filter_graph.stage("fps", fps), filter_graph.stage("scale", resolution), filter_graph.stage("format", pix_fmt)]
+    stages, _ = filter_graph.optimize(stages, filter_graph.source_state(info))
+    return [ffmpeg_path, '-y', '-v', 'error', '-i', video_path, '-vf', filter_graph.chain_text(stages),
+            '-an'] + MEZZANINE_CODEC_ARGS + ['-pix_fmt', pix_fmt, '-f', 'mp4', output_path]
+
+
+def key_lock(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def entry_path(key):
+    return os.path.join(LOOP_DIR, f"{key}.mp4")
+
+
+def touch(path):
+    # The file's mtime doubles as its last-use time for eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def build_entry(key, command, meta):
+    path = entry_path(key)
+    os.makedirs(LOOP_DIR, exist_ok=True)
+    # key_lock only covers this process; the watch daemon and a GUI render may build the same key at once,
+    # so each build writes its own temp file (not named .mp4, so it is never listed as an entry)
+    fd, tmp_path = tempfile.mkstemp(dir=LOOP_DIR, prefix=f"{key}.", suffix=".tmp")
+    os.close(fd)
+    command[-1] = tmp_path
+    try:
+        result = process_supervisor.run(command)
+        if result["returncode"] != 0:
+            raise RuntimeError(f"Could not build {meta['kind']} for {meta['source']}: {process_supervisor.error_text(result).strip()[-2000:]}")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    meta["created"] = time.time()
+    media_cache.write_atomic(os.path.join(LOOP_DIR, f"{key}.json"), json.dumps(meta, ensure_ascii=False))
+    prune(CACHE_LIMIT_BYTES, keep={path})
+    return path
+
+
+def cached_or_built(key, build, make_command, meta):
+    path = entry_path(key)
+    with key_lock(key):
+        if os.path.exists(path):
+            touch(path)
+            return path
+        if not build:
+            return None
+        print(f"Building {meta['kind']} for {os.path.basename(meta['source'])}")
+        return build_entry(key, make_command(), meta)
+
+
+def prepare_loop(ffmpeg_path, ffprobe_path, video_path, mode, fps, crossfade=DEFAULT_CROSSFADE, cache=None):
+    # Returns the path of the seamless loop unit, building it on first use
+    cache = cache or media_cache.shared_cache()
+    key = unit_key(cache, video_path, mode, fps, crossfade)
+    meta = {"kind": f"{mode} loop unit", "source": os.path.abspath(video_path), "mode": mode, "fps": str(fps)}
+    path = cached_or_built(key, True, lambda: build_command(
+        ffmpeg_path, video_path, media_cache.probe(ffprobe_path, video_path, cache), mode, fps, entry_path(key), crossfade), meta)
+    cache.save()
+    return path
+
+
+def conform_loop(ffmpeg_path, ffprobe_path, video_path, resolution, fps, pix_fmt="yuv420p", build=True, cache=None):
+    # Returns an intermediate already at the render's size, rate and pixel format; with build=False only a cache hit
+    cache = cache or media_cache.shared_cache()
+    key = conform_key(cache, video_path, resolution, fps, pix_fmt)
+    meta = {"kind": "conformed loop", "source": os.path.abspath(video_path), "resolution": resolution, "fps": str(fps), "pix_fmt": pix_fmt}
+    path = cached_or_built(key, build, lambda: conform_command(
+        ffmpeg_path, video_path, media_cache.probe(ffprobe_path, video_path, cache), resolution, fps, pix_fmt, entry_path(key)), meta)
+    cache.save()
+    return path
+
+
+def prepare_video(ffmpeg_path, ffprobe_path, video_path, profiles, fps, loop_mode="off", crossfade=DEFAULT_CROSSFADE, conform=False):
+    # The clip a render should read: seamless unit first, then a conformed copy when every output shares one size.
+    # An existing conformed copy is always used; a new one is only built when `conform` is set.
+    if media_formats.is_image(video_path):
+        return video_path
+    if loop_mode != "off":
+        video_path = prepare_loop(ffmpeg_path, ffprobe_path, video_path, loop_mode, fps, crossfade)
+    resolutions = {profile.get("resolution") or "Original" for profile in profiles}
+    if len(resolutions) == 1 and "Original" not in resolutions:
+        conformed = conform_loop(ffmpeg_path, ffprobe_path, video_path, resolutions.pop(), fps, build=conform)
+        if conformed:
+            return conformed
+    return video_path
+
+
+def entries():
+    result = []
+    try:
+        names = os.listdir(LOOP_DIR)
+    except FileNotFoundError:
+        return result
+    for name in names:
+        if not name.endswith(".mp4"):
+            continue
+        key = name[:-4]
+        try:
+            st = os.stat(entry_path(key))
+        except OSError:
+            continue
+        meta = {}
+        try:
+            with open(os.path.join(LOOP_DIR, f"{key}.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            pass
+        result.append({"key": key, "size": st.st_size, "last_used": st.st_mtime, "meta": meta})
+    result.sort(key=lambda entry: entry["last_used"], reverse=True)
+    return result
+
+
+def remove_entry(key):
+    for path in (entry_path(key), os.path.join(LOOP_DIR, f"{key}.json")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def prune(limit_bytes, keep=()):
+    # Least recently used entries go first; a file still open by a render on Windows is skipped
+    current = entries()
+    total = sum(entry["size"] for entry in current)
+    removed = 0
+    for entry in reversed(current):
+        if total <= limit_bytes:
+            break
+        if entry_path(entry["key"]) in keep:
+            continue
+        try:
+            remove_entry(entry["key"])
+        except OSError:
+            continue
+        total -= entry["size"]
+        removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-build and inspect the cache of seamless and conformed loop clips.")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    warm = subparsers.add_parser("warm", help="Build the cached clips a render with these settings would use")
+    warm.add_argument("video", nargs="+", help="Loop clip(s)")
+    warm.add_argument("--resolution", action="append", default=[], help="Target size, e.g. 1920x1080; may be repeated")
+    warm.add_argument("--fps", default="30")
+    warm.add_argument("--mode", choices=LOOP_MODES, default="off")
+    warm.add_argument("--crossfade", type=float, default=DEFAULT_CROSSFADE)
+    subparsers.add_parser("list", help="Show cached clips, most recently used first")
+    prune_parser = subparsers.add_parser("prune", help="Evict least recently used clips")
+    prune_parser.add_argument("--max-gb", type=float, default=CACHE_LIMIT_BYTES / 1024 ** 3)
+    args = parser.parse_args()
+
+    if args.action == "warm":
+        import render_pipeline
+        ffmpeg_path, ffprobe_path = render_pipeline.find_ffmpeg()
+        failed = 0
+        for video_path in args.video:
+            for resolution in args.resolution or ["Original"]:
+                try:
+                    path = prepare_video(ffmpeg_path, ffprobe_path, video_path, [{"resolution": resolution}], args.fps,
+                                         args.mode, args.crossfade, conform=True)
+                    print(f"{video_path} @ {resolution}: {path}")
+                except (ValueError, RuntimeError) as e:
+                    print(e)
+                    failed += 1
+        return 1 if failed else 0
+    if args.action == "list":
+        current = entries()
+        for entry in current:
+            meta = entry["meta"]
+            used = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_used"]))
+            details = " ".join(f"{k}={meta[k]}" for k in ("mode", "resolution", "fps", "pix_fmt") if k in meta)
+            print(f"{entry['size'] / 1024 ** 2:9.1f} MB  {used}  {meta.get('kind', '?')}  {details}  {meta.get('source', entry['key'])}")
+        print(f"{len(current)} clip(s), {sum(e['size'] for e in current) / 1024 ** 3:.2f} GB in {LOOP_DIR}")
+        return 0
+    removed = prune(int(args.max_gb * 1024 ** 3))
+    print(f"Removed {removed} clip(s).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import math
+
+import filter_graph
+import media_cache
+import media_formats
+import process_supervisor
+
+# mpdecimate's own thresholds: a frame is dropped when no 8x8 block differs by more than `hi` and
+# at most `frac` of the blocks differ by more than `lo` from the last kept frame
+DECIMATE_PARAMS = "hi=768:lo=320:frac=0.33"
+# Below this share of dropped frames variable frame timing is not worth it and the render stays constant-rate
+MIN_SAVED_FRACTION = 0.1
+
+
+def max_drop(fps):
+    # At least one frame a second is kept, so players and YouTube can still seek in a still scene
+    rate = filter_graph.parse_rate(fps)
+    return max(1, math.ceil(rate) - 1) if rate else 29
+
+
+def decimate_stage(fps):
+    return filter_graph.stage("mpdecimate", f"{DECIMATE_PARAMS}:max_drop={max_drop(fps)}")
+
+
+def output_args():
+    # Dropped frames must stay dropped: the mp4 muxer's default constant-rate sync would duplicate them back.
+    # -vsync rather than -fps_mode so ffmpeg 4.x builds keep working.
+    return ['-vsync', 'vfr']
+
+
+def analysis_command(ffmpeg_path, video_path, fps):
+    chain = filter_graph.chain_text([filter_graph.stage("fps", fps), decimate_stage(fps)])
+    return [ffmpeg_path, '-hide_banner', '-i', video_path, '-an', '-sn',
+            '-vf', chain] + output_args() + ['-f', 'null', '-']
+
+
+def summary(frames, kept):
+    saved = 1 - kept / frames if frames else 0.0
+    return {"frames": frames, "kept": kept, "saved": round(saved, 4), "speedup": round(frames / kept, 2) if kept else 1.0}
+
+
+def measure(ffmpeg_path, video_path, fps, duration):
+    # One decode of the clip at the render's frame rate; the last progress report counts the frames mpdecimate kept
+    result = process_supervisor.run(analysis_command(ffmpeg_path, video_path, fps))
+    kept = result["progress"]["frame"] if result["progress"] else None
+    rate = filter_graph.parse_rate(fps)
+    if result["returncode"] != 0 or kept is None or not rate or not duration:
+        return None
+    frames = math.ceil(round(duration * rate, 6))
+    return summary(frames, min(kept, frames))
+
+
+def analyze(ffmpeg_path, ffprobe_path, video_path, fps, cache=None):
+    # Cached per clip content and frame rate, so a loop clip is analysed once however often it is rendered
+    if media_formats.is_image(video_path):
+        # A still image is one frame repeated: everything but the one-a-second keyframes is dropped
+        keep_every = max_drop(fps) + 1
+        return summary(keep_every, 1)
+    cache = cache or media_cache.shared_cache()
+    key = f"mpdecimate@{fps}@{DECIMATE_PARAMS}"
+    try:
+        analysis = cache.get(video_path, key)
+    except OSError:
+        return None
+    if analysis is None:
+        info = media_cache.probe(ffprobe_path, video_path, cache)
+        analysis = measure(ffmpeg_path, video_path, fps, info.duration if info else None)
+        if analysis is not None:
+            cache.put(video_path, key, analysis)
+    cache.save()
+    return analysis
+
+
+def worthwhile(analysis):
+    return bool(analysis) and analysis["saved"] >= MIN_SAVED_FRACTION
+
+
+def report_text(analysis):
+    if not analysis:
+        return "Low-motion analysis failed; rendering every frame."
+    text = f"Low-motion: {analysis['saved'] * 100:.0f}% of frames are near-duplicates (~{analysis['speedup']:.1f}x fewer frames to encode)"
+    if not worthwhile(analysis):
+        text += "; below the threshold, rendering every frame"
+    return text
@@ -9,7 +9,12 @@ import threading
 import locale
 import os
 import time
-import re
+
+import filter_graph
+import media_cache
+import media_formats
+import process_supervisor
+import render_pipeline
 
 class App(ctk.CTk, TkinterDnD.DnDWrapper):
     def __init__(self, *args, **kwargs):
@@ -21,10 +26,11 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
 
         self.video_path = ""
         self.audio_path = ""
-        self.render_process = None
+        self.render_handle = None
         self.stop_requested = False
         self.original_fps = "30"
         self.original_resolution = "1920x1080"
+        self.video_info = None
 
         self.load_locales()
         self.available_encoders = self.get_available_encoders()
@@ -219,14 +225,14 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         self.resolution_var.set(texts.get("res_4k_uhd"))
 
     def select_video(self):
-        path = filedialog.askopenfilename(filetypes=[("Video files", "*.mp4 *.mov *.avi")])
+        path = filedialog.askopenfilename(filetypes=[("Video files", media_formats.dialog_pattern(media_formats.VIDEO_EXTENSIONS))])
         if path:
             self.video_path = path
             self.get_video_info()
             self.update_ui_texts()
 
     def select_audio(self):
-        path = filedialog.askopenfilename(filetypes=[("Audio files", "*.mp3 *.wav *.flac *.aac")])
+        path = filedialog.askopenfilename(filetypes=[("Audio files", media_formats.dialog_pattern(media_formats.AUDIO_EXTENSIONS))])
         if path:
             self.audio_path = path
             self.update_ui_texts()
@@ -234,42 +240,29 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
     def handle_drop(self, event):
         files = self.tk.splitlist(event.data)
         for file in files:
-            if file.lower().endswith(('.mp4', '.mov', '.avi')):
+            if media_formats.is_video(file):
                 self.video_path = file
-            elif file.lower().endswith(('.mp3', '.wav', '.flac', '.aac')):
+            elif media_formats.is_audio(file):
                 self.audio_path = file
         self.get_video_info()
         self.update_ui_texts()
 
     def get_audio_duration(self, file_path):
-        try:
-            cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', file_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            return float(result.stdout.strip())
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            return None
+        return media_cache.get_duration('ffprobe', file_path)
 
     def get_video_info(self):
         if not self.video_path:
             return
-        try:
-            cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=width,height,r_frame_rate', '-of', 'csv=s=x:p=0', self.video_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            output = result.stdout.strip()
-            
-            res_match = re.search(r'(\d+x\d+)', output)
-            if res_match:
-                self.original_resolution = res_match.group(1)
-
-            fps_match = re.search(r'(\d+)/(\d+)', output)
-            if fps_match:
-                num, den = map(int, fps_match.groups())
-                self.original_fps = str(round(num / den)) if den != 0 else "30"
-
-        except (subprocess.CalledProcessError, FileNotFoundError, ValueError) as e:
-            print(f"Could not get video info: {e}")
+        info = media_cache.probe('ffprobe', self.video_path)
+        media_cache.shared_cache().save()
+        self.video_info = info
+        if not info or not info.width:
+            print(f"Could not get video info: {self.video_path}")
             self.original_resolution = "1920x1080"
             self.original_fps = "30"
+            return
+        self.original_resolution = f"{info.width}x{info.height}"
+        self.original_fps = media_cache.fps_text(info.fps) or "30"
 
     def start_render_thread(self):
         if not self.video_path or not self.audio_path:
@@ -293,9 +286,9 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         render_thread.start()
 
     def stop_render(self):
-        if self.render_process and self.render_process.poll() is None:
+        if self.render_handle and not self.render_handle.done():
             self.stop_requested = True
-            self.render_process.terminate()
+            self.render_handle.stop()
 
     def reset_ui_after_render(self):
         self.stop_button.grid_remove()
@@ -303,7 +296,7 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         self.render_button.grid()
         self.render_button.configure(state="normal")
         self.status_label.configure(text=self.locales[self.current_lang]["status_ready"])
-        self.render_process = None
+        self.render_handle = None
 
     def render_video(self, output_path, fade_enabled):
         start_time = time.time()
@@ -316,14 +309,9 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
             command = self.build_ffmpeg_command(output_path, audio_duration, fade_enabled)
             if not command: return
 
-            self.run_ffmpeg(command)
-            
-            monitor_thread = threading.Thread(target=self.monitor_progress, args=(audio_duration,))
-            monitor_thread.daemon = True
-            monitor_thread.start()
-
-            stdout, stderr = self.render_process.communicate()
-            return_code = self.render_process.returncode
+            result = self.run_ffmpeg(command, audio_duration)
+            return_code = result["returncode"]
+            stderr = process_supervisor.error_text(result)
 
             if self.stop_requested:
                 if self.winfo_exists(): self.after(0, self.on_render_cancel)
@@ -338,12 +326,9 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
                         print("VideoToolbox encoding failed. Retrying with CPU (libx264)...")
                         cpu_command = self.build_ffmpeg_command(output_path, audio_duration, fade_enabled, force_cpu=True)
                         if cpu_command:
-                            self.run_ffmpeg(cpu_command)
-                            monitor_thread = threading.Thread(target=self.monitor_progress, args=(audio_duration,))
-                            monitor_thread.daemon = True
-                            monitor_thread.start()
-                            stdout, stderr = self.render_process.communicate()
-                            return_code = self.render_process.returncode
+                            result = self.run_ffmpeg(cpu_command, audio_duration)
+                            return_code = result["returncode"]
+                            stderr = process_supervisor.error_text(result)
                             if self.winfo_exists():
                                 if self.stop_requested:
                                     self.after(0, self.on_render_cancel)
@@ -400,15 +385,17 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
             command.extend(['-hwaccel', 'videotoolbox'])
             use_gpu = True
         
-        command.extend(['-stream_loop', '-1', '-i', self.video_path])
+        # A finite loop count and frame count end the video exactly with the audio instead of -shortest
+        loop = render_pipeline.plan_loop(self.video_info, audio_duration, fps, media_formats.is_image(self.video_path))
+        command.extend(render_pipeline.video_input_args(self.video_path, fps, loop["stream_loop"] if loop else None))
         command.extend(['-i', self.audio_path])
 
         video_filters = []
         if use_gpu:
-            video_filters.append(f"scale_videotoolbox={resolution}")
+            video_filters.append(filter_graph.stage("scale_videotoolbox", resolution, kind="scale"))
         else:
-            video_filters.append(f"scale={resolution}")
-        video_filters.append(f"fps={fps}")
+            video_filters.append(filter_graph.stage("scale", resolution))
+        video_filters.append(filter_graph.stage("fps", fps))
 
         video_input = "[0:v]"
         audio_input = "[1:a]"
@@ -417,14 +404,15 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
 
         if fade_enabled:
             fade_duration = 1
-            fade_filter = f"fade=t=in:st=0:d={fade_duration},fade=t=out:st={audio_duration - fade_duration}:d={fade_duration}"
+            fade_filters = [filter_graph.stage("fade", f"t=in:st=0:d={fade_duration}"),
+                            filter_graph.stage("fade", f"t=out:st={audio_duration - fade_duration}:d={fade_duration}")]
             
             if use_gpu:
-                video_filters.insert(0, "hwdownload,format=nv12")
-                video_filters.append(fade_filter)
-                video_filters.append("hwupload")
+                video_filters[0:0] = [filter_graph.stage("hwdownload"), filter_graph.stage("format", "nv12")]
+                video_filters.extend(fade_filters)
+                video_filters.append(filter_graph.stage("hwupload"))
             else:
-                video_filters.append(fade_filter)
+                video_filters.extend(fade_filters)
             
             audio_fade_filter = f"{audio_input}afade=t=in:st=0:d={fade_duration},afade=t=out:st={audio_duration - fade_duration}:d={fade_duration}[a_out]"
             filter_complex_parts.append(audio_fade_filter)
@@ -432,14 +420,20 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         else:
             audio_output = audio_input
 
-        video_filter_str = f"{video_input}{','.join(video_filters)}[v_out]"
+        # Scale, fps and format stages the source already satisfies are dropped
+        video_state = filter_graph.source_state(self.video_info)
+        if use_gpu:
+            # Hardware-decoded frames stay on the GPU; their pixel format is not the probed one
+            video_state["pix_fmt"] = None
+        video_filters, video_state = filter_graph.optimize(video_filters, video_state)
+        video_filter_str = f"{video_input}{filter_graph.chain_text(video_filters)}[v_out]"
         filter_complex_parts.insert(0, video_filter_str)
         
         command.extend(['-filter_complex', ";".join(filter_complex_parts)])
         command.extend(['-map', '[v_out]', '-map', audio_output])
         
         command.extend(['-c:v', video_codec])
-        command.extend(['-pix_fmt', 'yuv420p'])
+        command.extend(filter_graph.pix_fmt_args(video_state))
 
         if "videotoolbox" in video_codec:
             if 'prores' in video_codec:
@@ -457,58 +451,31 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
             command.extend(['-crf', crf.get(quality, '23')])
             command.extend(['-preset', preset.get(quality, 'fast')])
 
-        command.extend(['-c:a', 'aac', '-b:a', '192k', '-shortest', output_path])
+        end_args = ['-frames:v', str(loop["frames"])] if loop else ['-shortest']
+        command.extend(['-c:a', 'aac', '-b:a', '192k'] + end_args + [output_path])
         print(" ".join(command))
         return command
 
-    def run_ffmpeg(self, command):
-        startupinfo = None
-        if platform.system() == "Windows":
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        
-        command.insert(1, "-progress")
-        command.insert(2, "pipe:2") # Redirect progress to stderr
+    def run_ffmpeg(self, command, total_duration=None):
+        # Blocks the render thread until ffmpeg ends; pipes and progress are handled by the supervisor
+        self.render_handle = process_supervisor.start(command, total_duration=total_duration, on_progress=self.update_progress)
+        if self.stop_requested:
+            self.render_handle.stop()
+        return self.render_handle.wait()
 
-        if platform.system() == "Windows":
-            self.render_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, startupinfo=startupinfo, universal_newlines=True)
-        else:
-            self.render_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, startupinfo=startupinfo, universal_newlines=True)
-
-    def monitor_progress(self, total_duration):
-        while True:
-            if self.render_process is None or self.render_process.poll() is not None:
-                break
-            try:
-                line = self.render_process.stderr.readline()
-                if not line: break
-                if "out_time_ms" in line:
-                    time_str = line.split("=")[1].strip()
-                    if time_str == "N/A": continue
-                    time_ms = int(time_str)
-                    progress = (time_ms / 1000000) / total_duration
-                    progress = min(max(progress, 0), 1)
-                    
-                    eta_seconds = 0
-                    if "speed=" in line:
-                        speed_match = re.search(r'speed=\s*([\d\.]+)x', line)
-                        if speed_match:
-                            speed = float(speed_match.group(1))
-                            if speed > 0:
-                                eta_seconds = (total_duration - (time_ms / 1000000)) / speed
-                    
-                    eta_str = time.strftime('%H:%M:%S', time.gmtime(eta_seconds)) if eta_seconds > 0 else "..."
-
-                    def update_gui():
-                        if self.winfo_exists():
-                            self.progress_bar.set(progress)
-                            self.status_label.configure(text=self.locales[self.current_lang]["status_progress"].format(progress=progress * 100, eta=eta_str))
-                    
-                    if self.winfo_exists():
-                        self.after(0, update_gui)
-            except (IOError, ValueError):
-                break
-            time.sleep(0.1)
+    def update_progress(self, info):
+        # Called on the supervisor's thread; the widgets are only touched from the Tk loop
+        if info["fraction"] is None or not self.winfo_exists():
+            return
+        progress = info["fraction"]
+        eta_str = time.strftime('%H:%M:%S', time.gmtime(info["eta"])) if info["eta"] else "..."
+
+        def update_gui():
+            if self.winfo_exists():
+                self.progress_bar.set(progress)
+                self.status_label.configure(text=self.locales[self.current_lang]["status_progress"].format(progress=progress * 100, eta=eta_str))
+
+        self.after(0, update_gui)
 
     def on_render_success(self, duration):
         if not self.winfo_exists(): return
@@ -8,9 +8,22 @@ import platform
 import threading
 import locale
 import os
-import re
 import time
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import audio_engine
+import cpu_budget
+import duplicates
+import loop_builder
+import low_motion
+import media_cache
+import media_formats
+import preflight
+import process_supervisor
+import render_pipeline
+import silence
+import timestamps
 
 class App(ctk.CTk, TkinterDnD.DnDWrapper):
     def __init__(self, *args, **kwargs):
@@ -22,9 +35,14 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
 
         self.video_path = ""
         self.audio_paths = []
-        self.render_process = None
+        self.duplicates = duplicates.DuplicateIndex()
+        # Content hashes of added files are read off the UI thread, one batch at a time and in list order
+        self.hash_pool = ThreadPoolExecutor(max_workers=1)
+        self.output_profiles = []
+        self.render_handle = None
         self.stop_requested = False
         self.original_fps = "30"
+        self.video_info = None
         self.original_resolution = "1920x1080"
         self.last_render_errors = ""
         self.ffmpeg_path = "ffmpeg"
@@ -35,6 +53,11 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         self.available_encoders = self.get_available_encoders()
         self.setup_ui()
         self.update_ui_texts()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        self.hash_pool.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
 
     def load_locales(self):
         try:
@@ -161,9 +184,64 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         self.fade_var = ctk.BooleanVar(value=False)
         self.fade_checkbox = ctk.CTkCheckBox(self.options_frame, variable=self.fade_var)
         self.fade_checkbox.grid(row=4, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+        self.normalize_var = ctk.BooleanVar(value=False)
+        self.normalize_checkbox = ctk.CTkCheckBox(self.options_frame, variable=self.normalize_var)
+        self.normalize_checkbox.grid(row=5, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="w")
+        self.engine_var = ctk.BooleanVar(value=False)
+        self.engine_checkbox = ctk.CTkCheckBox(self.options_frame, variable=self.engine_var)
+        self.engine_checkbox.grid(row=6, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="w")
+        if not audio_engine.is_available():
+            self.engine_checkbox.configure(state="disabled")
+        self.auto_trim_var = ctk.BooleanVar(value=False)
+        self.auto_trim_checkbox = ctk.CTkCheckBox(self.options_frame, variable=self.auto_trim_var)
+        self.auto_trim_checkbox.grid(row=7, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="w")
+        if not silence.is_available():
+            self.auto_trim_checkbox.configure(state="disabled")
+        self.crossfade_label = ctk.CTkLabel(self.options_frame, text="Crossfade (s):")
+        self.crossfade_label.grid(row=8, column=0, padx=10, pady=5, sticky="w")
+        self.crossfade_var = ctk.StringVar(value="0")
+        self.crossfade_entry = ctk.CTkEntry(self.options_frame, textvariable=self.crossfade_var)
+        self.crossfade_entry.grid(row=8, column=1, padx=10, pady=5, sticky="ew")
+        self.curve_label = ctk.CTkLabel(self.options_frame, text="Fade curve:")
+        self.curve_label.grid(row=9, column=0, padx=10, pady=5, sticky="w")
+        self.curve_var = ctk.StringVar(value="tri")
+        self.curve_menu = ctk.CTkOptionMenu(self.options_frame, variable=self.curve_var, values=audio_engine.FADE_CURVES)
+        self.curve_menu.grid(row=9, column=1, padx=10, pady=5, sticky="ew")
+        self.titles_label = ctk.CTkLabel(self.options_frame, text="Track titles:")
+        self.titles_label.grid(row=10, column=0, padx=10, pady=5, sticky="w")
+        self.titles_var = ctk.StringVar(value="off")
+        self.titles_menu = ctk.CTkOptionMenu(self.options_frame, variable=self.titles_var, values=timestamps.TITLE_MODES)
+        self.titles_menu.grid(row=10, column=1, padx=10, pady=5, sticky="ew")
+        self.loop_mode_label = ctk.CTkLabel(self.options_frame, text="Seamless loop:")
+        self.loop_mode_label.grid(row=11, column=0, padx=10, pady=5, sticky="w")
+        self.loop_mode_var = ctk.StringVar(value="off")
+        self.loop_mode_menu = ctk.CTkOptionMenu(self.options_frame, variable=self.loop_mode_var, values=loop_builder.LOOP_MODES)
+        self.loop_mode_menu.grid(row=11, column=1, padx=10, pady=5, sticky="ew")
+        self.conform_cache_var = ctk.BooleanVar(value=False)
+        self.conform_cache_checkbox = ctk.CTkCheckBox(self.options_frame, variable=self.conform_cache_var)
+        self.conform_cache_checkbox.grid(row=12, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="w")
+        self.low_motion_var = ctk.BooleanVar(value=False)
+        self.low_motion_checkbox = ctk.CTkCheckBox(self.options_frame, variable=self.low_motion_var)
+        self.low_motion_checkbox.grid(row=13, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="w")
+        self.background_var = ctk.BooleanVar(value=False)
+        self.background_checkbox = ctk.CTkCheckBox(self.options_frame, variable=self.background_var)
+        self.background_checkbox.grid(row=14, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="w")
+
+        self.profiles_frame = ctk.CTkFrame(self.render_tab)
+        self.profiles_frame.grid(row=3, column=0, padx=10, pady=0, sticky="ew")
+        self.profiles_label = ctk.CTkLabel(self.profiles_frame, text="Additional Outputs:")
+        self.profiles_label.pack(padx=10, pady=5, anchor="w")
+        self.profiles_listbox = tk.Listbox(self.profiles_frame, height=3)
+        self.profiles_listbox.pack(padx=10, pady=5, fill="x", expand=True)
+        self.profiles_buttons_frame = ctk.CTkFrame(self.profiles_frame)
+        self.profiles_buttons_frame.pack(padx=10, pady=5, fill="x", expand=True)
+        self.add_profile_button = ctk.CTkButton(self.profiles_buttons_frame, command=self.add_output_profile)
+        self.add_profile_button.pack(side="left", padx=5)
+        self.remove_profile_button = ctk.CTkButton(self.profiles_buttons_frame, command=self.remove_output_profile)
+        self.remove_profile_button.pack(side="left", padx=5)
 
         self.bottom_frame = ctk.CTkFrame(self.render_tab)
-        self.bottom_frame.grid(row=3, column=0, padx=10, pady=10, sticky="ew")
+        self.bottom_frame.grid(row=4, column=0, padx=10, pady=10, sticky="ew")
         self.bottom_frame.grid_columnconfigure(0, weight=1)
         self.render_button = ctk.CTkButton(self.bottom_frame, command=self.start_render_thread)
         self.render_button.grid(row=0, column=0, padx=10, pady=5, sticky="ew")
@@ -225,6 +303,16 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
 
         self.select_video_button.configure(text=texts["select_video"])
         self.fade_checkbox.configure(text=texts["fade_in_out"])
+        self.normalize_checkbox.configure(text=texts.get("normalize_loudness", "Normalize loudness"))
+        self.engine_checkbox.configure(text=texts.get("numpy_engine", "NumPy audio engine"))
+        self.auto_trim_checkbox.configure(text=texts.get("auto_trim_silence", "Auto-trim leading/trailing silence"))
+        self.crossfade_label.configure(text=texts.get("crossfade_label", "Crossfade (s):"))
+        self.curve_label.configure(text=texts.get("fade_curve_label", "Fade curve:"))
+        self.titles_label.configure(text=texts.get("track_titles_label", "Track titles:"))
+        self.loop_mode_label.configure(text=texts.get("loop_mode_label", "Seamless loop:"))
+        self.conform_cache_checkbox.configure(text=texts.get("conform_cache", "Cache loop scaled to output size"))
+        self.low_motion_checkbox.configure(text=texts.get("low_motion_mode", "Low-motion mode (skip near-duplicate frames)"))
+        self.background_checkbox.configure(text=texts.get("background_priority", "Render in background (keep the computer responsive)"))
         self.render_button.configure(text=texts["render"])
         self.status_label.configure(text=texts["status_ready"])
         self.video_label.configure(text=f"{texts['video_label']} {os.path.basename(self.video_path) if self.video_path else ''}")
@@ -233,6 +321,9 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         self.add_audio_button.configure(text=texts.get("add_audio", "Add Audio"))
         self.remove_audio_button.configure(text=texts.get("remove_audio", "Remove Selected"))
         self.clear_audio_button.configure(text=texts.get("clear_all_audio", "Clear All"))
+        self.profiles_label.configure(text=texts.get("output_profiles", "Additional Outputs:"))
+        self.add_profile_button.configure(text=texts.get("add_output", "Add Output"))
+        self.remove_profile_button.configure(text=texts.get("remove_output", "Remove Output"))
         self.stop_button.configure(text=texts.get("stop_render", "Stop"))
         self.codec_label.configure(text=texts.get("codec_label", "Codec:"))
         self.resolution_label.configure(text=texts.get("resolution_label", "Resolution:"))
@@ -300,72 +391,130 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         self.resolution_var.set(texts.get("res_4k_uhd"))
 
     def select_video(self):
-        path = filedialog.askopenfilename(filetypes=[("Video files", "*.mp4 *.mov *.avi")])
+        path = filedialog.askopenfilename(filetypes=[("Video files", media_formats.dialog_pattern(media_formats.VIDEO_EXTENSIONS))])
         if path:
             self.video_path = path
             self.get_video_info()
             self.update_ui_texts()
 
     def add_audio(self):
-        paths = filedialog.askopenfilenames(filetypes=[("Audio files", "*.mp3 *.wav *.flac *.aac")])
+        paths = filedialog.askopenfilenames(filetypes=[("Audio files", media_formats.dialog_pattern(media_formats.AUDIO_EXTENSIONS))])
+        self.add_audio_paths(paths)
+
+    def add_audio_paths(self, paths):
+        added = []
         for path in paths:
-            if path not in self.audio_paths:
-                self.audio_paths.append(path)
-                self.audio_listbox.insert(tk.END, os.path.basename(path))
+            if path in self.audio_paths:
+                continue
+            self.audio_paths.append(path)
+            self.duplicates.add(path, None)
+            self.audio_listbox.insert(tk.END, os.path.basename(path))
+            added.append(path)
+        self.request_duplicate_check(added)
+
+    def request_duplicate_check(self, paths):
+        if not paths:
+            return
+        future = self.hash_pool.submit(self.duplicates.content_hashes, paths)
+        future.add_done_callback(lambda f: self.after(0, self.on_duplicate_check_ready, paths, f))
+
+    def on_duplicate_check_ready(self, paths, future):
+        if future.cancelled():
+            return
+        try:
+            digests = future.result()
+        except Exception as e:
+            print(f"Could not hash added files: {e}")
+            return
+        media_cache.shared_cache().save()
+        # The same file under another path or behind a symlink is dropped like a repeated path;
+        # claim ignores files removed while the batch was hashed
+        skipped = []
+        for path, digest in zip(paths, digests):
+            original = self.duplicates.claim(path, digest)
+            if original:
+                skipped.append((path, original))
+        if skipped:
+            for path, _ in skipped:
+                i = self.audio_paths.index(path)
+                self.audio_listbox.delete(i)
+                self.duplicates.remove(path)
+                del self.audio_paths[i]
+            print("Skipped files already in the list:\n" + duplicates.describe(skipped))
+            self.status_label.configure(text=self.locales[self.current_lang].get("duplicates_skipped", "Skipped {count} file(s) already in the list").format(count=len(skipped)))
 
     def remove_audio(self):
         selected_indices = self.audio_listbox.curselection()
         for i in reversed(selected_indices):
             self.audio_listbox.delete(i)
+            self.duplicates.remove(self.audio_paths[i])
             del self.audio_paths[i]
 
     def clear_audio(self):
         self.audio_listbox.delete(0, tk.END)
         self.audio_paths.clear()
+        self.duplicates.clear()
+
+    def current_output_profile(self, output_path):
+        resolution = self.resolution_display_map.get(self.resolution_var.get(), self.original_resolution)
+        if resolution == "Original":
+            resolution = self.original_resolution
+        return {
+            "path": output_path,
+            "resolution": resolution,
+            "codec": self.active_codec_map.get(self.codec_var.get()),
+            "quality": self.quality_map.get(self.quality_var.get(), "high"),
+        }
+
+    def add_output_profile(self):
+        output_path = filedialog.asksaveasfilename(defaultextension=".mp4", filetypes=[("MP4 files", "*.mp4")])
+        if not output_path:
+            return
+        profile = self.current_output_profile(output_path)
+        self.output_profiles.append(profile)
+        self.profiles_listbox.insert(tk.END, f"{os.path.basename(output_path)} ({profile['resolution']}, {profile['codec']}, {profile['quality']})")
+
+    def remove_output_profile(self):
+        selected_indices = self.profiles_listbox.curselection()
+        for i in reversed(selected_indices):
+            self.profiles_listbox.delete(i)
+            del self.output_profiles[i]
 
     def handle_drop(self, event):
         files = self.tk.splitlist(event.data)
+        audio_files = []
         for file in files:
-            if file.lower().endswith(('.mp4', '.mov', '.avi')):
+            if media_formats.is_video(file):
                 self.video_path = file
                 self.get_video_info()
-            elif file.lower().endswith(('.mp3', '.wav', '.flac', '.aac')):
-                if file not in self.audio_paths:
-                    self.audio_paths.append(file)
-                    self.audio_listbox.insert(tk.END, os.path.basename(file))
+            elif media_formats.is_audio(file):
+                audio_files.append(file)
         self.update_ui_texts()
+        self.add_audio_paths(audio_files)
 
     def get_video_info(self):
         if not self.video_path:
             return
-        try:
-            cmd = [self.ffprobe_path, '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=width,height,r_frame_rate', '-of', 'csv=s=x:p=0', self.video_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            output = result.stdout.strip()
-            
-            res_match = re.search(r'(\d+x\d+)', output)
-            if res_match:
-                self.original_resolution = res_match.group(1)
-                self.resolution_var.set(self.original_resolution)
-
-            fps_match = re.search(r'(\d+)/(\d+)', output)
-            if fps_match:
-                num, den = map(int, fps_match.groups())
-                self.original_fps = str(round(num / den)) if den != 0 else "30"
-                self.fps_var.set(self.original_fps)
-
-        except (subprocess.CalledProcessError, FileNotFoundError, ValueError) as e:
-            print(f"Could not get video info: {e}")
+        self.video_info = media_cache.probe(self.ffprobe_path, self.video_path)
+        media_cache.shared_cache().save()
+        if not self.video_info or not self.video_info.width:
+            print(f"Could not get video info: {self.video_path}")
             self.original_resolution = "1920x1080"
             self.original_fps = "30"
+            return
+        self.original_resolution = f"{self.video_info.width}x{self.video_info.height}"
+        self.resolution_var.set(self.original_resolution)
+        self.original_fps = media_cache.fps_text(self.video_info.fps) or "30"
+        self.fps_var.set(self.original_fps)
 
     def get_audio_duration(self, file_path):
+        return media_cache.get_duration(self.ffprobe_path, file_path)
+
+    def get_crossfade(self):
         try:
-            cmd = [self.ffprobe_path, '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', file_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            return float(result.stdout.strip())
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            return None
+            return max(0.0, float(self.crossfade_var.get()))
+        except ValueError:
+            return 0.0
 
     def start_render_thread(self):
         if not self.video_path or not self.audio_paths:
@@ -378,20 +527,35 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
 
         self.stop_requested = False
         fade_enabled = self.fade_var.get()
+        normalize_enabled = self.normalize_var.get()
+        use_engine = self.engine_var.get() and audio_engine.is_available()
+        auto_trim_enabled = self.auto_trim_var.get() and silence.is_available()
+        crossfade_options = {"crossfade": self.get_crossfade(), "curve": self.curve_var.get()}
+        titles_mode = self.titles_var.get()
+        loop_mode = self.loop_mode_var.get()
+        conform_cache = self.conform_cache_var.get()
+        low_motion_enabled = self.low_motion_var.get()
+        # One render at a time; the analysis pools before it split the cores further while they run
+        cpu_budget.shared_budget().configure("background" if self.background_var.get() else "managed", 1)
+        profiles = [self.current_output_profile(output_path)] + list(self.output_profiles)
 
         self.render_button.grid_remove()
         self.stop_button.grid(row=0, column=0, padx=10, pady=5, sticky="ew")
         self.progress_bar.grid()
         self.status_label.configure(text=self.locales[self.current_lang]["status_rendering"])
         
-        render_thread = threading.Thread(target=self.render_video, args=(output_path, fade_enabled))
+        self.render_args = (profiles, fade_enabled, normalize_enabled, use_engine, auto_trim_enabled, crossfade_options, titles_mode, loop_mode, conform_cache, low_motion_enabled)
+        self.launch_render()
+
+    def launch_render(self):
+        render_thread = threading.Thread(target=self.render_video, args=self.render_args)
         render_thread.daemon = True
         render_thread.start()
 
     def stop_render(self):
-        if self.render_process and self.render_process.poll() is None:
-            self.stop_requested = True
-            self.render_process.terminate()
+        self.stop_requested = True
+        if self.render_handle and not self.render_handle.done():
+            self.render_handle.stop()
 
     def reset_ui_after_render(self):
         self.stop_button.grid_remove()
@@ -399,30 +563,90 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         self.progress_bar.grid_remove()
         self.render_button.configure(state="normal")
         self.status_label.configure(text=self.locales[self.current_lang]["status_ready"])
-        self.render_process = None
+        self.render_handle = None
 
-    def render_video(self, output_path, fade_enabled):
+    def render_video(self, profiles, fade_enabled, normalize_enabled=False, use_engine=False, auto_trim_enabled=False, crossfade_options=None, titles_mode="off", loop_mode="off", conform_cache=False, low_motion_enabled=False):
         start_time = time.time()
+        chapters_path = None
+        titles_path = None
         try:
-            total_audio_duration = sum(self.get_audio_duration(p) or 0 for p in self.audio_paths)
+            # Every input is opened and decoded at both ends first, so a broken file fails the render now and not hours in
+            if self.winfo_exists():
+                self.after(0, lambda: self.status_label.configure(text=self.locales[self.current_lang].get("status_checking_files", "Checking files...")))
+            items = [(path, "audio") for path in self.audio_paths] + [(self.video_path, "video")]
+            problems = preflight.check_files(self.ffmpeg_path, self.ffprobe_path, items)
+            if self.stop_requested:
+                if self.winfo_exists(): self.after(0, self.on_render_cancel)
+                return
+            if problems:
+                if self.winfo_exists(): self.after(0, self.on_preflight_problems, problems)
+                return
+
+            durations = [self.get_audio_duration(p) for p in self.audio_paths]
+            media_cache.shared_cache().save()
+
+            auto_trims = None
+            if auto_trim_enabled:
+                if self.winfo_exists():
+                    self.after(0, lambda: self.status_label.configure(text=self.locales[self.current_lang].get("status_detecting_silence", "Detecting silence...")))
+                auto_trims = silence.analyze_trims(self.ffmpeg_path, self.audio_paths)
+
+            track_gains = None
+            if normalize_enabled:
+                if self.winfo_exists():
+                    self.after(0, lambda: self.status_label.configure(text=self.locales[self.current_lang].get("status_analyzing_loudness", "Analyzing loudness...")))
+                track_gains = media_cache.track_gains(self.ffmpeg_path, self.audio_paths)
+            audio_tracks = render_pipeline.make_audio_tracks(self.audio_paths, gains=track_gains, auto_trims=auto_trims)
+
+            # The loop length follows the trimmed and overlapped audio, not the raw file durations
+            crossfade_options = crossfade_options or {"crossfade": 0.0, "curve": "tri"}
+            crossfade_options["lengths"] = render_pipeline.track_lengths(audio_tracks, durations)
+            offsets, total_audio_duration = render_pipeline.track_offsets(audio_tracks, durations, crossfade_options["crossfade"])
             if total_audio_duration == 0:
                 if self.winfo_exists(): self.after(0, self.on_render_error, "Could not get total audio duration or duration is zero.")
                 return
 
-            command = self.build_ffmpeg_command(output_path, total_audio_duration, fade_enabled, force_cpu=False)
+            # Chapters and the timestamps file come from the same offsets the filter graph is built from
+            timestamp_text = "\n".join(timestamps.timestamp_lines(self.audio_paths, offsets))
+            if len(profiles) == 1 and media_formats.supports_chapters(profiles[0]["path"]):
+                chapters_path = timestamps.write_chapters_file(self.audio_paths, offsets, total_audio_duration)
+            if titles_mode in ("burn", "soft"):
+                titles_path = timestamps.write_titles_file(self.audio_paths, offsets, total_audio_duration, titles_mode)
+
+            engine_tracks = None
+            if use_engine:
+                engine_tracks = [dict(track) for track in audio_tracks]
+                if fade_enabled:
+                    engine_tracks[0]["fade_in"] = 1
+                    engine_tracks[-1]["fade_out"] = 1
+
+            # Seamless units and scaled copies are built once per clip and settings and reused from the cache afterwards
+            preparing = (loop_mode != "off" or conform_cache) and not media_formats.is_image(self.video_path)
+            if preparing and self.winfo_exists():
+                self.after(0, lambda: self.status_label.configure(text=self.locales[self.current_lang].get("status_preparing_loop", "Preparing seamless loop...")))
+            video_path = loop_builder.prepare_video(self.ffmpeg_path, self.ffprobe_path, self.video_path, profiles, self.fps_var.get(), loop_mode, conform=conform_cache)
+            video_info = self.video_info if video_path == self.video_path else media_cache.probe(self.ffprobe_path, video_path)
+
+            # Near-duplicate frames of the clip are counted once and cached; they are only dropped when enough repeat
+            motion_text, decimate_frames = "", False
+            if low_motion_enabled:
+                if self.winfo_exists():
+                    self.after(0, lambda: self.status_label.configure(text=self.locales[self.current_lang].get("status_analyzing_motion", "Analyzing motion...")))
+                analysis = low_motion.analyze(self.ffmpeg_path, self.ffprobe_path, video_path, self.fps_var.get())
+                motion_text = low_motion.report_text(analysis)
+                print(motion_text)
+                decimate_frames = low_motion.worthwhile(analysis)
+            if (preparing or low_motion_enabled) and self.winfo_exists():
+                self.after(0, lambda: self.status_label.configure(text=self.locales[self.current_lang]["status_rendering"]))
+
+            output_path = profiles[0]["path"]
+            command = self.build_ffmpeg_command(profiles, total_audio_duration, fade_enabled, False, audio_tracks, use_engine, crossfade_options, chapters_path, titles_path, titles_mode, video_path, video_info, decimate_frames)
             if not command:
                 return
 
-            self.run_ffmpeg(command)
-            
-            self.last_render_errors = ""
-            monitor_thread = threading.Thread(target=self.monitor_progress, args=(total_audio_duration,))
-            monitor_thread.daemon = True
-            monitor_thread.start()
-
-            self.render_process.wait()
-            monitor_thread.join()
-            return_code = self.render_process.returncode
+            result = self.run_ffmpeg(command, engine_tracks, crossfade_options, total_audio_duration)
+            return_code = result["returncode"]
+            self.last_render_errors = process_supervisor.error_text(result)
 
             if self.stop_requested:
                 if self.winfo_exists(): self.after(0, self.on_render_cancel)
@@ -431,21 +655,16 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
             if self.winfo_exists():
                 duration = time.time() - start_time
                 if return_code == 0:
-                    self.after(0, self.on_render_success, duration, output_path)
+                    self.after(0, self.on_render_success, duration, output_path, timestamp_text, motion_text)
                 else:
                     if platform.system() == "Darwin" and "videotoolbox" in " ".join(command):
                          print("VideoToolbox encoding failed. Retrying with CPU (libx264)...")
-                         command = self.build_ffmpeg_command(output_path, total_audio_duration, fade_enabled, force_cpu=True)
-                         self.run_ffmpeg(command)
-                         
-                         self.last_render_errors = ""
-                         monitor_thread = threading.Thread(target=self.monitor_progress, args=(total_audio_duration,))
-                         monitor_thread.daemon = True
-                         monitor_thread.start()
-
-                         self.render_process.wait()
-                         monitor_thread.join()
-                         return_code = self.render_process.returncode
+                         command = self.build_ffmpeg_command(profiles, total_audio_duration, fade_enabled, True, audio_tracks, use_engine, crossfade_options, chapters_path, titles_path, titles_mode, video_path, video_info, decimate_frames)
+                         if not command:
+                             return
+                         result = self.run_ffmpeg(command, engine_tracks, crossfade_options, total_audio_duration)
+                         return_code = result["returncode"]
+                         self.last_render_errors = process_supervisor.error_text(result)
 
                          if self.winfo_exists():
                             if self.stop_requested:
@@ -453,7 +672,7 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
                                 return
                             duration = time.time() - start_time
                             if return_code == 0:
-                                self.after(0, self.on_render_success, duration, output_path)
+                                self.after(0, self.on_render_success, duration, output_path, timestamp_text, motion_text)
                             else:
                                 self.after(0, self.on_render_error, self.last_render_errors)
                     else:
@@ -462,169 +681,68 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         except Exception as e:
             if self.winfo_exists() and "main thread is not in main loop" not in str(e):
                 self.after(0, self.on_render_error, str(e))
+        finally:
+            timestamps.remove_file(chapters_path)
+            timestamps.remove_file(titles_path)
 
-    def build_ffmpeg_command(self, output_path, total_audio_duration, fade_enabled, force_cpu=False):
-        selected_codec_display = self.codec_var.get()
-        video_codec = self.active_codec_map.get(selected_codec_display)
-
-        if not video_codec:
-            self.after(0, self.on_render_error, "Selected codec is not available. Please restart the application.")
+    def build_ffmpeg_command(self, profiles, total_audio_duration, fade_enabled, force_cpu=False, audio_tracks=None, use_engine=False, crossfade_options=None, chapters_path=None, titles_path=None, titles_mode="off", video_path=None, video_info=None, decimate_frames=False):
+        crossfade_options = crossfade_options or {}
+        try:
+            return render_pipeline.build_extender_command(
+                self.ffmpeg_path, video_path or self.video_path, audio_tracks, total_audio_duration, profiles,
+                self.fps_var.get(), fade_enabled, self.available_encoders, force_cpu=force_cpu,
+                audio_stdin_args=audio_engine.pcm_input_args() if use_engine else None,
+                track_lengths=crossfade_options.get("lengths"), crossfade=crossfade_options.get("crossfade", 0.0),
+                fade_curve=crossfade_options.get("curve", "tri"), chapters_path=chapters_path,
+                titles_path=titles_path, titles_mode=titles_mode, source_info=video_info or self.video_info,
+                decimate_frames=decimate_frames
+            )
+        except ValueError as e:
+            self.after(0, self.on_render_error, str(e))
             return None
 
-        use_gpu_potential = any(c in video_codec for c in ['nvenc', 'amf', 'qsv', 'videotoolbox'])
-        if fade_enabled and use_gpu_potential:
-            force_cpu = True
-            print("Fade filter is enabled; this requires CPU filtering. Forcing CPU encoding for stability.")
-        
-        if force_cpu:
-            video_codec = 'libx264'
-            if 'libx264' not in self.available_encoders:
-                self.after(0, self.on_render_error, "libx264 codec not available for forced CPU encoding.")
-                return None
-
-        resolution_display = self.resolution_var.get()
-        resolution = self.resolution_display_map.get(resolution_display, self.original_resolution)
-        if resolution == "Original":
-            resolution = self.original_resolution
-        
-        fps = self.fps_var.get()
-        
-        selected_quality_display = self.quality_var.get()
-        quality = self.quality_map.get(selected_quality_display, "high")
-
-        command = [self.ffmpeg_path, '-y']
-        
-        use_gpu = any(c in video_codec for c in ['nvenc', 'amf', 'qsv', 'videotoolbox']) and not force_cpu
-        
-        # Inputs are always decoded on CPU for stability. No -hwaccel flags here.
-        command.extend(['-stream_loop', '-1', '-i', self.video_path])
-        for path in self.audio_paths:
-            command.extend(['-i', path])
-
-        filter_complex_parts = []
-        
-        # Audio chain
-        audio_concat_inputs = "".join([f"[{i+1}:a]" for i in range(len(self.audio_paths))])
-        audio_output_stream = "[a_concat]"
-        audio_filter = f"{audio_concat_inputs}concat=n={len(self.audio_paths)}:v=0:a=1{audio_output_stream}"
-        filter_complex_parts.append(audio_filter)
-        
-        # Video chain
-        video_input_stream = "[0:v]"
-        video_output_stream = "[v_out]"
-        video_filters = []
-
-        # CPU-based filtering
-        video_filters.append(f"scale={resolution}")
-        video_filters.append(f"fps={fps}")
-
-        if fade_enabled:
-            fade_duration = 1
-            video_filters.append(f"fade=t=in:st=0:d={fade_duration},fade=t=out:st={total_audio_duration - fade_duration}:d={fade_duration}")
-            audio_output_stream = "[a_out]"
-            audio_fade_filter = f"[a_concat]afade=t=in:st=0:d={fade_duration},afade=t=out:st={total_audio_duration - fade_duration}:d={fade_duration}{audio_output_stream}"
-            filter_complex_parts.append(audio_fade_filter)
-
-        # Upload to GPU only for encoding, if GPU is used
-        if use_gpu:
-            video_filters.append("format=nv12") 
-
-        video_filter_chain = f"{video_input_stream}{','.join(video_filters)}{video_output_stream}"
-        filter_complex_parts.insert(0, video_filter_chain)
-        
-        command.extend(['-filter_complex', ";".join(filter_complex_parts)])
-        command.extend(['-map', video_output_stream, '-map', audio_output_stream])
-        
-        command.extend(['-c:v', video_codec])
-        command.extend(['-pix_fmt', 'yuv420p'])
-
-        # Quality settings
-        if "videotoolbox" in video_codec:
-            if 'prores' in video_codec:
-                 command.extend(['-profile:v', '3' if quality == 'high' else '2'])
-            else:
-                bitrates = {'fast': '25M', 'standard': '50M', 'high': '80M'}
-                command.extend(['-b:v', bitrates.get(quality, '50M')])
-        elif 'nvenc' in video_codec or 'amf' in video_codec:
-             command.extend(['-cq', '19' if quality == 'high' else '23'])
-        elif 'qsv' in video_codec:
-             command.extend(['-global_quality', '19' if quality == 'high' else '23'])
-        else: # libx264
-            crf = {'fast': '28', 'standard': '23', 'high': '18'}
-            preset = {'fast': 'ultrafast', 'standard': 'fast', 'high': 'medium'}
-            command.extend(['-crf', crf.get(quality, '23')])
-            command.extend(['-preset', preset.get(quality, 'fast')])
-
-        command.extend(['-c:a', 'aac', '-b:a', '320k', '-shortest', output_path])
-        
-        print(" ".join(command))
-        return command
-
-    def run_ffmpeg(self, command):
-        startupinfo = None
-        if platform.system() == "Windows":
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        
-        command.insert(1, "-progress")
-        command.insert(2, "pipe:2")
+    def run_ffmpeg(self, command, engine_tracks=None, crossfade_options=None, total_duration=None):
+        # Blocks the render thread until ffmpeg ends; pipes, progress and the engine's PCM feed are handled by the supervisor
+        feed = None
+        if engine_tracks:
+            crossfade_options = crossfade_options or {}
+            blocks = audio_engine.render_blocks(
+                self.ffmpeg_path, engine_tracks, crossfade=crossfade_options.get("crossfade", 0.0),
+                curve=crossfade_options.get("curve", "tri"), should_stop=lambda: self.stop_requested
+            )
+            feed = audio_engine.pcm_chunks(blocks)
+        self.render_handle = process_supervisor.start(command, total_duration=total_duration, on_progress=self.update_progress, feed=feed)
+        if self.stop_requested:
+            self.render_handle.stop()
+        return self.render_handle.wait()
+
+    def update_progress(self, info):
+        # Called on the supervisor's thread; the widgets are only touched from the Tk loop
+        if info["fraction"] is None or not self.winfo_exists():
+            return
+        progress = info["fraction"]
+        eta_str = time.strftime('%H:%M:%S', time.gmtime(info["eta"])) if info["eta"] else "..."
 
-        self.render_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, startupinfo=startupinfo, encoding='utf-8', errors='replace')
+        def update_gui():
+            if self.winfo_exists():
+                self.progress_bar.set(progress)
+                self.status_label.configure(text=self.locales[self.current_lang]["status_progress"].format(progress=progress * 100, eta=eta_str))
 
-    def monitor_progress(self, total_duration):
-        error_output = []
-        while True:
-            if self.render_process is None or self.render_process.poll() is not None:
-                break
+        self.after(0, update_gui)
 
-            try:
-                line = self.render_process.stderr.readline()
-                if not line:
-                    break
-                
-                error_output.append(line)
-
-                if "out_time_ms" in line:
-                    time_str = line.split("=")[1].strip()
-                    if time_str == "N/A":
-                        continue
-                    time_ms = int(time_str)
-                    progress = (time_ms / 1000000) / total_duration
-                    progress = min(max(progress, 0), 1)
-
-                    eta_seconds = 0
-                    if "speed=" in line:
-                        speed_match = re.search(r'speed=\s*([\d\.]+)x', line)
-                        if speed_match:
-                            speed = float(speed_match.group(1))
-                            if speed > 0:
-                                eta_seconds = (total_duration - (time_ms / 1000000)) / speed
-                    
-                    eta_str = time.strftime('%H:%M:%S', time.gmtime(eta_seconds)) if eta_seconds > 0 else "..."
-
-                    def update_gui():
-                        if self.winfo_exists():
-                            self.progress_bar.set(progress)
-                            self.status_label.configure(text=self.locales[self.current_lang]["status_progress"].format(progress=progress * 100, eta=eta_str))
-                    
-                    if self.winfo_exists():
-                        self.after(0, update_gui)
-            except (IOError, ValueError):
-                break
-                
-            time.sleep(0.1)
-        self.last_render_errors = "".join(error_output)
-
-    def on_render_success(self, duration, output_path):
+    def on_render_success(self, duration, output_path, timestamp_text, motion_text=""):
         if not self.winfo_exists(): return
         success_message = f"Video rendered successfully in {duration:.2f} seconds!"
+        if motion_text:
+            success_message += f"\n\n{motion_text}"
         
-        self.generate_timestamps()
+        self.timestamp_textbox.delete("1.0", tk.END)
+        self.timestamp_textbox.insert("1.0", timestamp_text)
         if output_path:
             txt_path = os.path.splitext(output_path)[0] + "_timestamps.txt"
             try:
                 with open(txt_path, "w", encoding="utf-8") as f:
-                    f.write(self.timestamp_textbox.get("1.0", tk.END))
+                    f.write(timestamp_text + "\n")
                 success_message += f"\n\nTimestamps saved to:\n{txt_path}"
             except Exception as e:
                 success_message += f"\n\nCould not save timestamps: {e}"
@@ -639,6 +757,51 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         messagebox.showerror("Error", error_text)
         self.reset_ui_after_render()
 
+    def on_preflight_problems(self, problems):
+        if not self.winfo_exists(): return
+        texts = self.locales[self.current_lang]
+        report = preflight.report_text(problems)
+        bad_tracks = [p["path"] for p in problems if p["kind"] == "audio"]
+        if len(bad_tracks) < len(problems) or len(bad_tracks) == len(self.audio_paths):
+            # Skipping only makes sense while the video and at least one track are usable
+            replace = messagebox.askyesno("Warning", texts.get("preflight_replace", "{count} file(s) failed the pre-flight check:\n\n{report}\n\nChoose replacement files?").format(count=len(problems), report=report))
+            answer = False if replace else None
+        else:
+            answer = messagebox.askyesnocancel("Warning", texts.get("preflight_problems", "{count} file(s) failed the pre-flight check:\n\n{report}\n\nYes: skip these tracks and render\nNo: choose replacement files\nCancel: stop").format(count=len(problems), report=report))
+        if answer is None:
+            self.reset_ui_after_render()
+            return
+        if answer:
+            for path in bad_tracks:
+                i = self.audio_paths.index(path)
+                self.audio_listbox.delete(i)
+                self.duplicates.remove(path)
+                del self.audio_paths[i]
+        else:
+            for problem in problems:
+                self.replace_input(problem)
+        # Files that passed are cached, so the second check only looks at the replacements
+        self.launch_render()
+
+    def replace_input(self, problem):
+        title = self.locales[self.current_lang].get("preflight_replace_title", "Replacement for {name}").format(name=os.path.basename(problem["path"]))
+        if problem["kind"] == "video":
+            path = filedialog.askopenfilename(title=title, filetypes=[("Video files", media_formats.dialog_pattern(media_formats.VIDEO_EXTENSIONS))])
+            if path:
+                self.video_path = path
+                self.get_video_info()
+                self.update_ui_texts()
+            return
+        path = filedialog.askopenfilename(title=title, filetypes=[("Audio files", media_formats.dialog_pattern(media_formats.AUDIO_EXTENSIONS))])
+        if path and path not in self.audio_paths and problem["path"] in self.audio_paths:
+            i = self.audio_paths.index(problem["path"])
+            self.duplicates.remove(problem["path"])
+            self.duplicates.add(path, None)
+            self.audio_paths[i] = path
+            self.audio_listbox.delete(i)
+            self.audio_listbox.insert(i, os.path.basename(path))
+            self.request_duplicate_check([path])
+
     def on_ffmpeg_not_found(self):
         if not self.winfo_exists(): return
         messagebox.showerror("Error", "ffmpeg not found. Please ensure it is installed and in your system's PATH.")
@@ -655,29 +818,12 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
 
         self.timestamp_textbox.delete("1.0", tk.END)
         
-        total_duration_seconds = 0
-        timestamp_list = []
-
-        for path in self.audio_paths:
-            filename = os.path.basename(path)
-            track_name = os.path.splitext(filename)[0]
-            track_name = re.sub(r'[^a-zA-Zа-яА-Я0-9\s-]', '', track_name).strip()
-
-            hours, remainder = divmod(int(total_duration_seconds), 3600)
-            minutes, seconds = divmod(remainder, 60)
-            
-            if hours > 0:
-                timestamp = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            else:
-                timestamp = f"{minutes:02d}:{seconds:02d}"
-
-            timestamp_list.append(f"{timestamp} {track_name}")
-            
-            duration = self.get_audio_duration(path)
-            if duration:
-                total_duration_seconds += duration
-
-        self.timestamp_textbox.insert("1.0", "\n".join(timestamp_list))
+        auto_trims = None
+        if self.auto_trim_var.get() and silence.is_available():
+            auto_trims = silence.analyze_trims(self.ffmpeg_path, self.audio_paths)
+        tracks = render_pipeline.make_audio_tracks(self.audio_paths, auto_trims=auto_trims)
+        offsets, _ = render_pipeline.track_offsets(tracks, [self.get_audio_duration(p) for p in self.audio_paths], self.get_crossfade())
+        self.timestamp_textbox.insert("1.0", "\n".join(timestamps.timestamp_lines(self.audio_paths, offsets)))
 
     def export_to_txt(self):
         content = self.timestamp_textbox.get("1.0", tk.END)
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+
+import cpu_budget
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".video_extender_cache")
+CACHE_VERSION = 1
+HASH_BLOCK_SIZE = 256 * 1024
+# Packets read by the probe to estimate keyframe spacing; enough for a few GOPs without reading the whole file
+PROBE_PACKET_LIMIT = 600
+
+# YouTube plays music back at about -14 LUFS; keep a little true-peak headroom for the AAC/MP3 encoders
+TARGET_LUFS = -14.0
+TRUE_PEAK_LIMIT = -1.0
+
+
+class MediaCache:
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, "media_cache.json")
+        self.lock = threading.Lock()
+        # Held from the snapshot to the rename, so an older snapshot can never replace a newer file
+        self.save_lock = threading.Lock()
+        self.files = {}
+        self.media = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self.files = data.get("files", {})
+                self.media = data.get("media", {})
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def save(self):
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                data = json.dumps({"version": CACHE_VERSION, "files": self.files, "media": self.media})
+                self.dirty = False
+            write_atomic(self.path, data)
+
+    def content_hash(self, file_path):
+        # Symlinks and other spellings of one path share a single entry
+        file_path = os.path.realpath(file_path)
+        st = os.stat(file_path)
+        with self.lock:
+            entry = self.files.get(file_path)
+            if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                return entry["hash"]
+
+        # Size plus sampled blocks from the head, middle and tail identifies a media file
+        # without reading it in full; whole-file hashing would cost more than the probe itself
+        h = hashlib.sha1(str(st.st_size).encode())
+        with open(file_path, "rb") as f:
+            for offset in sorted({0, max(0, st.st_size // 2 - HASH_BLOCK_SIZE // 2), max(0, st.st_size - HASH_BLOCK_SIZE)}):
+                f.seek(offset)
+                h.update(f.read(HASH_BLOCK_SIZE))
+        digest = h.hexdigest()
+
+        with self.lock:
+            self.files[file_path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": digest}
+            self.dirty = True
+        return digest
+
+    def get(self, file_path, key):
+        digest = self.content_hash(file_path)
+        with self.lock:
+            return self.media.get(digest, {}).get(key)
+
+    def put(self, file_path, key, value):
+        digest = self.content_hash(file_path)
+        with self.lock:
+            self.media.setdefault(digest, {})[key] = value
+            self.dirty = True
+
+
+def write_atomic(path, data):
+    # Every writer gets its own temp file next to the target; a shared ".tmp" name lets concurrent
+    # saves rename each other's files away. `data` is text, or bytes for binary files.
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with (os.fdopen(fd, "wb") if isinstance(data, bytes) else os.fdopen(fd, "w", encoding="utf-8")) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+_shared_cache = None
+
+
+def shared_cache():
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = MediaCache()
+    return _shared_cache
+
+
+MediaInfo = namedtuple("MediaInfo", [
+    "duration", "width", "height", "fps", "pix_fmt", "video_codec",
+    "audio_codec", "sample_rate", "channels", "bit_rate", "keyframe_interval", "constant_fps",
+    "frame_count",
+])
+
+
+def _number(value, kind=float):
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _rate(value):
+    try:
+        rate = Fraction(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return rate if rate > 0 else None
+
+
+def parse_probe(data):
+    fmt = data.get("format", {})
+    streams = data.get("streams", [])
+    # Cover art in audio files shows up as a single-frame video stream
+    video = next((s for s in streams if s.get("codec_type") == "video" and not s.get("disposition", {}).get("attached_pic")), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    duration = _number(fmt.get("duration"))
+    if duration is None:
+        duration = max((_number(s.get("duration")) or 0 for s in streams), default=0) or None
+
+    keyframe_interval = None
+    if video:
+        keyframes = [_number(p.get("pts_time")) for p in data.get("packets", [])
+                     if p.get("stream_index") == video.get("index") and "K" in p.get("flags", "")]
+        keyframes = [t for t in keyframes if t is not None]
+        if len(keyframes) > 1:
+            keyframe_interval = round((keyframes[-1] - keyframes[0]) / (len(keyframes) - 1), 3)
+
+    fps = None
+    constant_fps = None
+    if video:
+        fps = _rate(video.get("r_frame_rate")) or _rate(video.get("avg_frame_rate"))
+        # Variable frame rate sources report an average that differs from the base rate
+        constant_fps = fps is not None and fps == _rate(video.get("avg_frame_rate"))
+
+    return {
+        "duration": duration,
+        "width": video and video.get("width"),
+        "height": video and video.get("height"),
+        "fps": str(fps) if fps else None,
+        "pix_fmt": video and video.get("pix_fmt"),
+        "video_codec": video and video.get("codec_name"),
+        "audio_codec": audio and audio.get("codec_name"),
+        "sample_rate": audio and _number(audio.get("sample_rate"), int),
+        "channels": audio and audio.get("channels"),
+        "bit_rate": _number(fmt.get("bit_rate"), int),
+        "keyframe_interval": keyframe_interval,
+        "constant_fps": constant_fps,
+        "frame_count": video and _number(video.get("nb_frames"), int),
+    }
+
+
+def media_info(entry):
+    entry = dict(entry)
+    entry["fps"] = Fraction(entry["fps"]) if entry.get("fps") else None
+    return MediaInfo(**{field: entry.get(field) for field in MediaInfo._fields})
+
+
+def run_probe(ffprobe_path, file_path):
+    # Format, every stream and the first packets' keyframe flags come back from a single ffprobe spawn
+    cmd = [ffprobe_path, '-v', 'error', '-print_format', 'json',
+           '-show_entries', 'format:stream:packet=stream_index,pts_time,flags',
+           '-read_intervals', f'%+#{PROBE_PACKET_LIMIT}', file_path]
+    # Imported here: process_supervisor logs through ffmpeg_log, which keeps its log under CACHE_DIR
+    import process_supervisor
+    try:
+        # ffprobe has no -progress, and a probe is too short to be worth a set of cores
+        result = process_supervisor.run(cmd, capture_stdout=True, progress=False, managed=False)
+        if result["returncode"] != 0:
+            return None
+        return parse_probe(json.loads(result["stdout"].decode('utf-8', errors='replace')))
+    except (OSError, ValueError):
+        return None
+
+
+def probe(ffprobe_path, file_path, cache=None):
+    cache = cache or shared_cache()
+    try:
+        entry = cache.get(file_path, "probe")
+    except OSError:
+        return None
+    if entry is None:
+        entry = run_probe(ffprobe_path, file_path)
+        if entry is None:
+            return None
+        cache.put(file_path, "probe", entry)
+    return media_info(entry)
+
+
+def fps_text(fps):
+    # Exact frame rate for the fps filter: "30" or "30000/1001" rather than a rounded 29.97 -> 30
+    if not fps:
+        return None
+    return str(fps.numerator) if fps.denominator == 1 else f"{fps.numerator}/{fps.denominator}"
+
+
+def get_duration(ffprobe_path, file_path, cache=None):
+    info = probe(ffprobe_path, file_path, cache)
+    return info.duration if info else None
+
+
+def measure_loudness(ffmpeg_path, file_path):
+    cmd = [ffmpeg_path, '-hide_banner', '-nostats', '-i', file_path, '-vn', '-sn', '-dn',
+           '-af', f'loudnorm=I={TARGET_LUFS}:TP={TRUE_PEAK_LIMIT}:print_format=json', '-f', 'null', '-']
+    import process_supervisor
+    # The stats are printed on stderr, which the supervisor only keeps the tail of
+    lines = []
+    try:
+        result = process_supervisor.run(cmd, on_line=lines.append)
+    except OSError:
+        return None
+    match = re.search(r'\{[^{}]*"input_i"[^{}]*\}', "\n".join(lines))
+    if result["returncode"] != 0 or not match:
+        return None
+    stats = json.loads(match.group(0))
+    try:
+        return {
+            "integrated": float(stats["input_i"]),
+            "true_peak": float(stats["input_tp"]),
+            "lra": float(stats["input_lra"]),
+            "threshold": float(stats["input_thresh"]),
+        }
+    except (KeyError, ValueError):
+        return None
+
+
+def get_loudness(ffmpeg_path, file_path, cache=None):
+    cache = cache or shared_cache()
+    try:
+        loudness = cache.get(file_path, "loudness")
+    except OSError:
+        return None
+    if loudness is None:
+        loudness = measure_loudness(ffmpeg_path, file_path)
+        if loudness is not None:
+            cache.put(file_path, "loudness", loudness)
+    return loudness
+
+
+def analyze_loudness(ffmpeg_path, file_paths, cache=None, max_workers=None):
+    # Only files whose content hash has no measurement yet spawn an ffmpeg analysis pass
+    cache = cache or shared_cache()
+    max_workers = max_workers or min(4, os.cpu_count() or 1)
+    with cpu_budget.shared_budget().workers(max_workers), ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(lambda p: get_loudness(ffmpeg_path, p, cache), file_paths))
+    cache.save()
+    return dict(zip(file_paths, results))
+
+
+def loudness_gain_db(loudness, target_lufs=TARGET_LUFS, true_peak_limit=TRUE_PEAK_LIMIT):
+    # Digital silence has no meaningful integrated loudness; leave such tracks untouched
+    if not loudness or loudness["integrated"] < -70:
+        return 0.0
+    gain = target_lufs - loudness["integrated"]
+    gain = min(gain, true_peak_limit - loudness["true_peak"])
+    return round(gain, 2)
+
+
+def track_gains(ffmpeg_path, file_paths, cache=None):
+    measurements = analyze_loudness(ffmpeg_path, file_paths, cache)
+    return [loudness_gain_db(measurements.get(p)) for p in file_paths]
@@ -0,0 +1,34 @@
+import os
+
+# Central list of the file types the apps accept; file dialogs, drag-and-drop and folder scans all use it
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".flac", ".aac")
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+# Output containers that can carry chapter markers
+CHAPTER_EXTENSIONS = (".mp4", ".m4a", ".m4v", ".mov", ".mkv", ".mp3")
+# Text subtitle codec each video container accepts for a soft subtitle track
+SUBTITLE_CODECS = {".mp4": "mov_text", ".m4v": "mov_text", ".mov": "mov_text", ".mkv": "srt"}
+
+
+def is_audio(path):
+    return path.lower().endswith(AUDIO_EXTENSIONS)
+
+
+def is_video(path):
+    return path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def is_image(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def supports_chapters(path):
+    return path.lower().endswith(CHAPTER_EXTENSIONS)
+
+
+def subtitle_codec(path):
+    return SUBTITLE_CODECS.get(os.path.splitext(path)[1].lower())
+
+
+def dialog_pattern(extensions):
+    return " ".join("*" + extension for extension in extensions)
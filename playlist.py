@@ -0,0 +1,93 @@
+import json
+import os
+
+import media_cache
+
+# Version 1 was a bare JSON list of paths; version 2 stores stat, fingerprint and probe data per track
+PLAYLIST_VERSION = 2
+
+
+def track_entry(ffprobe_path, path, settings=None, cache=None):
+    cache = cache or media_cache.shared_cache()
+    st = os.stat(path)
+    info = media_cache.probe(ffprobe_path, path, cache)
+    entry = {
+        "path": os.path.abspath(path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "fingerprint": cache.content_hash(path),
+        "duration": info.duration if info else None,
+        "codec": info.audio_codec if info else None,
+        "sample_rate": info.sample_rate if info else None,
+        "channels": info.channels if info else None,
+    }
+    if settings:
+        entry["settings"] = settings
+    return entry
+
+
+def save(file_path, entries):
+    # The user's own file: a crash while writing must leave the previous version in place
+    media_cache.write_atomic(file_path, json.dumps({"version": PLAYLIST_VERSION, "tracks": entries}, indent=4, ensure_ascii=False))
+
+
+def load(file_path):
+    with open(file_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return [{"path": path} for path in data]
+    if data.get("version", 0) > PLAYLIST_VERSION:
+        raise ValueError(f"Playlist version {data.get('version')} is newer than this app supports.")
+    return data.get("tracks", [])
+
+
+def check_entries(entries):
+    # Splits entries into ones whose stored metadata can be trusted as-is, ones that exist but
+    # changed on disk (and need probing again) and ones that are missing
+    valid, changed, missing = [], [], []
+    for entry in entries:
+        try:
+            st = os.stat(entry["path"])
+        except OSError:
+            missing.append(entry)
+            continue
+        if entry.get("duration") is not None and st.st_size == entry.get("size") and st.st_mtime_ns == entry.get("mtime_ns"):
+            valid.append(entry)
+        else:
+            changed.append(entry)
+    return valid, changed, missing
+
+
+def relink(entries, root, cache=None):
+    # Finds moved files under `root` by fingerprint; only files of the right size are ever hashed
+    cache = cache or media_cache.shared_cache()
+    wanted = {}
+    for entry in entries:
+        if entry.get("fingerprint") and entry.get("size") is not None:
+            wanted.setdefault(entry["size"], {})[entry["fingerprint"]] = entry["path"]
+    found = {}
+    if not wanted:
+        return found
+
+    pending = [root]
+    while pending and len(found) < len(entries):
+        try:
+            scanner = os.scandir(pending.pop())
+        except OSError:
+            continue
+        with scanner:
+            for item in scanner:
+                try:
+                    if item.is_dir(follow_symlinks=False):
+                        pending.append(item.path)
+                        continue
+                    candidates = wanted.get(item.stat().st_size)
+                    if not candidates:
+                        continue
+                    old_path = candidates.get(cache.content_hash(item.path))
+                except OSError:
+                    continue
+                if old_path and old_path not in found:
+                    found[old_path] = item.path
+    cache.save()
+    return found
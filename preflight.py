@@ -0,0 +1,94 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cpu_budget
+import media_cache
+import media_formats
+import process_supervisor
+
+# Seconds decoded at each end of a file; a full decode of a long list would take as long as the render
+SAMPLE_SECONDS = 3
+# Container durations are approximate, so the tail sample ends a little before the reported end
+TAIL_MARGIN = 0.5
+REPORT_LINES = 20
+# Not cached: a file ffprobe cannot open may be on a share that is briefly away, or ffprobe itself may be missing
+UNREADABLE = "cannot be opened as media"
+
+
+def decode_problem(ffmpeg_path, file_path, stream, start=None, frames=None):
+    # One targeted decode: input seeking jumps straight to `start` instead of decoding up to it
+    command = [ffmpeg_path, '-hide_banner', '-v', 'error', '-xerror']
+    if start:
+        command += ['-ss', f'{start:.3f}']
+    command += ['-t', str(SAMPLE_SECONDS), '-i', file_path, '-map', f'0:{stream}:0']
+    if frames:
+        command += ['-frames:v', str(frames)]
+    command += ['-f', 'null', '-']
+    result = process_supervisor.run(command)
+    if result["returncode"] != 0 or result["errors"]:
+        lines = result["errors"] or result["stderr_tail"][-1:] or [f"ffmpeg exited with {result['returncode']}"]
+        return lines[0]
+    progress = result["progress"]
+    if not progress or not (progress["frame"] or progress["seconds"]):
+        return "nothing could be decoded"
+    return None
+
+
+def find_problem(ffmpeg_path, ffprobe_path, file_path, kind, cache):
+    info = media_cache.probe(ffprobe_path, file_path, cache)
+    if info is None:
+        return UNREADABLE
+    if kind == "audio" and not info.audio_codec:
+        return "has no audio stream"
+    if kind == "video" and not info.video_codec:
+        return "has no video stream"
+    stream = "a" if kind == "audio" else "v"
+    if media_formats.is_image(file_path):
+        problem = decode_problem(ffmpeg_path, file_path, stream, frames=1)
+        return problem and f"does not decode: {problem}"
+    if not info.duration:
+        return "has no known duration"
+    problem = decode_problem(ffmpeg_path, file_path, stream)
+    if problem:
+        return f"start does not decode: {problem}"
+    if info.duration > 2 * SAMPLE_SECONDS:
+        # A truncated download keeps the duration of the whole file in its header but has no data at the end
+        problem = decode_problem(ffmpeg_path, file_path, stream, start=max(0, info.duration - SAMPLE_SECONDS - TAIL_MARGIN))
+        if problem:
+            return f"end does not decode: {problem}"
+    return None
+
+
+def check_file(ffmpeg_path, ffprobe_path, file_path, kind, cache=None):
+    # None for a usable file, otherwise a short description of what is wrong; cached per content fingerprint
+    cache = cache or media_cache.shared_cache()
+    if not os.path.isfile(file_path):
+        return "file not found"
+    key = f"preflight@{kind}@{SAMPLE_SECONDS}@{TAIL_MARGIN}"
+    try:
+        result = cache.get(file_path, key)
+    except OSError as e:
+        return f"cannot be read: {e.strerror or e}"
+    if result is None:
+        result = {"problem": find_problem(ffmpeg_path, ffprobe_path, file_path, kind, cache)}
+        if result["problem"] != UNREADABLE:
+            cache.put(file_path, key, result)
+    return result["problem"]
+
+
+def check_files(ffmpeg_path, ffprobe_path, items, cache=None, max_workers=None):
+    # items are (path, "audio" | "video") pairs; returns the failing ones, in list order
+    cache = cache or media_cache.shared_cache()
+    items = list(dict.fromkeys(items))
+    max_workers = max_workers or min(8, os.cpu_count() or 1)
+    with cpu_budget.shared_budget().workers(max_workers), ThreadPoolExecutor(max_workers=max_workers) as pool:
+        problems = list(pool.map(lambda item: check_file(ffmpeg_path, ffprobe_path, item[0], item[1], cache), items))
+    cache.save()
+    return [{"path": path, "kind": kind, "problem": problem} for (path, kind), problem in zip(items, problems) if problem]
+
+
+def report_text(problems, limit=REPORT_LINES):
+    lines = [f"{os.path.basename(p['path'])}: {p['problem']}" for p in problems[:limit]]
+    if len(problems) > limit:
+        lines.append(f"... and {len(problems) - limit} more")
+    return "\n".join(lines)
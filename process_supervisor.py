@@ -0,0 +1,299 @@
+import asyncio
+import os
+import platform
+import re
+import subprocess
+import sys
+import threading
+import time
+
+import cpu_budget
+import ffmpeg_log
+
+# Seconds ffmpeg gets to finish the file after "q" (or the end of its piped input) before it is terminated,
+# and again after terminate before it is killed
+GRACE_SECONDS = 10.0
+KILL_SECONDS = 5.0
+# Longest single line read from a pipe; ffmpeg's own lines are far shorter
+LINE_LIMIT = 1024 * 1024
+PROGRESS_LINE = re.compile(r'^(frame|fps|stream_\d+_\d+_q|bitrate|total_size|out_time_us|out_time_ms|out_time|'
+                           r'dup_frames|drop_frames|speed|progress)=(.*)$')
+
+
+def _number(value):
+    try:
+        return float(str(value).strip().rstrip("x"))
+    except ValueError:
+        return None
+
+
+def progress_info(block, total_duration=None):
+    # out_time_ms is in microseconds as well, despite its name; newer builds also write out_time_us
+    micros = _number(block.get("out_time_us", block.get("out_time_ms", "N/A")))
+    seconds = micros / 1000000 if micros is not None and micros >= 0 else None
+    speed = _number(block.get("speed", "N/A"))
+    frame = _number(block.get("frame", "N/A"))
+    info = {"seconds": seconds, "speed": speed, "frame": int(frame) if frame is not None else None,
+            "fraction": None, "eta": None, "end": block.get("progress") == "end"}
+    if total_duration and seconds is not None:
+        info["fraction"] = min(max(seconds / total_duration, 0), 1)
+        if speed:
+            info["eta"] = max(0.0, (total_duration - seconds) / speed)
+    return info
+
+
+def error_text(result):
+    return ffmpeg_log.error_text(result["errors"], result["stderr_tail"], result["log_path"])
+
+
+def hidden_window_kwargs():
+    if platform.system() != "Windows":
+        return {}
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return {"startupinfo": startupinfo}
+
+
+class ProcessHandle:
+    # One supervised ffmpeg run. Methods other than wait() are safe to call from any thread.
+    def __init__(self, supervisor, command, total_duration=None, on_progress=None, on_line=None, feed=None,
+                 timeout=None, stall_timeout=None, capture_stdout=False, progress=True, managed=True):
+        self.supervisor = supervisor
+        self.command = list(command)
+        self.total_duration = total_duration
+        self.on_progress = on_progress
+        self.on_line = on_line
+        self.feed = feed
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.capture_stdout = capture_stdout
+        self.progress = progress
+        self.managed = managed
+        self.process = None
+        self.ending = None
+        self.last_activity = time.monotonic()
+        self.log = ffmpeg_log.LogCapture(self.command)
+        self.stdout_chunks = []
+        self.last_progress = None
+        self.feed_error = None
+        self.future = None
+
+    def argv(self, slot):
+        command = list(self.command)
+        if self.progress:
+            # Machine-readable progress on stderr instead of the carriage-return stats line
+            command[1:1] = ["-progress", "pipe:2", "-nostats"]
+        return cpu_budget.managed_command(command, slot)
+
+    async def run(self):
+        slot = cpu_budget.shared_budget().acquire() if self.managed else None
+        start_time = time.monotonic()
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                *self.argv(slot), stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE, limit=LINE_LIMIT, **hidden_window_kwargs(), **cpu_budget.popen_kwargs(slot))
+            self.log.start(self.process.pid)
+            if self.ending:
+                # Stopped while it was starting
+                asyncio.ensure_future(self.terminate(self.ending, force=True))
+            tasks = [asyncio.ensure_future(self.read_stderr()), asyncio.ensure_future(self.read_stdout())]
+            feeder = asyncio.ensure_future(self.feed_stdin()) if self.feed is not None else None
+            watchdog = asyncio.ensure_future(self.watch())
+            await self.process.wait()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for task in (feeder, watchdog):
+                if task:
+                    task.cancel()
+        finally:
+            cpu_budget.shared_budget().release(slot)
+        self.log.finish(self.process.returncode, self.ending)
+        if self.feed_error:
+            # The producer failed, so whatever ffmpeg wrote is incomplete even if it exited cleanly
+            raise self.feed_error
+        return {
+            "returncode": self.process.returncode,
+            "elapsed": time.monotonic() - start_time,
+            "ended": self.ending,
+            "stderr_tail": self.log.tail(),
+            "errors": self.log.summary(),
+            "log_path": self.log.log.path,
+            "stdout": b"".join(self.stdout_chunks) if self.capture_stdout else None,
+            "progress": self.last_progress,
+        }
+
+    async def read_stderr(self):
+        block = {}
+        overlong = False
+        while True:
+            try:
+                raw = await self.process.stderr.readuntil(b"\n")
+            except asyncio.IncompleteReadError as e:
+                raw = e.partial
+            except asyncio.LimitOverrunError as e:
+                # A line longer than LINE_LIMIT is dropped, up to its newline, instead of ending the reader
+                await self.process.stderr.readexactly(e.consumed)
+                self.last_activity = time.monotonic()
+                overlong = True
+                continue
+            if not raw:
+                break
+            self.last_activity = time.monotonic()
+            if overlong:
+                overlong = not raw.endswith(b"\n")
+                continue
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            match = PROGRESS_LINE.match(line)
+            if match:
+                block[match.group(1)] = match.group(2).strip()
+                if match.group(1) == "progress":
+                    self.last_progress = progress_info(block, self.total_duration)
+                    self.log.progress(self.last_progress)
+                    block = {}
+                    if self.on_progress:
+                        self.on_progress(self.last_progress)
+            elif line:
+                self.log.add(line)
+                if self.on_line:
+                    self.on_line(line)
+
+    async def read_stdout(self):
+        # Always drained, so a process that writes to stdout can never block on a full pipe
+        while True:
+            chunk = await self.process.stdout.read(65536)
+            if not chunk:
+                break
+            if self.capture_stdout:
+                self.stdout_chunks.append(chunk)
+
+    async def feed_stdin(self):
+        # The producer (e.g. the NumPy audio engine) runs on the loop's shared executor one chunk at a time
+        loop = asyncio.get_running_loop()
+        iterator = iter(self.feed)
+        try:
+            while not self.ending:
+                chunk = await loop.run_in_executor(None, next, iterator, None)
+                if chunk is None:
+                    break
+                self.process.stdin.write(chunk)
+                await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            self.feed_error = e
+            self.ending = self.ending or "failed"
+        finally:
+            self.close_stdin()
+
+    async def watch(self):
+        start_time = time.monotonic()
+        while self.process.returncode is None:
+            await asyncio.sleep(1)
+            now = time.monotonic()
+            if self.timeout and now - start_time > self.timeout:
+                await self.terminate("timeout")
+            elif self.stall_timeout and now - self.last_activity > self.stall_timeout:
+                await self.terminate("stalled")
+
+    def close_stdin(self):
+        try:
+            self.process.stdin.close()
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+
+    async def wait_exit(self, seconds):
+        try:
+            await asyncio.wait_for(asyncio.shield(self.process.wait()), seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def terminate(self, reason, force=False):
+        # "q" asks ffmpeg to stop and still write a playable file; a piped-input render is ended by closing
+        # its input instead. Only if that does not end it in time is it terminated, and then killed.
+        if self.process is None or self.process.returncode is not None or (self.ending and not force):
+            self.ending = self.ending or reason
+            return
+        self.ending = reason
+        if self.feed is None:
+            try:
+                self.process.stdin.write(b"q")
+                await self.process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError, OSError):
+                pass
+        self.close_stdin()
+        if await self.wait_exit(GRACE_SECONDS):
+            return
+        try:
+            self.process.terminate()
+            if await self.wait_exit(KILL_SECONDS):
+                return
+            self.process.kill()
+        except ProcessLookupError:
+            pass
+
+    def stop(self, reason="stopped"):
+        self.supervisor.loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self.terminate(reason)))
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def wait(self, timeout=None):
+        return self.future.result(timeout)
+
+
+def use_pidfd_watcher(loop):
+    # Before 3.12 asyncio waits for every child on a thread of its own; with a pidfd watcher the loop
+    # itself is told when a child exits (3.12 picks this watcher by itself)
+    if sys.version_info >= (3, 12) or not hasattr(asyncio, "PidfdChildWatcher") or not hasattr(os, "pidfd_open"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except OSError:
+        return
+    watcher = asyncio.PidfdChildWatcher()
+    watcher.attach_loop(loop)
+    asyncio.set_child_watcher(watcher)
+
+
+class ProcessSupervisor:
+    # Every ffmpeg the apps start runs on this one event loop thread: pipes are drained, progress parsed and
+    # timeouts enforced without a reader or monitor thread per process
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loop = None
+
+    def ensure_loop(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                use_pidfd_watcher(self.loop)
+                threading.Thread(target=self.loop.run_forever, name="process-supervisor", daemon=True).start()
+        return self.loop
+
+    def start(self, command, **options):
+        handle = ProcessHandle(self, command, **options)
+        handle.future = asyncio.run_coroutine_threadsafe(handle.run(), self.ensure_loop())
+        return handle
+
+    def run(self, command, **options):
+        return self.start(command, **options).wait()
+
+
+_shared_supervisor = None
+_shared_lock = threading.Lock()
+
+
+def shared_supervisor():
+    global _shared_supervisor
+    with _shared_lock:
+        if _shared_supervisor is None:
+            _shared_supervisor = ProcessSupervisor()
+    return _shared_supervisor
+
+
+def start(command, **options):
+    return shared_supervisor().start(command, **options)
+
+
+def run(command, **options):
+    return shared_supervisor().run(command, **options)
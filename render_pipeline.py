@@ -0,0 +1,674 @@
+import argparse
+import json
+import math
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cpu_budget
+import deadline
+import filter_graph
+import loop_builder
+import low_motion
+import media_cache
+import media_formats
+import preflight
+import process_supervisor
+import silence
+import timestamps
+
+GPU_CODEC_MARKERS = ['nvenc', 'amf', 'qsv', 'videotoolbox']
+X264_PRESETS = {'fast': 'ultrafast', 'standard': 'fast', 'high': 'medium'}
+STALL_SECONDS = 600
+
+
+def find_ffmpeg():
+    if getattr(sys, 'frozen', False):
+        base_path = sys._MEIPASS
+    else:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+
+    ffmpeg_exe = "ffmpeg.exe" if platform.system() == "Windows" else "ffmpeg"
+    ffprobe_exe = "ffprobe.exe" if platform.system() == "Windows" else "ffprobe"
+
+    local_ffmpeg = os.path.join(base_path, ffmpeg_exe)
+    local_ffprobe = os.path.join(base_path, ffprobe_exe)
+
+    ffmpeg_path = local_ffmpeg if os.path.exists(local_ffmpeg) else "ffmpeg"
+    ffprobe_path = local_ffprobe if os.path.exists(local_ffprobe) else "ffprobe"
+    return ffmpeg_path, ffprobe_path
+
+
+def get_available_encoders(ffmpeg_path):
+    result = subprocess.run([ffmpeg_path, '-encoders'], capture_output=True, text=True, check=True, encoding='utf-8', errors='replace')
+    available = set()
+    for line in result.stdout.splitlines():
+        line = line.strip()
+        if line.startswith('V'):
+            parts = line.split()
+            if len(parts) > 1:
+                available.add(parts[1])
+    return available
+
+
+def is_gpu_codec(video_codec):
+    return any(c in video_codec for c in GPU_CODEC_MARKERS)
+
+
+def video_preset(video_codec, quality, preset=None):
+    # A profile's "preset" (set by hand or by a deadline plan) replaces the one its quality implies
+    if 'nvenc' in video_codec:
+        return deadline.effective_preset(video_codec, preset, None)
+    return deadline.effective_preset(video_codec, preset, X264_PRESETS.get(quality, 'fast'))
+
+
+def video_quality_args(video_codec, quality, stream=":v", preset=None):
+    # `stream` is the output stream specifier, e.g. ":v:1" for the second profile of a tee render
+    if "videotoolbox" in video_codec:
+        if 'prores' in video_codec:
+            return ['-profile' + stream, '3' if quality == 'high' else '2']
+        bitrates = {'fast': '25M', 'standard': '50M', 'high': '80M'}
+        return ['-b' + stream, bitrates.get(quality, '50M')]
+    if 'nvenc' in video_codec or 'amf' in video_codec:
+        args = ['-cq' + stream, '19' if quality == 'high' else '23']
+        preset = video_preset(video_codec, quality, preset) if 'nvenc' in video_codec else None
+        return args + (['-preset' + stream, preset] if preset else [])
+    if 'qsv' in video_codec:
+        return ['-global_quality' + stream, '19' if quality == 'high' else '23']
+    crf = {'fast': '28', 'standard': '23', 'high': '18'}
+    return ['-crf' + stream, crf.get(quality, '23'), '-preset' + stream, video_preset(video_codec, quality, preset)]
+
+
+def resolve_profile_codec(profile, fade_enabled, available_encoders, force_cpu=False):
+    video_codec = profile.get("codec")
+    if not video_codec or (available_encoders and video_codec not in available_encoders):
+        raise ValueError(f"Selected codec is not available: {video_codec}")
+
+    if fade_enabled and is_gpu_codec(video_codec):
+        print("Fade filter is enabled; this requires CPU filtering. Forcing CPU encoding for stability.")
+        force_cpu = True
+
+    if force_cpu and video_codec != 'libx264':
+        if available_encoders and 'libx264' not in available_encoders:
+            raise ValueError("libx264 codec not available for forced CPU encoding.")
+        video_codec = 'libx264'
+    return video_codec
+
+
+def make_audio_tracks(paths, track_settings=None, gains=None, auto_trims=None):
+    tracks = []
+    for i, path in enumerate(paths):
+        track = {"path": path, "gain_db": 0.0, "trim_start": 0.0, "trim_end": None, "gap_after": 0.0}
+        # Detected silence trims come first so that trims set by hand on a track still win
+        if auto_trims and path in auto_trims:
+            track.update(auto_trims[path])
+        if track_settings and path in track_settings:
+            track.update(track_settings[path])
+        if gains:
+            track["gain_db"] = round(track["gain_db"] + gains[i], 2)
+        tracks.append(track)
+    return tracks
+
+
+def audio_input_args(track):
+    # Input-side seeking keeps trimmed audio from ever being decoded
+    args = []
+    if track.get("trim_start"):
+        args.extend(['-ss', f"{track['trim_start']:.3f}"])
+    if track.get("trim_end") is not None:
+        args.extend(['-t', f"{track['trim_end'] - (track.get('trim_start') or 0):.3f}"])
+    args.extend(['-i', track["path"]])
+    return args
+
+
+def track_duration(track, probed_duration):
+    end = track.get("trim_end")
+    end = probed_duration if end is None else min(end, probed_duration)
+    return max(0.0, end - (track.get("trim_start") or 0))
+
+
+def track_lengths(tracks, durations):
+    return [track_duration(t, d or 0) for t, d in zip(tracks, durations)]
+
+
+def overlap_lengths(tracks, lengths, crossfade=0.0):
+    # Overlap between track i and i+1; a gap after a track disables its crossfade, and a short
+    # track never fades out over audio already used by its incoming crossfade
+    overlaps = []
+    for i in range(len(tracks) - 1):
+        if crossfade and not tracks[i].get("gap_after"):
+            available = lengths[i] - (overlaps[i - 1] if i > 0 else 0.0)
+            overlaps.append(max(0.0, min(crossfade, available, lengths[i + 1])))
+        else:
+            overlaps.append(0.0)
+    return overlaps
+
+
+def track_offsets(tracks, durations, crossfade=0.0):
+    # Start of every track in the mix plus the total length, following trims, gaps and overlaps
+    lengths = track_lengths(tracks, durations)
+    overlaps = overlap_lengths(tracks, lengths, crossfade)
+    offsets = []
+    position = 0.0
+    for i, (track, length) in enumerate(zip(tracks, lengths)):
+        offsets.append(position)
+        position += length
+        if i < len(tracks) - 1:
+            position += (track.get("gap_after") or 0) - overlaps[i]
+    return offsets, position
+
+
+def build_audio_concat(first_input, tracks, output="[a_concat]", lengths=None, crossfade=0.0, curve="tri"):
+    # Per-track gains are plain linear volume stages measured ahead of time, so a single pass suffices
+    overlaps = overlap_lengths(tracks, lengths, crossfade) if lengths and crossfade else [0.0] * (len(tracks) - 1)
+    parts = []
+    labels = []
+    previous_tail = None
+    for i, track in enumerate(tracks):
+        label = f"[{first_input + i}:a]"
+        track_filters = []
+        if track.get("gain_db"):
+            track_filters.append(f"volume={track['gain_db']}dB")
+
+        overlap_in = overlaps[i - 1] if i > 0 else 0.0
+        overlap_out = overlaps[i] if i < len(tracks) - 1 else 0.0
+        if overlap_in or overlap_out:
+            # Crossfades stay flat: each track is split into head/body/tail, only the short overlap
+            # segments go through acrossfade and one concat joins bodies and overlaps in order
+            names = ["body"] + (["head"] if overlap_in else []) + (["tail"] if overlap_out else [])
+            split = track_filters + [f"asplit={len(names)}"]
+            parts.append(f"{label}{','.join(split)}{''.join(f'[a_{name}_in{i}]' for name in names)}")
+
+            body_end = lengths[i] - overlap_out
+            body_filters = [f"atrim=start={overlap_in:.3f}:end={body_end:.3f}", "asetpts=PTS-STARTPTS"]
+            if track.get("gap_after") and i < len(tracks) - 1:
+                body_filters.append(f"apad=pad_dur={track['gap_after']}")
+            parts.append(f"[a_body_in{i}]{','.join(body_filters)}[a_body{i}]")
+            if overlap_in:
+                parts.append(f"[a_head_in{i}]atrim=end={overlap_in:.3f},asetpts=PTS-STARTPTS[a_head{i}]")
+                parts.append(f"{previous_tail}[a_head{i}]acrossfade=d={overlap_in:.3f}:c1={curve}:c2={curve}[a_xfade{i - 1}]")
+                labels.append(f"[a_xfade{i - 1}]")
+            labels.append(f"[a_body{i}]")
+            previous_tail = None
+            if overlap_out:
+                parts.append(f"[a_tail_in{i}]atrim=start={body_end:.3f},asetpts=PTS-STARTPTS[a_tail{i}]")
+                previous_tail = f"[a_tail{i}]"
+            continue
+
+        if track.get("gap_after") and i < len(tracks) - 1:
+            track_filters.append(f"apad=pad_dur={track['gap_after']}")
+        if track_filters:
+            parts.append(f"{label}{','.join(track_filters)}[a_track{i}]")
+            label = f"[a_track{i}]"
+        labels.append(label)
+    parts.append(f"{''.join(labels)}concat=n={len(labels)}:v=0:a=1{output}")
+    return parts
+
+
+def mix_codec_args(file_format, bitrate="192"):
+    if file_format == 'mp3':
+        return ['-c:a', 'libmp3lame', '-b:a', f"{bitrate}k"]
+    return ['-c:a', 'pcm_s16le']
+
+
+def chapter_input_args(chapters_path):
+    return ['-f', 'ffmetadata', '-i', chapters_path]
+
+
+def chapter_map_args(input_index):
+    # Chapters and global tags come from the FFMETADATA input instead of the first media input
+    return ['-map_metadata', str(input_index), '-map_chapters', str(input_index)]
+
+
+def filter_path(path):
+    # File names inside a filter graph: forward slashes, escaped drive colons, quoted as a whole
+    return "'" + path.replace("\\", "/").replace(":", "\\:") + "'"
+
+
+def build_mix_command(ffmpeg_path, tracks, output_path, file_format="wav", bitrate="192", lengths=None, crossfade=0.0, curve="tri",
+                      chapters_path=None):
+    command = [ffmpeg_path, '-y']
+    for track in tracks:
+        command.extend(audio_input_args(track))
+    if chapters_path:
+        command.extend(chapter_input_args(chapters_path))
+    filter_complex = ";".join(build_audio_concat(0, tracks, "[outa]", lengths, crossfade, curve))
+    command.extend(['-filter_complex', filter_complex, '-map', '[outa]'])
+    if chapters_path:
+        command.extend(chapter_map_args(len(tracks)))
+    command.extend(mix_codec_args(file_format, bitrate))
+    command.append(output_path)
+    return command
+
+
+def plan_loop(source_info, total_duration, fps, is_image=False):
+    # Exact number of passes over the loop clip and of output frames for the whole mix, so ffmpeg
+    # never decodes or encodes past the audio. None when the clip is not known well enough to plan.
+    output_fps = filter_graph.parse_rate(fps)
+    if output_fps is None or total_duration <= 0:
+        return None
+    # Rounded first so that float noise in the duration never adds a frame
+    output_frames = math.ceil(round(total_duration * output_fps, 6))
+    if is_image:
+        return {"stream_loop": None, "frames": output_frames, "iterations": 1}
+    if not source_info:
+        return None
+
+    if source_info.constant_fps and source_info.frame_count:
+        needed = math.ceil(round(total_duration * source_info.fps, 6))
+        iterations = math.ceil(needed / source_info.frame_count)
+    elif source_info.duration:
+        iterations = math.ceil(round(total_duration / source_info.duration, 6))
+    else:
+        return None
+    return {"stream_loop": max(0, iterations - 1), "frames": output_frames, "iterations": iterations}
+
+
+def video_input_args(video_path, fps, stream_loop=None):
+    # A still image (e.g. album cover) is looped as a video at the output frame rate
+    if media_formats.is_image(video_path):
+        return ['-loop', '1', '-framerate', str(fps), '-i', video_path]
+    return ['-stream_loop', str(-1 if stream_loop is None else stream_loop), '-i', video_path]
+
+
+def tee_escape(path):
+    return re.sub(r"([\\'|\[\]])", r"\\\1", path)
+
+
+def build_extender_command(ffmpeg_path, video_path, audio_tracks, total_audio_duration, profiles, fps, fade_enabled,
+                           available_encoders=None, force_cpu=False, audio_stdin_args=None,
+                           track_lengths=None, crossfade=0.0, fade_curve="tri", chapters_path=None,
+                           titles_path=None, titles_mode="off", source_info=None, decimate_frames=False):
+    if not profiles:
+        raise ValueError("No output profiles configured.")
+    # The tee muxer does not pass chapters on to its outputs, so they are only muxed into a single output
+    if len(profiles) > 1:
+        chapters_path = None
+    subtitle_codecs = {media_formats.subtitle_codec(p["path"]) for p in profiles}
+    soft_titles = titles_path and titles_mode == "soft" and len(subtitle_codecs) == 1 and None not in subtitle_codecs
+
+    codecs = [resolve_profile_codec(p, fade_enabled, available_encoders, force_cpu) for p in profiles]
+    loop = plan_loop(source_info, total_audio_duration, fps, media_formats.is_image(video_path))
+    if loop:
+        print(f"Loop plan: {loop['iterations']} pass(es) over the clip, {loop['frames']} output frames")
+
+    command = [ffmpeg_path, '-y']
+
+    # Inputs are always decoded on CPU for stability. No -hwaccel flags here.
+    command.extend(video_input_args(video_path, fps, loop["stream_loop"] if loop else None))
+    if audio_stdin_args:
+        # Raw PCM from the in-process audio engine, which has already applied gains, trims and fades
+        command.extend(audio_stdin_args)
+    else:
+        for track in audio_tracks:
+            command.extend(audio_input_args(track))
+    next_input = 2 if audio_stdin_args else 1 + len(audio_tracks)
+    if chapters_path:
+        chapters_input = next_input
+        next_input += 1
+        command.extend(chapter_input_args(chapters_path))
+    if soft_titles:
+        titles_input = next_input
+        command.extend(['-i', titles_path])
+
+    video_parts = []
+
+    # Audio chain, built once and shared by every output
+    if audio_stdin_args:
+        audio_output_stream = "1:a"
+        audio_parts = []
+    else:
+        audio_output_stream = "[a_concat]"
+        audio_parts = build_audio_concat(1, audio_tracks, audio_output_stream, track_lengths, crossfade, fade_curve)
+
+    # Titles and fades are drawn once on the shared decode; scaling and encoder formats are per profile
+    overlays = []
+    if titles_path and titles_mode == "burn":
+        # Every track title lives in one subtitle script, so this is a single filter however long the playlist
+        overlays.append(filter_graph.stage("ass", filter_path(titles_path)))
+    if fade_enabled:
+        fade_duration = 1
+        overlays.append(filter_graph.stage("fade", f"t=in:st=0:d={fade_duration}"))
+        overlays.append(filter_graph.stage("fade", f"t=out:st={total_audio_duration - fade_duration}:d={fade_duration}"))
+        if not audio_stdin_args:
+            audio_output_stream = "[a_out]"
+            audio_parts.append(f"[a_concat]afade=t=in:st=0:d={fade_duration},afade=t=out:st={total_audio_duration - fade_duration}:d={fade_duration}{audio_output_stream}")
+
+    def scale_stages(profile):
+        resolution = profile.get("resolution")
+        if resolution and resolution != "Original":
+            return [filter_graph.stage("scale", resolution)]
+        return []
+
+    def encoder_stages(video_codec):
+        # Hardware encoders take nv12 or yuv420p as they are; anything else is converted once here
+        if is_gpu_codec(video_codec):
+            return [filter_graph.stage("format", "nv12", accept=filter_graph.GPU_PIX_FMTS)]
+        return []
+
+    # Near-duplicate frames are dropped after titles and fades are drawn, so those still animate smoothly;
+    # without overlays they are dropped before scaling, so dropped frames are never scaled either
+    decimate = [low_motion.decimate_stage(fps)] if decimate_frames else []
+
+    # Stages that would not change the frames (source already at the target size, rate or format) are dropped
+    state = filter_graph.source_state(source_info, fps if media_formats.is_image(video_path) else None)
+    fps_stage = filter_graph.stage("fps", fps)
+    video_outputs = [f"[v_out{i}]" for i in range(len(profiles))]
+    final_states = []
+    if len(profiles) > 1:
+        shared, state = filter_graph.optimize([fps_stage] + overlays + decimate, state)
+        branch_inputs = [f"[v_split{i}]" for i in range(len(profiles))]
+        shared_text = filter_graph.chain_text(shared) + "," if shared else ""
+        video_parts.append(f"[0:v]{shared_text}split={len(profiles)}{''.join(branch_inputs)}")
+        for i, (profile, video_codec) in enumerate(zip(profiles, codecs)):
+            stages, branch_state = filter_graph.optimize(scale_stages(profile) + encoder_stages(video_codec), state)
+            final_states.append(branch_state)
+            video_parts.append(f"{branch_inputs[i]}{filter_graph.chain_text(stages)}{video_outputs[i]}")
+    else:
+        # A single chain lets the scale sit next to fps, so the optimizer can put the cheaper one first
+        if overlays:
+            chain = [fps_stage] + scale_stages(profiles[0]) + overlays + decimate
+        else:
+            chain = [fps_stage] + decimate + scale_stages(profiles[0])
+        stages, branch_state = filter_graph.optimize(chain + encoder_stages(codecs[0]), state)
+        final_states.append(branch_state)
+        video_parts.append(f"[0:v]{filter_graph.chain_text(stages)}{video_outputs[0]}")
+
+    def encoder_pix_fmt_args(i, stream=""):
+        accept = filter_graph.GPU_PIX_FMTS if is_gpu_codec(codecs[i]) else ["yuv420p"]
+        return filter_graph.pix_fmt_args(final_states[i], accept, stream=stream)
+
+    command.extend(['-filter_complex', ";".join(video_parts + audio_parts)])
+
+    # A planned loop ends on an exact frame count. Otherwise the endless loop is cut by -shortest, except that
+    # a subtitle input reaching its end would stop every stream under -shortest, so soft titles cut by time.
+    # Decimated video has fewer frames than planned, so it is cut by time as well.
+    if decimate_frames:
+        end_args = low_motion.output_args() + ['-t', f"{total_audio_duration:.3f}"]
+    elif loop:
+        end_args = ['-frames:v', str(loop["frames"])]
+    elif soft_titles:
+        end_args = ['-t', f"{total_audio_duration:.3f}"]
+    else:
+        end_args = ['-shortest']
+
+    if len(profiles) == 1:
+        command.extend(['-map', video_outputs[0], '-map', audio_output_stream])
+        if chapters_path:
+            command.extend(chapter_map_args(chapters_input))
+        if soft_titles:
+            command.extend(['-map', f'{titles_input}:s', '-c:s', subtitle_codecs.pop()])
+        command.extend(['-c:v', codecs[0]] + encoder_pix_fmt_args(0))
+        command.extend(video_quality_args(codecs[0], profiles[0].get("quality", "high"), preset=profiles[0].get("preset")))
+        command.extend(['-c:a', 'aac', '-b:a', '320k'] + end_args + [profiles[0]["path"]])
+    else:
+        # One tee output: every video encode and the single audio encode are muxed into each file
+        for stream in video_outputs:
+            command.extend(['-map', stream])
+        command.extend(['-map', audio_output_stream])
+        if soft_titles:
+            command.extend(['-map', f'{titles_input}:s', '-c:s', subtitle_codecs.pop()])
+        for i, (profile, video_codec) in enumerate(zip(profiles, codecs)):
+            command.extend([f'-c:v:{i}', video_codec] + encoder_pix_fmt_args(i, f":v:{i}"))
+            command.extend(video_quality_args(video_codec, profile.get("quality", "high"), stream=f":v:{i}", preset=profile.get("preset")))
+        command.extend(['-c:a', 'aac', '-b:a', '320k'] + end_args + ['-flags', '+global_header'])
+        streams = "a,s" if soft_titles else "a"
+        slaves = [f"[select=\\'v:{i},{streams}\\']{tee_escape(p['path'])}" for i, p in enumerate(profiles)]
+        command.extend(['-f', 'tee', "|".join(slaves)])
+
+    print(" ".join(command))
+    return command
+
+
+def preflight_job(job, ffmpeg_path, ffprobe_path):
+    # Every input is checked before the render starts; "skip_bad_tracks" drops broken tracks instead of failing the job
+    if not job.get("preflight", True):
+        return True
+    items = [(path, "audio") for path in job["audio"]]
+    if job.get("video"):
+        items.append((job["video"], "video"))
+    problems = preflight.check_files(ffmpeg_path, ffprobe_path, items)
+    if not problems:
+        return True
+    print(f"Pre-flight check failed for {len(problems)} input(s):\n" + preflight.report_text(problems))
+    bad_tracks = {p["path"] for p in problems if p["kind"] == "audio"}
+    if not job.get("skip_bad_tracks") or len(bad_tracks) < len(problems) or bad_tracks == set(job["audio"]):
+        return False
+    job["audio"] = [path for path in job["audio"] if path not in bad_tracks]
+    print(f"Skipping {len(bad_tracks)} bad track(s).")
+    return True
+
+
+def prepare_job_tracks(job, ffmpeg_path, ffprobe_path):
+    audio_paths = job["audio"]
+    durations = [media_cache.get_duration(ffprobe_path, p) for p in audio_paths]
+    media_cache.shared_cache().save()
+
+    auto_trims = None
+    if job.get("auto_trim"):
+        if not silence.is_available():
+            print("Auto-trim needs NumPy; rendering without it.")
+        else:
+            auto_trims = silence.analyze_trims(ffmpeg_path, audio_paths)
+    gains = media_cache.track_gains(ffmpeg_path, audio_paths) if job.get("normalize") else None
+    audio_tracks = make_audio_tracks(audio_paths, gains=gains, auto_trims=auto_trims)
+
+    crossfade = float(job.get("crossfade", 0))
+    offsets, total_audio_duration = track_offsets(audio_tracks, durations, crossfade)
+    return audio_tracks, track_lengths(audio_tracks, durations), crossfade, offsets, total_audio_duration
+
+
+def job_chapters_file(job, output_paths, offsets, total_audio_duration):
+    # Chapters are on by default wherever the container can carry them; "chapters": false turns them off
+    if not job.get("chapters", True) or len(output_paths) != 1 or not media_formats.supports_chapters(output_paths[0]):
+        return None
+    return timestamps.write_chapters_file(job["audio"], offsets, total_audio_duration)
+
+
+def run_command(command, total_duration, show_progress=True, timeout=None):
+    def on_progress(info):
+        if show_progress and info["fraction"] is not None:
+            print(f"\rProgress: {info['fraction'] * 100:.1f}%", end="", flush=True)
+
+    # An ffmpeg that reports nothing for this long is hung (e.g. on a dead network share) and is stopped
+    result = process_supervisor.run(command, total_duration=total_duration, on_progress=on_progress,
+                                    timeout=timeout, stall_timeout=STALL_SECONDS)
+    if show_progress:
+        print()
+    if result["ended"] == "stalled":
+        print(f"FFmpeg made no progress for {STALL_SECONDS}s and was stopped.")
+    elif result["ended"] == "timeout":
+        print(f"FFmpeg was stopped after the job's {timeout}s timeout.")
+    elif result["returncode"] != 0:
+        print("FFmpeg error:\n" + process_supervisor.error_text(result))
+    if result["ended"]:
+        return result["returncode"] or 1
+    return result["returncode"]
+
+
+def job_titles_file(job, offsets, total_audio_duration):
+    if job.get("titles", "off") not in ("burn", "soft"):
+        return None
+    return timestamps.write_titles_file(job["audio"], offsets, total_audio_duration, job["titles"])
+
+
+def run_job(job, ffmpeg_path=None, ffprobe_path=None, show_progress=True):
+    if not ffmpeg_path or not ffprobe_path:
+        ffmpeg_path, ffprobe_path = find_ffmpeg()
+
+    if not preflight_job(job, ffmpeg_path, ffprobe_path):
+        return 1
+    audio_tracks, lengths, crossfade, offsets, total_audio_duration = prepare_job_tracks(job, ffmpeg_path, ffprobe_path)
+    if total_audio_duration == 0:
+        print("Could not get total audio duration or duration is zero.")
+        return 1
+
+    try:
+        video_path = loop_builder.prepare_video(ffmpeg_path, ffprobe_path, job["video"], job["profiles"], job.get("fps", "60"),
+                                                job.get("loop_mode", "off"),
+                                                float(job.get("loop_crossfade", loop_builder.DEFAULT_CROSSFADE)),
+                                                conform=job.get("conform_cache", False))
+    except (ValueError, RuntimeError) as e:
+        print(e)
+        return 1
+
+    source_info = media_cache.probe(ffprobe_path, video_path)
+    media_cache.shared_cache().save()
+    decimate_frames = False
+    if job.get("low_motion"):
+        analysis = low_motion.analyze(ffmpeg_path, ffprobe_path, video_path, job.get("fps", "60"))
+        print(low_motion.report_text(analysis))
+        decimate_frames = low_motion.worthwhile(analysis)
+    chapters_path = job_chapters_file(job, [p["path"] for p in job["profiles"]], offsets, total_audio_duration)
+    titles_path = job_titles_file(job, offsets, total_audio_duration)
+    try:
+        try:
+            command = build_extender_command(
+                ffmpeg_path, video_path, audio_tracks, total_audio_duration, job["profiles"],
+                job.get("fps", "60"), job.get("fade", False), get_available_encoders(ffmpeg_path),
+                track_lengths=lengths, crossfade=crossfade, fade_curve=job.get("fade_curve", "tri"),
+                chapters_path=chapters_path, titles_path=titles_path, titles_mode=job.get("titles", "off"),
+                source_info=source_info, decimate_frames=decimate_frames
+            )
+        except ValueError as e:
+            # An unavailable codec or no profiles fails this job only, not the rest of the batch
+            print(e)
+            return 1
+
+        start_time = time.time()
+        return_code = run_command(command, total_audio_duration, show_progress, job.get("timeout"))
+    finally:
+        timestamps.remove_file(chapters_path)
+        timestamps.remove_file(titles_path)
+    if return_code == 0:
+        elapsed = time.time() - start_time
+        print(f"Rendered {len(job['profiles'])} output(s) in {elapsed:.2f} seconds.")
+        if not decimate_frames:
+            # Decimated renders encode fewer frames than their length implies, so they would overstate the speed
+            record_throughput(job, total_audio_duration, source_info, elapsed)
+    return return_code
+
+
+def record_throughput(job, total_audio_duration, source_info, seconds):
+    profiles = job["profiles"]
+    codec = deadline.render_codec(profiles)
+    if not codec or (job.get("fade") and is_gpu_codec(codec)):
+        # Mixed encoders, or a GPU codec that the fade forced onto libx264, say nothing about one preset
+        return
+    presets = {video_preset(codec, p.get("quality", "high"), p.get("preset")) for p in profiles}
+    if len(presets) != 1 or None in presets:
+        return
+    work = deadline.render_work(profiles, total_audio_duration, job.get("fps", "60"), source_info)
+    deadline.shared_log().record(codec, presets.pop(), work, seconds)
+
+
+def job_work(job, ffprobe_path):
+    # Rough size of a video job before its tracks are analysed: probed lengths, no trims or crossfades
+    duration = sum(media_cache.get_duration(ffprobe_path, p) or 0 for p in job["audio"])
+    source_info = media_cache.probe(ffprobe_path, job["video"])
+    return deadline.render_work(job["profiles"], duration, job.get("fps", "60"), source_info)
+
+
+def plan_deadline(jobs, seconds_left, ffmpeg_path, ffprobe_path):
+    # Run before every video job of a batch: the time left is shared out by the work left, and the first job
+    # gets the slowest preset that fits its share at the throughput measured so far, including earlier jobs
+    job = jobs[0]
+    codec = deadline.render_codec(job["profiles"])
+    if not codec:
+        print("Deadline: outputs do not share one plannable encoder; using their quality presets.")
+        return
+    works = [job_work(j, ffprobe_path) for j in jobs]
+    media_cache.shared_cache().save()
+    if not works[0]:
+        return
+    budget = max(0.0, seconds_left) * works[0] / sum(works)
+    preset, estimate = deadline.choose_preset(codec, works[0], budget, ffmpeg_path)
+    for profile in job["profiles"]:
+        profile["preset"] = preset
+    estimate_text = f"~{estimate / 60:.1f} min" if estimate else "no estimate"
+    print(f"Deadline: {codec} preset {preset} ({estimate_text}) for a {budget / 60:.1f} min share of {seconds_left / 60:.1f} min left")
+
+
+def run_mix_job(job, ffmpeg_path=None, ffprobe_path=None, show_progress=True):
+    # Audio-only counterpart of run_job: the same concat/crossfade chain the mixer renders
+    if not ffmpeg_path or not ffprobe_path:
+        ffmpeg_path, ffprobe_path = find_ffmpeg()
+
+    if not preflight_job(job, ffmpeg_path, ffprobe_path):
+        return 1
+    audio_tracks, lengths, crossfade, offsets, total_audio_duration = prepare_job_tracks(job, ffmpeg_path, ffprobe_path)
+    if total_audio_duration == 0:
+        print("Could not get total audio duration or duration is zero.")
+        return 1
+
+    chapters_path = job_chapters_file(job, [job["output"]], offsets, total_audio_duration)
+    try:
+        command = build_mix_command(
+            ffmpeg_path, audio_tracks, job["output"], job.get("format", "wav"), job.get("bitrate", "192"),
+            lengths, crossfade, job.get("fade_curve", "tri"), chapters_path
+        )
+        print(" ".join(command))
+
+        start_time = time.time()
+        return_code = run_command(command, total_audio_duration, show_progress, job.get("timeout"))
+    finally:
+        timestamps.remove_file(chapters_path)
+    if return_code == 0:
+        print(f"Rendered {job['output']} in {time.time() - start_time:.2f} seconds.")
+    return return_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a Video Extender or Audio Mixer job without the GUI.")
+    parser.add_argument("job", nargs="+", help="Path to a job .json file; several are rendered in order")
+    parser.add_argument("--finish-by", help="Pick encoder presets so the batch ends by HH:MM, or within a budget such as 90m or 6h")
+    parser.add_argument("--parallel", type=int, default=1, help="Number of jobs rendered at the same time")
+    parser.add_argument("--cpu-mode", choices=cpu_budget.CPU_MODES, default="managed",
+                        help="How cores, threads and priority are shared between concurrent ffmpeg processes")
+    args = parser.parse_args()
+    if args.finish_by and args.parallel > 1:
+        parser.error("--finish-by plans one job at a time and cannot be combined with --parallel")
+    try:
+        finish_at = deadline.parse_deadline(args.finish_by) if args.finish_by else None
+    except ValueError as e:
+        parser.error(f"--finish-by: {e}")
+
+    jobs = []
+    for job_path in args.job:
+        with open(job_path, "r", encoding="utf-8") as f:
+            jobs.append(json.load(f))
+    ffmpeg_path, ffprobe_path = find_ffmpeg()
+    cpu_budget.shared_budget().configure(args.cpu_mode, args.parallel)
+
+    def render(i, job, show_progress=True):
+        # Jobs without a video are plain audio mixes
+        if "video" not in job:
+            return run_mix_job(job, ffmpeg_path, ffprobe_path, show_progress)
+        if finish_at:
+            plan_deadline([j for j in jobs[i:] if "video" in j], finish_at - time.time(), ffmpeg_path, ffprobe_path)
+        return run_job(job, ffmpeg_path, ffprobe_path, show_progress)
+
+    start_time = time.time()
+    if args.parallel > 1:
+        with ThreadPoolExecutor(max_workers=args.parallel) as pool:
+            return_codes = list(pool.map(lambda item: render(item[0], item[1], False), enumerate(jobs)))
+    else:
+        return_codes = [render(i, job) for i, job in enumerate(jobs)]
+    elapsed = time.time() - start_time
+
+    # Aggregate throughput, to compare --cpu-mode settings and --parallel counts on the same batch
+    work = sum(job_work(job, ffprobe_path) for job in jobs if "video" in job)
+    if work and elapsed > 0:
+        print(f"Batch: {len(jobs)} job(s) in {elapsed:.1f}s, {work / elapsed:.1f} megapixels/s "
+              f"({args.parallel} at a time, cpu mode {args.cpu_mode})")
+    if finish_at and time.time() > finish_at:
+        print(f"Finished {(time.time() - finish_at) / 60:.1f} min after the deadline.")
+    return 1 if any(return_codes) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
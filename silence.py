@@ -0,0 +1,105 @@
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import cpu_budget
+import media_cache
+import waveform
+
+# Anything quieter than this RMS level over a 10 ms window counts as silence
+THRESHOLD_DB = -50.0
+WINDOW_SECONDS = 0.01
+# A little room is kept around the detected sound so soft attacks and reverb tails are not clipped
+MARGIN_SECONDS = 0.05
+
+
+def is_available():
+    return np is not None
+
+
+def detect_bounds(ffmpeg_path, file_path, threshold_db=THRESHOLD_DB):
+    # Returns the first and last non-silent second of the file, or None for a file that is silent throughout
+    mapped = waveform.wav_memmap(file_path)
+    if mapped is not None:
+        sample_rate, chunks = mapped[1], waveform.wav_chunks(mapped)
+    else:
+        sample_rate, chunks = waveform.DECODE_RATE, waveform.decoded_chunks(ffmpeg_path, file_path, check=True)
+
+    window_frames = max(1, round(sample_rate * WINDOW_SECONDS))
+    threshold = np.float32(10 ** (threshold_db / 20)) ** 2
+    first_loud = None
+    last_loud = None
+    windows_seen = 0
+    remainder = None
+    for chunk in chunks:
+        energy = np.square(chunk).mean(axis=1)
+        if remainder is not None:
+            energy = np.concatenate((remainder, energy))
+        full = len(energy) // window_frames * window_frames
+        loud = np.flatnonzero(energy[:full].reshape(-1, window_frames).mean(axis=1) >= threshold)
+        if len(loud):
+            if first_loud is None:
+                first_loud = windows_seen + loud[0]
+            last_loud = windows_seen + loud[-1]
+        windows_seen += full // window_frames
+        remainder = energy[full:]
+    if remainder is not None and len(remainder) and remainder.mean() >= threshold:
+        if first_loud is None:
+            first_loud = windows_seen
+        last_loud = windows_seen
+
+    if first_loud is None:
+        return None
+    window_seconds = window_frames / sample_rate
+    total_seconds = (windows_seen * window_frames + (len(remainder) if remainder is not None else 0)) / sample_rate
+    return {
+        "start": round(float(first_loud) * window_seconds, 3),
+        "end": round(min(float(last_loud + 1) * window_seconds, total_seconds), 3),
+        "duration": round(total_seconds, 3),
+    }
+
+
+def get_bounds(ffmpeg_path, file_path, cache=None):
+    cache = cache or media_cache.shared_cache()
+    key = f"silence_bounds@{THRESHOLD_DB}"
+    try:
+        bounds = cache.get(file_path, key)
+    except OSError:
+        return None
+    if bounds is None:
+        try:
+            bounds = detect_bounds(ffmpeg_path, file_path)
+        except (OSError, subprocess.CalledProcessError):
+            # Not cached: the file may be on a share that is briefly away, or ffmpeg itself may be missing
+            return None
+        # Fully silent files are cached too, as an empty dict, so they are not decoded again
+        cache.put(file_path, key, bounds or {})
+    return bounds or None
+
+
+def trims_from_bounds(bounds):
+    if not bounds:
+        return None
+    trim_start = max(0.0, bounds["start"] - MARGIN_SECONDS)
+    trim_end = bounds["end"] + MARGIN_SECONDS
+    trims = {}
+    if trim_start > 0:
+        trims["trim_start"] = round(trim_start, 3)
+    if trim_end < bounds["duration"]:
+        trims["trim_end"] = round(trim_end, 3)
+    return trims or None
+
+
+def analyze_trims(ffmpeg_path, file_paths, cache=None, max_workers=None):
+    # Auto-trim points per path; only files without cached bounds are decoded
+    cache = cache or media_cache.shared_cache()
+    max_workers = max_workers or min(4, os.cpu_count() or 1)
+    with cpu_budget.shared_budget().workers(max_workers), ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(lambda p: trims_from_bounds(get_bounds(ffmpeg_path, p, cache)), file_paths))
+    cache.save()
+    return {path: trims for path, trims in zip(file_paths, results) if trims}
@@ -0,0 +1,168 @@
+from fractions import Fraction
+
+import filter_graph
+import media_cache
+import render_pipeline
+from filter_graph import stage
+
+
+def state(width=1920, height=1080, fps=30, pix_fmt="yuv420p"):
+    return {"width": width, "height": height, "fps": Fraction(fps) if fps is not None else None, "pix_fmt": pix_fmt}
+
+
+def info(width=1920, height=1080, fps=30, pix_fmt="yuv420p"):
+    return media_cache.MediaInfo(duration=10.0, width=width, height=height, fps=Fraction(fps), pix_fmt=pix_fmt,
+                                 video_codec="h264", audio_codec=None, sample_rate=None, channels=None, bit_rate=None,
+                                 keyframe_interval=1.0, constant_fps=True, frame_count=int(10 * fps))
+
+
+def chain(stages, source):
+    return filter_graph.chain_text(filter_graph.optimize(stages, source)[0])
+
+
+def test_parse_size_and_rate():
+    assert filter_graph.parse_size("1920x1080") == (1920, 1080)
+    assert filter_graph.parse_size("1280:720") == (1280, 720)
+    assert filter_graph.parse_size("Original") is None
+    assert filter_graph.parse_rate("30000/1001") == Fraction(30000, 1001)
+    assert filter_graph.parse_rate("0") is None
+    assert filter_graph.parse_rate("fast") is None
+
+
+def test_identity_stages_are_dropped():
+    stages = [stage("fps", "30"), stage("scale", "1920x1080"), stage("format", "yuv420p")]
+    result, final = filter_graph.optimize(stages, state())
+    assert result == []
+    assert final == state()
+    assert filter_graph.chain_text(result) == "null"
+
+
+def test_format_accepts_any_listed_pix_fmt():
+    gpu_format = stage("format", "nv12", accept=filter_graph.GPU_PIX_FMTS)
+    assert chain([gpu_format], state(pix_fmt="yuv420p")) == "null"
+    assert chain([gpu_format], state(pix_fmt="yuv444p")) == "format=nv12"
+    # An unknown source format is always converted
+    assert chain([gpu_format], state(pix_fmt=None)) == "format=nv12"
+
+
+def test_changing_stages_are_kept():
+    stages = [stage("scale", "1280x720"), stage("fade", "t=in:st=0:d=1"), stage("format", "yuv444p")]
+    result, final = filter_graph.optimize(stages, state(fps=None))
+    assert filter_graph.chain_text(result) == "scale=1280x720,fade=t=in:st=0:d=1,format=yuv444p"
+    assert (final["width"], final["height"], final["pix_fmt"]) == (1280, 720, "yuv444p")
+
+
+def test_adjacent_scales_are_merged():
+    assert chain([stage("scale", "1280x720"), stage("scale", "3840x2160")], state()) == "scale=3840x2160"
+    # Merged back to the source size, nothing is left to do
+    assert chain([stage("scale", "1280x720"), stage("scale", "1920x1080")], state()) == "null"
+
+
+def test_scales_with_a_filter_between_are_not_merged():
+    stages = [stage("scale", "1280x720"), stage("fade", "t=in:st=0:d=1"), stage("scale", "640x360")]
+    assert chain(stages, state()) == "scale=1280x720,fade=t=in:st=0:d=1,scale=640x360"
+
+
+def test_hardware_scale_is_not_merged():
+    stages = [stage("scale", "1280x720"), stage("scale_videotoolbox", "640:360", kind="scale")]
+    assert chain(stages, state()) == "scale=1280x720,scale_videotoolbox=640:360"
+
+
+def test_fps_runs_before_scale_when_decimating():
+    source = state(3840, 2160, 60)
+    assert chain([stage("scale", "1920x1080"), stage("fps", "30")], source) == "fps=30,scale=1920x1080"
+    assert chain([stage("fps", "30"), stage("scale", "1920x1080")], source) == "fps=30,scale=1920x1080"
+
+
+def test_fps_runs_after_scale_when_upsampling():
+    source = state(3840, 2160, 24)
+    assert chain([stage("fps", "60"), stage("scale", "1920x1080")], source) == "scale=1920x1080,fps=60"
+    assert chain([stage("scale", "1920x1080"), stage("fps", "60")], source) == "scale=1920x1080,fps=60"
+
+
+def test_scale_and_fps_keep_their_order_for_an_unknown_rate():
+    source = state(3840, 2160, None)
+    assert chain([stage("fps", "30"), stage("scale", "1920x1080")], source) == "fps=30,scale=1920x1080"
+    assert chain([stage("scale", "1920x1080"), stage("fps", "30")], source) == "scale=1920x1080,fps=30"
+
+
+def test_source_state():
+    assert filter_graph.source_state(info(1280, 720, 25)) == state(1280, 720, 25)
+    variable = info()._replace(constant_fps=False)
+    assert filter_graph.source_state(variable)["fps"] is None
+    # A looped still image arrives at exactly the -framerate it is read at
+    assert filter_graph.source_state(None, "30") == state(None, None, 30, None)
+
+
+def test_pix_fmt_args():
+    assert filter_graph.pix_fmt_args(state(pix_fmt="yuv420p")) == []
+    assert filter_graph.pix_fmt_args(state(pix_fmt="yuv444p")) == ["-pix_fmt", "yuv420p"]
+    assert filter_graph.pix_fmt_args(state(pix_fmt=None)) == ["-pix_fmt", "yuv420p"]
+    assert filter_graph.pix_fmt_args(state(pix_fmt="nv12"), filter_graph.GPU_PIX_FMTS) == []
+    assert filter_graph.pix_fmt_args(state(pix_fmt="yuv444p"), stream=":v:1") == ["-pix_fmt:v:1", "yuv420p"]
+
+
+def extender_command(profiles, source_info=None, fps="30", video_path="loop.mp4", fade_enabled=False, **options):
+    tracks = render_pipeline.make_audio_tracks(["01.flac", "02.flac"])
+    return render_pipeline.build_extender_command("ffmpeg", video_path, tracks, 600.0, profiles, fps, fade_enabled,
+                                                  source_info=source_info, **options)
+
+
+def video_graph(command):
+    graph = command[command.index("-filter_complex") + 1]
+    return [part for part in graph.split(";") if "v_" in part]
+
+
+def profile(resolution="Original", codec="libx264", path="out.mp4"):
+    return {"resolution": resolution, "codec": codec, "quality": "standard", "path": path}
+
+
+def test_command_for_a_matching_source_has_no_video_filters():
+    command = extender_command([profile("1920x1080")], info())
+    assert video_graph(command) == ["[0:v]null[v_out0]"]
+    assert "-pix_fmt" not in command
+
+
+def test_command_decimates_before_scaling():
+    command = extender_command([profile("1920x1080")], info(3840, 2160, 60))
+    assert video_graph(command) == ["[0:v]fps=30,scale=1920x1080[v_out0]"]
+
+
+def test_command_scales_before_upsampling():
+    command = extender_command([profile("1920x1080")], info(3840, 2160, 24), fps="60")
+    assert video_graph(command) == ["[0:v]scale=1920x1080,fps=60[v_out0]"]
+
+
+def test_command_converts_pix_fmt_once():
+    command = extender_command([profile()], info(pix_fmt="yuv444p"))
+    assert video_graph(command) == ["[0:v]null[v_out0]"]
+    assert command[command.index("-pix_fmt") + 1] == "yuv420p"
+
+
+def test_command_for_gpu_encoder_converts_in_the_graph():
+    command = extender_command([profile(codec="h264_nvenc")], info(pix_fmt="yuv444p"))
+    assert video_graph(command) == ["[0:v]format=nv12[v_out0]"]
+    assert "-pix_fmt" not in command
+    command = extender_command([profile(codec="h264_nvenc")], info(pix_fmt="yuv420p"))
+    assert video_graph(command) == ["[0:v]null[v_out0]"]
+
+
+def test_command_for_a_still_image_keeps_only_the_scale():
+    command = extender_command([profile("1920x1080")], video_path="cover.jpg")
+    assert video_graph(command) == ["[0:v]scale=1920x1080[v_out0]"]
+    assert command[command.index("-pix_fmt") + 1] == "yuv420p"
+
+
+def test_command_with_fades_scales_before_drawing_them():
+    command = extender_command([profile("1280x720")], info(fps=60), fade_enabled=True)
+    assert video_graph(command) == ["[0:v]fps=30,scale=1280x720,fade=t=in:st=0:d=1,fade=t=out:st=599.0:d=1[v_out0]"]
+
+
+def test_command_for_several_profiles_splits_after_the_shared_stages():
+    profiles = [profile(path="full.mp4"), profile("1280x720", path="small.mp4")]
+    command = extender_command(profiles, info(fps=60))
+    assert video_graph(command) == [
+        "[0:v]fps=30,split=2[v_split0][v_split1]",
+        "[v_split0]null[v_out0]",
+        "[v_split1]scale=1280x720[v_out1]",
+    ]
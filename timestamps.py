@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import folder_scanner
+import media_cache
+import media_formats
+
+TIMESTAMPS_SUFFIX = "_timestamps.txt"
+JSON_SUFFIX = "_timestamps.json"
+CHAPTERS_SUFFIX = "_chapters.txt"
+# Track titles: "burn" draws them into the picture, "soft" adds a subtitle stream the player can toggle
+TITLE_MODES = ["off", "burn", "soft"]
+TITLE_SECONDS = 6.0
+TITLE_FADE_MS = 500
+
+
+def track_name(path):
+    # Sanitize filename for YouTube description
+    name = os.path.splitext(os.path.basename(path))[0]
+    return re.sub(r'[^a-zA-Zа-яА-Я0-9\s-]', '', name).strip()
+
+
+def format_timestamp(seconds):
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours > 0:
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def timestamp_lines(paths, offsets):
+    return [f"{format_timestamp(offset)} {track_name(path)}" for path, offset in zip(paths, offsets)]
+
+
+def plain_offsets(durations):
+    offsets, position = [], 0.0
+    for duration in durations:
+        offsets.append(position)
+        position += duration or 0.0
+    return offsets, position
+
+
+def chapter_entries(paths, offsets, total):
+    ends = list(offsets[1:]) + [total]
+    # Chapters keep the full file name; only the YouTube text is sanitized
+    return [{"title": os.path.splitext(os.path.basename(path))[0], "start": round(start, 3), "end": round(max(start, end), 3), "path": path}
+            for path, start, end in zip(paths, offsets, ends)]
+
+
+def ffmetadata_escape(text):
+    return re.sub(r'([=;#\\\n])', r'\\\1', text)
+
+
+def ffmetadata_text(chapters):
+    lines = [";FFMETADATA1"]
+    for chapter in chapters:
+        lines += ["[CHAPTER]", "TIMEBASE=1/1000",
+                  f"START={int(round(chapter['start'] * 1000))}",
+                  f"END={int(round(chapter['end'] * 1000))}",
+                  f"title={ffmetadata_escape(chapter['title'])}"]
+    return "\n".join(lines) + "\n"
+
+
+def title_events(chapters, title_seconds=TITLE_SECONDS):
+    return [(chapter["start"], min(chapter["start"] + title_seconds, chapter["end"]), chapter["title"])
+            for chapter in chapters if chapter["end"] > chapter["start"]]
+
+
+def srt_time(seconds):
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
+
+
+def ass_time(seconds):
+    centis = int(round(seconds * 100))
+    hours, centis = divmod(centis, 360000)
+    minutes, centis = divmod(centis, 6000)
+    secs, centis = divmod(centis, 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centis:02d}"
+
+
+def srt_text(chapters):
+    blocks = [f"{i}\n{srt_time(start)} --> {srt_time(end)}\n{title}\n"
+              for i, (start, end, title) in enumerate(title_events(chapters), 1)]
+    return "\n".join(blocks)
+
+
+def ass_text(chapters):
+    # One styled script for the whole mix; libass scales the 1080p layout to the actual frame size
+    lines = [
+        "[Script Info]", "ScriptType: v4.00+", "PlayResX: 1920", "PlayResY: 1080", "ScaledBorderAndShadow: yes", "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, "
+        "StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding",
+        "Style: Title,Arial,54,&H00FFFFFF,&H000000FF,&H00000000,&H80000000,0,0,0,0,100,100,0,0,1,2,1,1,80,80,70,1", "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    for start, end, title in title_events(chapters):
+        text = title.replace("\\", "/").replace("{", "(").replace("}", ")").replace("\n", " ")
+        lines.append(f"Dialogue: 0,{ass_time(start)},{ass_time(end)},Title,,0,0,0,,{{\\fad({TITLE_FADE_MS},{TITLE_FADE_MS})}}{text}")
+    return "\n".join(lines) + "\n"
+
+
+def write_titles_file(paths, offsets, total, mode):
+    # Burned-in titles use ASS for styling and fades; the soft track is plain SRT, which every container codec accepts
+    chapters = chapter_entries(paths, offsets, total)
+    suffix, text = (".ass", ass_text(chapters)) if mode == "burn" else (".srt", srt_text(chapters))
+    fd, path = tempfile.mkstemp(prefix="titles_", suffix=suffix)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def write_chapters_file(paths, offsets, total):
+    # Temporary FFMETADATA input for a render; the caller removes it when ffmpeg is done
+    fd, path = tempfile.mkstemp(prefix="chapters_", suffix=".txt")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(ffmetadata_text(chapter_entries(paths, offsets, total)))
+    return path
+
+
+def remove_file(path):
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def write_album(folder, paths, durations, write_json=False, write_chapters=False):
+    offsets, total = plain_offsets(durations)
+    album = os.path.basename(os.path.normpath(folder))
+    base = os.path.join(folder, album)
+    media_cache.write_atomic(base + TIMESTAMPS_SUFFIX, "\n".join(timestamp_lines(paths, offsets)) + "\n")
+    if write_json or write_chapters:
+        chapters = chapter_entries(paths, offsets, total)
+        if write_json:
+            media_cache.write_atomic(base + JSON_SUFFIX, json.dumps({"total": round(total, 3), "tracks": chapters}, indent=4, ensure_ascii=False))
+        if write_chapters:
+            media_cache.write_atomic(base + CHAPTERS_SUFFIX, ffmetadata_text(chapters))
+
+
+def find_albums(root, scanner=None, should_stop=None):
+    # Every directory under root that holds audio files is one playlist, tracks in name order
+    scanner = scanner or folder_scanner.shared_scanner()
+    albums = {}
+    for path in scanner.scan(root, media_formats.is_audio, should_stop=should_stop):
+        albums.setdefault(os.path.dirname(path), []).append(path)
+    for paths in albums.values():
+        paths.sort(key=lambda p: os.path.basename(p).lower())
+    return dict(sorted(albums.items()))
+
+
+def batch_generate(root, ffprobe_path="ffprobe", write_json=False, write_chapters=False, max_workers=None,
+                   on_progress=None, should_stop=None, cache=None):
+    # Probes every file of every album on one shared pool; the probe cache makes reruns almost free
+    cache = cache or media_cache.shared_cache()
+    max_workers = max_workers or min(16, (os.cpu_count() or 1) * 2)
+    albums = find_albums(root, should_stop=should_stop)
+    all_paths = [path for paths in albums.values() for path in paths]
+    durations = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(media_cache.get_duration, ffprobe_path, path, cache): path for path in all_paths}
+        for done_count, future in enumerate(as_completed(futures), 1):
+            if should_stop and should_stop():
+                for pending in futures:
+                    pending.cancel()
+                break
+            try:
+                durations[futures[future]] = future.result()
+            except Exception:
+                durations[futures[future]] = None
+            if on_progress:
+                on_progress(done_count, len(all_paths))
+    cache.save()
+
+    report = {"albums": len(albums), "written": [], "failed": [], "stopped": bool(should_stop and should_stop())}
+    for folder, paths in albums.items():
+        if any(path not in durations for path in paths):
+            # Not probed before a stop; left for the next run
+            continue
+        bad = [os.path.basename(path) for path in paths if not durations.get(path)]
+        if bad:
+            # Timestamps after an unreadable track would all be wrong, so the album is reported instead
+            report["failed"].append({"folder": folder, "error": "Could not read: " + ", ".join(bad)})
+            continue
+        try:
+            write_album(folder, paths, [durations[path] for path in paths], write_json, write_chapters)
+            report["written"].append(folder)
+        except OSError as e:
+            report["failed"].append({"folder": folder, "error": str(e)})
+    return report
+
+
+def report_text(report):
+    lines = [f"Albums: {report['albums']}, written: {len(report['written'])}, failed: {len(report['failed'])}"]
+    if report["stopped"]:
+        lines.append("Stopped before all albums were processed.")
+    for failure in report["failed"]:
+        lines.append(f"{failure['folder']}: {failure['error']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write YouTube timestamps for every album folder under a root directory.")
+    parser.add_argument("root", help="Folder whose subfolders are albums")
+    parser.add_argument("--json", action="store_true", help="Also write a _timestamps.json per album")
+    parser.add_argument("--chapters", action="store_true", help="Also write an FFMETADATA _chapters.txt per album")
+    parser.add_argument("--workers", type=int, default=None, help="Number of parallel probes")
+    args = parser.parse_args()
+
+    # Imported here because render_pipeline itself uses this module for chapters
+    import render_pipeline
+    _, ffprobe_path = render_pipeline.find_ffmpeg()
+    start_time = time.time()
+    report = batch_generate(args.root, ffprobe_path, args.json, args.chapters, args.workers)
+    print(report_text(report))
+    print(f"Done in {time.time() - start_time:.1f}s")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import random
+from itertools import accumulate
+
+
+class Track:
+    __slots__ = ("path", "duration", "length", "gap", "overlap", "position")
+
+    def __init__(self, path, duration):
+        self.path = path
+        self.duration = duration
+        self.length = duration or 0.0
+        self.gap = 0.0
+        self.overlap = 0.0
+        # Index in the mix order, kept by TrackList so a track is found without a scan
+        self.position = 0
+
+
+class FenwickTree:
+    __slots__ = ("tree",)
+
+    def __init__(self, values=()):
+        # O(n) construction: every node pushes its partial sum to its parent once
+        self.tree = [0.0] + list(values)
+        for i in range(1, len(self.tree)):
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+
+    def __len__(self):
+        return len(self.tree) - 1
+
+    def add(self, index, delta):
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, count):
+        # Sum of the first `count` values
+        total = 0.0
+        i = count
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def append(self, value):
+        i = len(self.tree)
+        self.tree.append(value + self.prefix(i - 1) - self.prefix(i - (i & -i)))
+
+
+class TrackList:
+    # Mix order, a path index and prefix sums over each track's advance in the mix, so that
+    # duplicate checks, adjacent moves and offset/total queries stay cheap for very long lists.
+    # The advance follows render_pipeline.track_offsets: length plus gap minus the outgoing overlap.
+    def __init__(self, timing=None):
+        self.tracks = []
+        self.paths = []
+        self.index = {}
+        self.crossfade = 0.0
+        self.timing = timing
+        self.tree = FenwickTree()
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def __contains__(self, path):
+        return path in self.index
+
+    def __getitem__(self, i):
+        return self.tracks[i]
+
+    def duration(self, path):
+        track = self.index.get(path)
+        return track.duration if track else None
+
+    def apply_timing(self, track):
+        if self.timing:
+            track.length, track.gap = self.timing(track.path, track.duration)
+        else:
+            track.length, track.gap = track.duration or 0.0, 0.0
+
+    def advance(self, i):
+        track = self.tracks[i]
+        if i == len(self.tracks) - 1:
+            return track.length
+        return track.length + track.gap - track.overlap
+
+    def compute_overlap(self, i):
+        if i >= len(self.tracks) - 1 or not self.crossfade or self.tracks[i].gap:
+            return 0.0
+        available = self.tracks[i].length - (self.tracks[i - 1].overlap if i > 0 else 0.0)
+        return max(0.0, min(self.crossfade, available, self.tracks[i + 1].length))
+
+    def rebuild(self):
+        self.index = {track.path: track for track in self.tracks}
+        self.paths[:] = [track.path for track in self.tracks]
+        for i in range(len(self.tracks)):
+            self.tracks[i].position = i
+            self.tracks[i].overlap = self.compute_overlap(i)
+        self.tree = FenwickTree(self.advance(i) for i in range(len(self.tracks)))
+
+    def refresh_from(self, start, last_changed):
+        # Overlaps chain forward, so walk on from `start` until they stop changing past the edited tracks
+        for i in range(max(0, start), len(self.tracks)):
+            old_advance = self.tree.prefix(i + 1) - self.tree.prefix(i)
+            old_overlap = self.tracks[i].overlap
+            self.tracks[i].overlap = self.compute_overlap(i)
+            delta = self.advance(i) - old_advance
+            if delta:
+                self.tree.add(i, delta)
+            if i > last_changed and self.tracks[i].overlap == old_overlap:
+                break
+
+    def append(self, path, duration):
+        if path in self.index:
+            return False
+        track = Track(path, duration)
+        self.apply_timing(track)
+        track.position = len(self.tracks)
+        self.tracks.append(track)
+        self.paths.append(path)
+        self.index[path] = track
+        self.tree.append(0.0)
+        self.refresh_from(len(self.tracks) - 2, len(self.tracks) - 1)
+        return True
+
+    def remove_at(self, indices):
+        removed = set(indices)
+        self.tracks = [track for i, track in enumerate(self.tracks) if i not in removed]
+        self.rebuild()
+
+    def replace(self, path, new_path, duration):
+        # The new file takes the old one's place in the mix order
+        if path not in self.index or new_path in self.index:
+            return False
+        track = Track(new_path, duration)
+        self.apply_timing(track)
+        self.tracks[self.index[path].position] = track
+        self.rebuild()
+        return True
+
+    def set_duration(self, path, duration):
+        # For lengths probed after the track was listed
+        track = self.index.get(path)
+        if track:
+            track.duration = duration
+            self.refresh(path)
+
+    def clear(self):
+        self.tracks = []
+        self.rebuild()
+
+    def swap(self, i, j):
+        i, j = min(i, j), max(i, j)
+        self.tracks[i], self.tracks[j] = self.tracks[j], self.tracks[i]
+        self.paths[i], self.paths[j] = self.paths[j], self.paths[i]
+        self.tracks[i].position, self.tracks[j].position = i, j
+        self.refresh_from(i - 1, j)
+
+    def reorder(self, paths):
+        self.tracks = [self.index[path] for path in paths]
+        self.rebuild()
+
+    def shuffle(self):
+        random.shuffle(self.tracks)
+        self.rebuild()
+
+    def sort(self, key):
+        self.tracks.sort(key=lambda track: key(track.path))
+        self.rebuild()
+
+    def refresh(self, path=None):
+        # Re-reads trims and gaps through the timing callback, for one track or all of them
+        if path is None:
+            for track in self.tracks:
+                self.apply_timing(track)
+            self.rebuild()
+            return
+        track = self.index.get(path)
+        if track:
+            self.apply_timing(track)
+            self.refresh_from(track.position - 1, track.position)
+
+    def set_crossfade(self, crossfade):
+        if crossfade != self.crossfade:
+            self.crossfade = crossfade
+            self.rebuild()
+
+    def offset(self, i):
+        return self.tree.prefix(i)
+
+    def total(self):
+        return self.tree.prefix(len(self.tracks))
+
+    def offsets(self):
+        return [0.0] + list(accumulate(self.advance(i) for i in range(len(self.tracks) - 1)))
@@ -0,0 +1,115 @@
+import tkinter as tk
+import tkinter.font as tkfont
+
+
+class VirtualListbox(tk.Canvas):
+    # Single-selection list that draws only the rows currently in view; row text comes from a
+    # callback, so a reorder or a 20k-track playlist never inserts or deletes widget rows
+    def __init__(self, master, row_text, font=("Arial", 12), bg="#2B2B2B", fg="#DCE4EE",
+                 selectbackground="#1F6AA5", selectforeground="#DCE4EE", yscrollcommand=None, **kwargs):
+        super().__init__(master, bg=bg, highlightthickness=0, borderwidth=0, takefocus=1, **kwargs)
+        self.row_text = row_text
+        self.font = tkfont.Font(font=font)
+        self.row_height = self.font.metrics("linespace") + 6
+        self.fg = fg
+        self.selectbackground = selectbackground
+        self.selectforeground = selectforeground
+        self.yscrollcommand = yscrollcommand
+        self.count = 0
+        self.top = 0
+        self.selected = None
+        self.redraw_pending = False
+
+        self.bind("<Configure>", lambda e: self.schedule_redraw())
+        self.bind("<Button-1>", self.on_click)
+        self.bind("<MouseWheel>", lambda e: self.scroll_rows(-1 if e.delta > 0 else 1))
+        self.bind("<Button-4>", lambda e: self.scroll_rows(-1))
+        self.bind("<Button-5>", lambda e: self.scroll_rows(1))
+        self.bind("<Up>", lambda e: self.move_selection(-1))
+        self.bind("<Down>", lambda e: self.move_selection(1))
+
+    def visible_count(self):
+        return max(1, self.winfo_height() // self.row_height)
+
+    def set_count(self, count):
+        self.count = count
+        if self.selected is not None and self.selected >= count:
+            self.selected = None
+        self.top = max(0, min(self.top, count - self.visible_count()))
+        self.schedule_redraw()
+
+    def refresh(self):
+        self.schedule_redraw()
+
+    def schedule_redraw(self):
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            self.after_idle(self.redraw)
+
+    def redraw(self):
+        self.redraw_pending = False
+        self.delete("all")
+        width = self.winfo_width()
+        for index, y in self.visible_rows():
+            color = self.fg
+            if index == self.selected:
+                self.create_rectangle(0, y, width, y + self.row_height, fill=self.selectbackground, width=0)
+                color = self.selectforeground
+            self.create_text(6, y + self.row_height // 2, text=self.row_text(index), anchor="w", fill=color, font=self.font)
+        if self.yscrollcommand:
+            first, last = self.yview()
+            self.yscrollcommand(first, last)
+
+    def visible_rows(self):
+        last = min(self.count, self.top + self.visible_count() + 1)
+        return [(index, (index - self.top) * self.row_height) for index in range(self.top, last)]
+
+    def yview(self, *args):
+        if not args:
+            if not self.count:
+                return 0.0, 1.0
+            return self.top / self.count, min(1.0, (self.top + self.visible_count()) / self.count)
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * self.count))
+        elif args[0] == "scroll":
+            step = self.visible_count() if args[2] == "pages" else 1
+            self.scroll_rows(int(args[1]) * step)
+
+    def scroll_rows(self, rows):
+        self.scroll_to(self.top + rows)
+
+    def scroll_to(self, top):
+        top = max(0, min(top, self.count - self.visible_count()))
+        if top != self.top:
+            self.top = top
+            self.schedule_redraw()
+
+    def see(self, index):
+        if index < self.top:
+            self.scroll_to(index)
+        elif index >= self.top + self.visible_count():
+            self.scroll_to(index - self.visible_count() + 1)
+
+    def nearest(self, y):
+        return max(0, min(self.count - 1, self.top + int(y) // self.row_height))
+
+    def on_click(self, event):
+        self.focus_set()
+        if self.count:
+            self.selection_set(self.nearest(event.y))
+
+    def move_selection(self, step):
+        if self.selected is not None:
+            self.selection_set(max(0, min(self.count - 1, self.selected + step)))
+
+    def curselection(self):
+        return () if self.selected is None else (self.selected,)
+
+    def selection_set(self, index):
+        self.selected = index
+        self.see(index)
+        self.schedule_redraw()
+
+    def selection_clear(self):
+        self.selected = None
+        self.schedule_redraw()
@@ -0,0 +1,216 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cpu_budget
+import media_cache
+import media_formats
+import render_pipeline
+
+DEFAULT_STATE_PATH = os.path.join(media_cache.CACHE_DIR, "watch_state.json")
+# Preferred names for the loop video or cover image inside an album folder, before any other match
+LOOP_VIDEO_NAMES = ["loop", "video", "background"]
+COVER_IMAGE_NAMES = ["cover", "folder", "front"]
+
+
+def output_names(folder, config):
+    # Lower-cased names of the folder's own renders when they are written into the album folder itself;
+    # they are neither inputs nor a change to the folder
+    output_dir = config.get("output_dir") or folder
+    if os.path.normcase(os.path.abspath(output_dir)) != os.path.normcase(os.path.abspath(folder)):
+        return set()
+    album = os.path.basename(os.path.normpath(folder))
+    names = {f"{album}{profile.get('suffix', '')}.mp4".lower() for profile in config.get("profiles") or []}
+    if config.get("mix_format"):
+        names.add(f"{album}.{config['mix_format']}".lower())
+    return names
+
+
+def folder_snapshot(folder, exclude=()):
+    # Names, sizes and mtimes of the folder's files; a copy in progress keeps changing this
+    entries = []
+    with os.scandir(folder) as scanner:
+        for item in scanner:
+            try:
+                if item.is_file() and item.name.lower() not in exclude:
+                    st = item.stat()
+                    entries.append((item.name, st.st_size, st.st_mtime_ns))
+            except OSError:
+                continue
+    entries.sort()
+    return hashlib.sha1(repr(entries).encode()).hexdigest(), [name for name, _, _ in entries]
+
+
+def pick_visual(names, preferred, accept):
+    candidates = [name for name in names if accept(name)]
+    for stem in preferred:
+        for name in candidates:
+            if os.path.splitext(name)[0].lower() == stem:
+                return name
+    return candidates[0] if candidates else None
+
+
+def build_jobs(folder, names, config):
+    excluded = output_names(folder, config)
+    names = [name for name in names if name.lower() not in excluded]
+    audio = [os.path.join(folder, name) for name in sorted(names, key=str.lower) if media_formats.is_audio(name)]
+    if not audio:
+        return []
+    album = os.path.basename(os.path.normpath(folder))
+    output_dir = config.get("output_dir") or folder
+    shared = {key: config[key] for key in ("normalize", "auto_trim", "crossfade", "fade_curve") if key in config}
+
+    jobs = []
+    mix_format = config.get("mix_format")
+    if mix_format:
+        jobs.append(dict(shared, audio=audio, format=mix_format, bitrate=config.get("bitrate", "320"),
+                         output=os.path.join(output_dir, f"{album}.{mix_format}")))
+
+    visual = pick_visual(names, LOOP_VIDEO_NAMES, media_formats.is_video) or pick_visual(names, COVER_IMAGE_NAMES, media_formats.is_image)
+    if visual and config.get("profiles"):
+        profiles = [dict(profile, path=os.path.join(output_dir, f"{album}{profile.get('suffix', '')}.mp4")) for profile in config["profiles"]]
+        loop = {key: config[key] for key in ("loop_mode", "loop_crossfade", "conform_cache", "low_motion") if key in config}
+        jobs.append(dict(shared, **loop, video=os.path.join(folder, visual), audio=audio, fps=config.get("fps", "30"),
+                         fade=config.get("fade", False), profiles=profiles))
+    return jobs
+
+
+def job_outputs(job):
+    return [job["output"]] if "output" in job else [profile["path"] for profile in job["profiles"]]
+
+
+def remove_outputs(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Could not remove partial output {path}: {e}")
+
+
+class FolderWatcher:
+    def __init__(self, config, state_path=DEFAULT_STATE_PATH):
+        self.config = config
+        self.state_path = config.get("state_file") or state_path
+        self.settle_seconds = float(config.get("settle_seconds", 60))
+        self.poll_seconds = float(config.get("poll_seconds", 10))
+        self.pool = ThreadPoolExecutor(max_workers=int(config.get("max_concurrent", 1)))
+        # Concurrent renders get disjoint cores instead of each spreading threads over all of them
+        cpu_budget.shared_budget().configure(config.get("cpu_mode", "managed"), int(config.get("max_concurrent", 1)))
+        self.ffmpeg_path, self.ffprobe_path = render_pipeline.find_ffmpeg()
+        self.lock = threading.Lock()
+        self.seen = {}
+        self.running = set()
+        self.state = {"done": {}, "failed": {}}
+        self.load_state()
+
+    def load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.state.update(json.load(f))
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def save_state(self):
+        # Called from every render thread; the lock is held until the file is in place, so an older state never wins
+        with self.lock:
+            media_cache.write_atomic(self.state_path, json.dumps(self.state, indent=4, ensure_ascii=False))
+
+    def album_folders(self):
+        for root in self.config.get("inputs", []):
+            try:
+                with os.scandir(root) as scanner:
+                    for item in scanner:
+                        if item.is_dir(follow_symlinks=False):
+                            yield item.path
+            except OSError as e:
+                print(f"Could not read input folder {root}: {e}")
+
+    def poll(self, now=None):
+        now = now if now is not None else time.monotonic()
+        present = set()
+        for folder in self.album_folders():
+            present.add(folder)
+            try:
+                signature, names = folder_snapshot(folder, output_names(folder, self.config))
+            except OSError:
+                continue
+            previous = self.seen.get(folder)
+            if not previous or previous[0] != signature:
+                # Changed since the last poll: restart the settling period
+                self.seen[folder] = (signature, now)
+                continue
+            with self.lock:
+                finished = self.state["done"].get(folder) == signature or self.state["failed"].get(folder) == signature
+                busy = folder in self.running
+            if finished or busy or now - previous[1] < self.settle_seconds:
+                continue
+            jobs = build_jobs(folder, names, self.config)
+            if not jobs:
+                continue
+            with self.lock:
+                self.running.add(folder)
+            self.pool.submit(self.render_folder, folder, signature, jobs)
+        for folder in list(self.seen):
+            if folder not in present:
+                del self.seen[folder]
+
+    def render_folder(self, folder, signature, jobs):
+        print(f"Rendering {folder} ({len(jobs)} job(s))")
+        ok = True
+        job = None
+        try:
+            os.makedirs(self.config.get("output_dir") or folder, exist_ok=True)
+            for job in jobs:
+                if "video" in job:
+                    return_code = render_pipeline.run_job(job, self.ffmpeg_path, self.ffprobe_path, show_progress=False)
+                else:
+                    return_code = render_pipeline.run_mix_job(job, self.ffmpeg_path, self.ffprobe_path, show_progress=False)
+                if return_code != 0:
+                    ok = False
+                    break
+        except Exception as e:
+            print(f"Render of {folder} failed: {e}")
+            ok = False
+        if not ok and job:
+            # A half-written file would look like a finished render
+            remove_outputs(job_outputs(job))
+        with self.lock:
+            self.running.discard(folder)
+            # A failed folder is retried only after its contents change
+            self.state["done" if ok else "failed"][folder] = signature
+            self.state["failed" if ok else "done"].pop(folder, None)
+        self.save_state()
+        print(f"{'Finished' if ok else 'Failed'}: {folder}")
+
+    def run(self):
+        print(f"Watching {', '.join(self.config.get('inputs', []))} every {self.poll_seconds:g}s")
+        try:
+            while True:
+                self.poll()
+                time.sleep(self.poll_seconds)
+        except KeyboardInterrupt:
+            print("Stopping; waiting for running renders to finish.")
+        finally:
+            self.pool.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch folders for finished albums and render them automatically.")
+    parser.add_argument("config", help="Path to a watch config .json file")
+    args = parser.parse_args()
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    FolderWatcher(config).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
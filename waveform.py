@@ -0,0 +1,199 @@
+import os
+import struct
+import subprocess
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import cpu_budget
+import media_cache
+
+PEAKS_DIR = os.path.join(media_cache.CACHE_DIR, "peaks")
+PEAKS_MAGIC = b"PEAK"
+PEAKS_VERSION = 1
+
+# Finest zoom level: one min/max pair per 20 ms; every further level merges 4 bins
+BASE_BIN_SECONDS = 0.02
+LEVEL_FACTOR = 4
+LEVELS = 5
+
+# Compressed formats are decoded at a reduced rate; peaks do not need the full bandwidth
+DECODE_RATE = 11025
+CHUNK_FRAMES = 1 << 18
+
+
+def is_available():
+    return np is not None
+
+
+def peaks_path(file_path):
+    return os.path.join(PEAKS_DIR, media_cache.shared_cache().content_hash(file_path) + ".peaks")
+
+
+def wav_memmap(file_path):
+    # Maps the PCM data chunk of an uncompressed WAV file directly, without decoding
+    with open(file_path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = struct.unpack("<4sI", chunk)
+            if chunk_id == b"fmt ":
+                data = f.read(size + size % 2)
+                audio_format, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", data[:16])
+                if audio_format == 0xFFFE and size >= 26:
+                    audio_format = struct.unpack("<H", data[24:26])[0]
+                fmt = (audio_format, channels, sample_rate, bits)
+            elif chunk_id == b"data":
+                if not fmt:
+                    return None
+                dtypes = {(1, 8): ("u1", 128.0, 128.0), (1, 16): ("<i2", 0.0, 32768.0),
+                          (1, 32): ("<i4", 0.0, 2147483648.0), (3, 32): ("<f4", 0.0, 1.0)}
+                if (fmt[0], fmt[3]) not in dtypes:
+                    return None
+                dtype, bias, scale = dtypes[(fmt[0], fmt[3])]
+                offset = f.tell()
+                frame_bytes = fmt[1] * np.dtype(dtype).itemsize
+                data_bytes = min(size, os.path.getsize(file_path) - offset)
+                frames = data_bytes // frame_bytes
+                if frames <= 0:
+                    return None
+                samples = np.memmap(file_path, dtype=dtype, mode="r", offset=offset, shape=(frames, fmt[1]))
+                return samples, fmt[2], bias, scale
+            else:
+                f.seek(size + size % 2, 1)
+
+
+def wav_chunks(mapped):
+    samples, _, bias, scale = mapped
+    for start in range(0, len(samples), CHUNK_FRAMES):
+        yield (samples[start:start + CHUNK_FRAMES].astype(np.float32) - bias) / scale
+
+
+def decoded_chunks(ffmpeg_path, file_path, check=False):
+    # With check, a decode that ends in an error raises CalledProcessError after its last chunk, like subprocess.run
+    cmd = [ffmpeg_path, '-v', 'error', '-nostdin', '-i', file_path, '-vn', '-ac', '1', '-ar', str(DECODE_RATE), '-f', 's16le', 'pipe:1']
+    # Streamed rather than run through the process supervisor, which collects all output; it still gets its share of the cores
+    with cpu_budget.shared_budget().slot() as slot:
+        process = subprocess.Popen(cpu_budget.managed_command(cmd, slot), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                   **cpu_budget.popen_kwargs(slot))
+        try:
+            while True:
+                data = process.stdout.read(CHUNK_FRAMES * 2)
+                if not data:
+                    break
+                yield np.frombuffer(data[:len(data) - len(data) % 2], dtype="<i2").reshape(-1, 1).astype(np.float32) / 32768.0
+            if check and process.wait() != 0:
+                raise subprocess.CalledProcessError(process.returncode, cmd)
+        finally:
+            process.stdout.close()
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+
+def compute_peaks(ffmpeg_path, file_path, cancel_event=None):
+    mapped = wav_memmap(file_path)
+    if mapped is not None:
+        sample_rate, chunks = mapped[1], wav_chunks(mapped)
+    else:
+        sample_rate, chunks = DECODE_RATE, decoded_chunks(ffmpeg_path, file_path)
+
+    bin_frames = max(1, round(sample_rate * BASE_BIN_SECONDS))
+    mins, maxs = [], []
+    remainder = None
+    for chunk in chunks:
+        if cancel_event is not None and cancel_event.is_set():
+            chunks.close()
+            return None
+        if remainder is not None:
+            chunk = np.concatenate((remainder, chunk))
+        full = len(chunk) // bin_frames * bin_frames
+        bins = chunk[:full].reshape(-1, bin_frames * chunk.shape[1])
+        mins.append(bins.min(axis=1))
+        maxs.append(bins.max(axis=1))
+        remainder = chunk[full:]
+    if remainder is not None and len(remainder):
+        mins.append(np.array([remainder.min()]))
+        maxs.append(np.array([remainder.max()]))
+    if not mins:
+        return None
+
+    base = np.stack((np.concatenate(mins), np.concatenate(maxs)), axis=1)
+    levels = [np.clip(np.round(base * 127), -127, 127).astype(np.int8)]
+    for _ in range(LEVELS - 1):
+        previous = levels[-1]
+        pad = (-len(previous)) % LEVEL_FACTOR
+        if pad:
+            previous = np.concatenate((previous, np.repeat(previous[-1:], pad, axis=0)))
+        grouped = previous.reshape(-1, LEVEL_FACTOR, 2)
+        levels.append(np.stack((grouped[:, :, 0].min(axis=1), grouped[:, :, 1].max(axis=1)), axis=1))
+    return levels
+
+
+def save_peaks(path, levels):
+    # Copies of one file share a peaks path and may be saved by two workers at once
+    data = struct.pack("<4sHfHH", PEAKS_MAGIC, PEAKS_VERSION, BASE_BIN_SECONDS, LEVEL_FACTOR, len(levels))
+    data += struct.pack(f"<{len(levels)}I", *[len(level) for level in levels])
+    data += b"".join(level.tobytes() for level in levels)
+    media_cache.write_atomic(path, data)
+
+
+def load_peaks(path):
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    header_size = struct.calcsize("<4sHfHH")
+    if len(data) < header_size:
+        return None
+    magic, version, bin_seconds, factor, count = struct.unpack("<4sHfHH", data[:header_size])
+    if magic != PEAKS_MAGIC or version != PEAKS_VERSION or factor != LEVEL_FACTOR or abs(bin_seconds - BASE_BIN_SECONDS) > 1e-6:
+        return None
+    sizes = struct.unpack(f"<{count}I", data[header_size:header_size + 4 * count])
+    offset = header_size + 4 * count
+    levels = []
+    for size in sizes:
+        levels.append(np.frombuffer(data, dtype=np.int8, count=size * 2, offset=offset).reshape(-1, 2))
+        offset += size * 2
+    return levels
+
+
+def load_or_compute(ffmpeg_path, file_path, cancel_event=None):
+    path = peaks_path(file_path)
+    levels = load_peaks(path)
+    if levels is None:
+        levels = compute_peaks(ffmpeg_path, file_path, cancel_event)
+        if levels is not None:
+            save_peaks(path, levels)
+    return levels
+
+
+def columns(levels, width, start_seconds=0.0, end_seconds=None):
+    # Min/max per pixel column (in -1..1) for the requested time range, read from the coarsest level that still has enough bins
+    if not levels or width <= 0:
+        return None
+    end = end_seconds if end_seconds is not None else len(levels[0]) * BASE_BIN_SECONDS
+    level_index = 0
+    for i in range(len(levels)):
+        if (end - start_seconds) / (BASE_BIN_SECONDS * LEVEL_FACTOR ** i) >= width:
+            level_index = i
+    level = levels[level_index]
+    bin_seconds = BASE_BIN_SECONDS * LEVEL_FACTOR ** level_index
+    first = int(start_seconds / bin_seconds)
+    last = len(level) if end_seconds is None else min(len(level), max(first + 1, int(np.ceil(end_seconds / bin_seconds))))
+    selected = level[first:last]
+    if not len(selected):
+        return None
+    edges = np.linspace(0, len(selected), width + 1).astype(int)
+    edges = np.minimum(edges[:-1], len(selected) - 1)
+    mins = np.minimum.reduceat(selected[:, 0], edges) / 127.0
+    maxs = np.maximum.reduceat(selected[:, 1], edges) / 127.0
+    return mins, maxs
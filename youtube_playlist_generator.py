@@ -3,14 +3,18 @@ from tkinterdnd2 import DND_FILES, TkinterDnD
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import json
-import subprocess
 import platform
 import threading
 import locale
 import os
-import re
 import time
 
+from concurrent.futures import ThreadPoolExecutor
+
+import media_cache
+import media_formats
+import timestamps
+
 class App(ctk.CTk, TkinterDnD.DnDWrapper):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -20,6 +24,8 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         self.geometry("700x800")
 
         self.audio_paths = []
+        self.batch_thread = None
+        self.stop_batch_event = threading.Event()
         
         self.load_locales()
         self.setup_ui()
@@ -93,6 +99,20 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         self.copy_button = ctk.CTkButton(self.timestamp_actions_frame, command=self.copy_to_clipboard)
         self.copy_button.pack(side="left", padx=5)
 
+        # --- Batch Folder ---
+        self.batch_frame = ctk.CTkFrame(self.timestamp_frame)
+        self.batch_frame.grid(row=3, column=0, padx=10, pady=(0, 10), sticky="ew")
+        self.batch_button = ctk.CTkButton(self.batch_frame, command=self.start_batch)
+        self.batch_button.pack(side="left", padx=5)
+        self.batch_json_var = ctk.BooleanVar(value=False)
+        self.batch_json_checkbox = ctk.CTkCheckBox(self.batch_frame, text="JSON", variable=self.batch_json_var)
+        self.batch_json_checkbox.pack(side="left", padx=5)
+        self.batch_chapters_var = ctk.BooleanVar(value=False)
+        self.batch_chapters_checkbox = ctk.CTkCheckBox(self.batch_frame, variable=self.batch_chapters_var)
+        self.batch_chapters_checkbox.pack(side="left", padx=5)
+        self.batch_status_label = ctk.CTkLabel(self.batch_frame, text="")
+        self.batch_status_label.pack(side="left", padx=5)
+
     def change_language(self, new_lang_upper):
         self.current_lang = new_lang_upper.lower()
         self.update_ui_texts()
@@ -108,9 +128,14 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         self.generate_button.configure(text=texts.get("generate_timestamps", "Generate Timestamps"))
         self.export_button.configure(text=texts.get("export_txt", "Export to .txt"))
         self.copy_button.configure(text=texts.get("copy_clipboard", "Copy to Clipboard"))
+        if self.batch_thread and self.batch_thread.is_alive():
+            self.batch_button.configure(text=texts.get("stop_render", "Stop"))
+        else:
+            self.batch_button.configure(text=texts.get("batch_timestamps", "Batch Folder..."))
+        self.batch_chapters_checkbox.configure(text=texts.get("batch_chapters", "Chapters"))
 
     def add_audio(self):
-        paths = filedialog.askopenfilenames(filetypes=[("Audio files", "*.mp3 *.wav *.flac *.aac")])
+        paths = filedialog.askopenfilenames(filetypes=[("Audio files", media_formats.dialog_pattern(media_formats.AUDIO_EXTENSIONS))])
         for path in paths:
             if path not in self.audio_paths:
                 self.audio_paths.append(path)
@@ -129,19 +154,14 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
     def handle_drop(self, event):
         files = self.tk.splitlist(event.data)
         for file in files:
-            if file.lower().endswith(('.mp3', '.wav', '.flac', '.aac')):
+            if media_formats.is_audio(file):
                 if file not in self.audio_paths:
                     self.audio_paths.append(file)
                     self.audio_listbox.insert(tk.END, os.path.basename(file))
         self.update_ui_texts()
 
     def get_audio_duration(self, file_path):
-        try:
-            cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', file_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            return float(result.stdout.strip())
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            return None
+        return media_cache.get_duration('ffprobe', file_path)
 
     def generate_timestamps(self):
         if not self.audio_paths:
@@ -149,31 +169,59 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
             return
 
         self.timestamp_textbox.delete("1.0", tk.END)
-        
-        total_duration_seconds = 0
-        timestamp_list = []
-
-        for path in self.audio_paths:
-            filename = os.path.basename(path)
-            # Sanitize filename for YouTube description
-            track_name = os.path.splitext(filename)[0]
-            track_name = re.sub(r'[^a-zA-Zа-яА-Я0-9\s-]', '', track_name).strip()
-
-            hours, remainder = divmod(int(total_duration_seconds), 3600)
-            minutes, seconds = divmod(remainder, 60)
-            
-            if hours > 0:
-                timestamp = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            else:
-                timestamp = f"{minutes:02d}:{seconds:02d}"
-
-            timestamp_list.append(f"{timestamp} {track_name}")
-            
-            duration = self.get_audio_duration(path)
-            if duration:
-                total_duration_seconds += duration
-
-        self.timestamp_textbox.insert("1.0", "\n".join(timestamp_list))
+
+        # Uncached files are probed in parallel instead of one ffprobe after another
+        with ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) * 2)) as pool:
+            durations = list(pool.map(self.get_audio_duration, self.audio_paths))
+        media_cache.shared_cache().save()
+        offsets, _ = timestamps.plain_offsets(durations)
+
+        self.timestamp_textbox.insert("1.0", "\n".join(timestamps.timestamp_lines(self.audio_paths, offsets)))
+
+    def start_batch(self):
+        if self.batch_thread and self.batch_thread.is_alive():
+            self.stop_batch_event.set()
+            return
+        root = filedialog.askdirectory()
+        if not root:
+            return
+        self.stop_batch_event.clear()
+        self.batch_button.configure(text=self.locales[self.current_lang].get("stop_render", "Stop"))
+        self.batch_status_label.configure(text=self.locales[self.current_lang].get("status_batch_scanning", "Scanning folders..."))
+        self.batch_thread = threading.Thread(target=self.run_batch, args=(root, self.batch_json_var.get(), self.batch_chapters_var.get()), daemon=True)
+        self.batch_thread.start()
+
+    def run_batch(self, root, write_json, write_chapters):
+        last_update = [0.0]
+
+        def on_progress(done, total):
+            now = time.time()
+            if done == total or now - last_update[0] > 0.2:
+                last_update[0] = now
+                self.after(0, self.update_batch_progress, done, total)
+
+        try:
+            report = timestamps.batch_generate(root, 'ffprobe', write_json, write_chapters,
+                                               on_progress=on_progress, should_stop=self.stop_batch_event.is_set)
+        except Exception as e:
+            report = {"albums": 0, "written": [], "failed": [{"folder": root, "error": str(e)}], "stopped": False}
+        self.after(0, self.on_batch_done, report)
+
+    def update_batch_progress(self, done, total):
+        if not self.winfo_exists(): return
+        self.batch_status_label.configure(text=f"{done}/{total}")
+
+    def on_batch_done(self, report):
+        if not self.winfo_exists(): return
+        self.batch_status_label.configure(text="")
+        self.update_ui_texts()
+        summary = timestamps.report_text(report)
+        self.timestamp_textbox.delete("1.0", tk.END)
+        self.timestamp_textbox.insert("1.0", summary)
+        if report["failed"]:
+            messagebox.showwarning("Warning", summary.splitlines()[0])
+        else:
+            messagebox.showinfo("Success", summary.splitlines()[0])
 
     def export_to_txt(self):
         content = self.timestamp_textbox.get("1.0", tk.END)